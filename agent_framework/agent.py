@@ -1,67 +1,191 @@
+import asyncio
 import json
 from datetime import datetime
-from typing import Dict, Any, List
-from llm.core import OA_LLM
-from tools.file_ops import FileOperations
-from tools.tool_handler import ToolHandler
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from llm.core import AsyncOA_LLM, estimate_tokens
+from tools.file_ops import FileOperations, project_relative_path
+from tools.tool_handler import ToolHandler, READ_ONLY_TOOLS, tool_call_path
 from utils.context_manager import ContextManager
 from utils.code_reviewer import CodeReviewer
+from prompts.assembler import PromptAssembler
+from prompts.agent_prompts import AgentPrompts
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+DEFAULT_MAX_TURNS = 8
+DEFAULT_TOKEN_BUDGET = 60000
+
 class Agent:
     def __init__(self, name: str, role: str, attributes: dict):
         self.name = name
         self.role = role
         self.attributes = attributes
-        self.context_manager = ContextManager(max_entries=50)  # Use the sliding window
+        self.context_manager = ContextManager(max_entries=50, summarizer=self._summarize_context)  # Sliding window with a rolling summary
         self.file_ops = FileOperations()
         self.tool_handler = ToolHandler()
-        self.llm = OA_LLM()
+        self.tool_handler.context_manager = self.context_manager  # Resolves ctx: references for read_context
+        self.llm = AsyncOA_LLM(agent_name=name)
+        self.prompt_assembler = PromptAssembler(self.llm.model, agent=name, budget=attributes.get('prompt_budget'))
         self.output_log = []
-        self.code_reviewer = CodeReviewer()
+        self.code_reviewer = CodeReviewer(self.file_ops.version_store)
         self.logger = logging.getLogger(f"{self.__class__.__name__}")
+        self.progress_callback = None
+        self.blackboard = None
 
     def add_context(self, entry: Dict[str, Any]):
         entry['timestamp'] = datetime.now().isoformat()
         self.context_manager.add_entry(entry)
+        if self.blackboard:
+            self.blackboard.post(entry)
         self.logger.info(f"Added context: {json.dumps(entry)}")
 
+    def attach_blackboard(self, blackboard):
+        # Share this agent's context and mirror every other agent's posts into its own window
+        self.blackboard = blackboard.view(self.name)
+        self.blackboard.subscribe(self._receive_shared_context)
+
+    def _receive_shared_context(self, author: str, entry: Dict[str, Any]):
+        self.context_manager.add_entry(dict(entry, agent=author))
+
+    async def _summarize_context(self, history: str, max_tokens: int) -> str:
+        user_prompt = AgentPrompts.CONTEXT_SUMMARY_USER.value.format(history=history, max_tokens=max_tokens)
+        response = await self.llm.generate_response(AgentPrompts.CONTEXT_SUMMARY_SYSTEM.value, user_prompt)
+        return response.get("content", "")
+
     def log_output(self, message: str):
         self.output_log.append(message)
         self.logger.info(message)
 
     def execute_task(self, task: Dict[str, Any], overall_goal: str) -> str:
+        return asyncio.run(self.aexecute_task(task, overall_goal))
+
+    async def aexecute_task(self, task: Dict[str, Any], overall_goal: str) -> str:
         try:
             self.logger.info(f"Executing task: {task['task_description']}")
             # This method should be implemented by subclasses
-            raise NotImplementedError("Subclasses must implement execute_task method")
+            raise NotImplementedError("Subclasses must implement aexecute_task method")
         except Exception as e:
             self.logger.error(f"Error executing task: {str(e)}")
             return f"Error: {str(e)}"
 
+    def set_progress_callback(self, callback: Optional[Callable[[Dict[str, Any]], None]]):
+        self.progress_callback = callback
+
+    def _emit_progress(self, task: Dict[str, Any], event: Dict[str, Any]):
+        if self.progress_callback:
+            self.progress_callback({"agent": self.name, "task": task['id'], **event})
+
+    async def agenerate_tool_response(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]], task: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[Tuple[str, str], asyncio.Task]]:
+        # Stream the completion and start read-only tools as soon as their arguments are complete
+        prestarted = {}
+        blocked = []
+
+        def on_tool_ready(function_call: Dict[str, Any]):
+            # Once the model has emitted a call with side effects, later reads may depend on it
+            if function_call['name'] not in READ_ONLY_TOOLS:
+                blocked.append(function_call['name'])
+            key = (function_call['name'], function_call['arguments'])
+            if not blocked and key not in prestarted:
+                prestarted[key] = asyncio.create_task(self.tool_handler.ahandle_tool_call(function_call, task['id']))
+
+        response = await self.llm.generate_chat(
+            messages,
+            tools,
+            on_event=lambda event: self._emit_progress(task, event),
+            on_tool_ready=on_tool_ready
+        )
+        return response, prestarted
+
+    async def arun_tool_loop(self, system_prompt: str, user_prompt: str, tools: List[Dict[str, Any]], task: Dict[str, Any]) -> str:
+        """
+        Let the model work through several tool turns within one task attempt.
+
+        Tool results are appended to the same message list and fed back, so read -> write -> run -> fix
+        does not need a review/retry round trip. The loop stops when the model answers without tool
+        calls, calls mark_task_complete, or hits the `max_turns` / `token_budget` attributes.
+        """
+        max_turns = self.attributes.get("max_turns", DEFAULT_MAX_TURNS)
+        token_budget = self.attributes.get("token_budget", DEFAULT_TOKEN_BUDGET)
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        outputs = []
+        tokens_used = 0
+
+        for turn in range(1, max_turns + 1):
+            tokens_used += estimate_tokens(messages)
+            response, prestarted = await self.agenerate_tool_response(messages, tools, task)
+            tokens_used += estimate_tokens([response])
+
+            if "function_call" not in response:
+                outputs.append(await self.ahandle_tool_call(response, task, prestarted))
+                break
+
+            function_calls = response.get("function_calls") or [response["function_call"]]
+            call_ids = [function_call.get("id") or f"call_{turn}_{index}" for index, function_call in enumerate(function_calls)]
+            messages.append({
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {"id": call_id, "type": "function", "function": {"name": function_call["name"], "arguments": function_call["arguments"]}}
+                    for call_id, function_call in zip(call_ids, function_calls)
+                ]
+            })
+            try:
+                results = await self._aexecute_function_calls(function_calls, task, prestarted)
+            except Exception as e:
+                error_msg = f"Error in tool call: {str(e)}"
+                self.logger.error(error_msg)
+                results = [error_msg] * len(function_calls)
+            finally:
+                for pending in prestarted.values():
+                    pending.cancel()
+
+            for call_id, result in zip(call_ids, results):
+                messages.append({"role": "tool", "tool_call_id": call_id, "content": result})
+            outputs.append(self._join_tool_results(function_calls, results))
+
+            if any(function_call["name"] == "mark_task_complete" for function_call in function_calls):
+                break
+            if tokens_used >= token_budget:
+                self.logger.warning(f"Task {task['id']} stopped after {turn} turns: token budget of {token_budget} reached ({tokens_used} used)")
+                break
+        else:
+            self.logger.warning(f"Task {task['id']} stopped after reaching the maximum of {max_turns} turns")
+
+        self.logger.info(f"Task {task['id']} used {len(outputs)} turns and about {tokens_used} tokens")
+        await self.context_manager.acompact()
+        return "\n\n".join(outputs)
+
     def get_context(self) -> str:
         return self.context_manager.get_context()
 
-    def get_relevant_context(self, task_description: str) -> str:
-        return self.context_manager.get_relevant_context(task_description)
+    def get_relevant_context(self, task_description: str, file_path: Optional[str] = None) -> str:
+        return self.context_manager.get_relevant_context(task_description, project_relative_path(file_path) if file_path else None)
 
     def handle_tool_call(self, response: Dict[str, Any], task: Dict[str, Any]) -> str:
+        return asyncio.run(self.ahandle_tool_call(response, task))
+
+    async def ahandle_tool_call(self, response: Dict[str, Any], task: Dict[str, Any], prestarted: Optional[Dict[Tuple[str, str], asyncio.Task]] = None) -> str:
         self.logger.info(f"Handling tool call for task {task['id']}")
         self.logger.debug(f"Response: {json.dumps(response, indent=2)}")
-        
+        prestarted = prestarted or {}
+        try:
+            return await self._ahandle_response(response, task, prestarted)
+        finally:
+            # Early-started tools the final response did not use
+            for pending in prestarted.values():
+                pending.cancel()
+
+    async def _ahandle_response(self, response: Dict[str, Any], task: Dict[str, Any], prestarted: Dict[Tuple[str, str], asyncio.Task]) -> str:
         if "function_call" in response:
-            function_call = response["function_call"]
-            self.logger.info(f"Function call detected: {function_call['name']}")
+            function_calls = response.get("function_calls") or [response["function_call"]]
+            self.logger.info(f"Function call(s) detected: {', '.join(function_call['name'] for function_call in function_calls)}")
             try:
-                result, success = self.tool_handler.handle_tool_call(function_call, task['id'])
-                if success:
-                    self.add_context({"action": "tool_usage", "task": task['id'], "result": result, "tool": function_call['name']})
-                    self.logger.info(f"Tool call successful: {result}")
-                else:
-                    self.logger.error(f"Tool call failed: {result}")
-                return result
+                results = await self._aexecute_function_calls(function_calls, task, prestarted)
+                return self._join_tool_results(function_calls, results)
             except Exception as e:
                 error_msg = f"Error in tool call: {str(e)}"
                 self.logger.error(error_msg)
@@ -74,6 +198,31 @@ class Agent:
             self.logger.error(error_msg)
             return error_msg
 
+    async def _aexecute_function_calls(self, function_calls: List[Dict[str, Any]], task: Dict[str, Any], prestarted: Dict[Tuple[str, str], asyncio.Task]) -> List[str]:
+        outcomes = await self.tool_handler.ahandle_tool_calls(function_calls, task['id'], prestarted)
+        results = []
+        for function_call, (result, success) in zip(function_calls, outcomes):
+            if success:
+                entry = {"action": "tool_usage", "task": task['id'], "result": result, "tool": function_call['name']}
+                file_path = tool_call_path(function_call)
+                if file_path:
+                    entry["file_path"] = file_path
+                self.add_context(entry)
+                self.logger.info(f"Tool call successful: {result}")
+            else:
+                self.logger.error(f"Tool call failed: {result}")
+            results.append(result)
+        return results
+
+    @staticmethod
+    def _join_tool_results(function_calls: List[Dict[str, Any]], results: List[str]) -> str:
+        if len(results) == 1:
+            return results[0]
+        return "\n\n".join(f"Result of {function_call['name']}:\n{result}" for function_call, result in zip(function_calls, results))
+
     def review_task(self, task: Dict[str, Any], result: str, overall_goal: str) -> Dict[str, Any]:
+        return asyncio.run(self.areview_task(task, result, overall_goal))
+
+    async def areview_task(self, task: Dict[str, Any], result: str, overall_goal: str) -> Dict[str, Any]:
         # This method should be implemented by the ReviewAgent subclass
-        raise NotImplementedError("ReviewAgent must implement review_task method")
\ No newline at end of file
+        raise NotImplementedError("ReviewAgent must implement areview_task method")
\ No newline at end of file
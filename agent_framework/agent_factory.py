@@ -1,8 +1,12 @@
 from typing import List, Dict, Any, Union
 from agent import Agent
+import asyncio
 from prompts.agent_prompts import AgentPrompts
+from prompts.assembler import Section
 from tools.definitions import TOOL_DEFINITIONS, TOOL_DEFINITIONS_REVIEWER
 from tools.artifacts import run_artifact_review
+from tools.test_runner import compact_results
+from tools.file_ops import project_relative_path
 import json
 import os
 
@@ -25,21 +29,30 @@ class PlannerAgent(Agent):
         super().__init__(name, "Planner", attributes)
 
     def analyze_goal(self, goal: str) -> List[Dict[str, Any]]:
+        return asyncio.run(self.aanalyze_goal(goal))
+
+    async def aanalyze_goal(self, goal: str) -> List[Dict[str, Any]]:
         system_prompt = AgentPrompts.GOAL_ANALYSIS_SYSTEM.value
-        user_prompt = AgentPrompts.GOAL_ANALYSIS_USER.value.format(goal=goal, context=self.get_context())
-        response = self.llm.generate_structured_response(system_prompt, user_prompt)
+        user_prompt = self.prompt_assembler.render(
+            AgentPrompts.GOAL_ANALYSIS_USER.value,
+            system_prompt=system_prompt,
+            goal=goal,
+            context=Section(self.get_context(), priority=1, keep="tail")
+        )
+        response = await self.llm.generate_structured_response(system_prompt, user_prompt)
         
         tasks = []
         if isinstance(response, dict) and 'tasks' in response:
             for i, task in enumerate(response['tasks']):
                 task_type = self._determine_task_type(task['task_description'])
-                file_path = self._extract_file_path(task['task_description'])
+                file_path = task.get('file_path') or self._extract_file_path(task['task_description'])
                 tasks.append({
                     "id": i+1,
                     "task_description": task['task_description'],
                     "estimated_complexity": task.get('estimated_complexity', 'Medium'),
                     "task_type": task_type,
-                    "file_path": file_path
+                    "file_path": file_path,
+                    "depends_on": self._parse_dependencies(task.get('depends_on'), i+1)
                 })
         else:
             self.logger.error(f"Invalid response format from LLM: {response}")
@@ -51,7 +64,8 @@ class PlannerAgent(Agent):
                 "task_description": "Analyze the goal and create a plan",
                 "estimated_complexity": "Medium",
                 "task_type": "planning",
-                "file_path": ""
+                "file_path": "",
+                "depends_on": []
             }]
 
         self.logger.info(f"Created {len(tasks)} tasks")
@@ -67,6 +81,20 @@ class PlannerAgent(Agent):
         else:
             return 'other'
 
+    def _parse_dependencies(self, depends_on: Any, task_id: int) -> List[int]:
+        # Planner ids are 1-based positions; only earlier tasks can be prerequisites
+        if not isinstance(depends_on, list):
+            return []
+        dependencies = []
+        for dep in depends_on:
+            try:
+                dep = int(dep)
+            except (TypeError, ValueError):
+                continue
+            if 1 <= dep < task_id and dep not in dependencies:
+                dependencies.append(dep)
+        return dependencies
+
     def _extract_file_path(self, task_description: str) -> str:
         # Simple extraction of file path from task description
         words = task_description.split()
@@ -94,15 +122,16 @@ class CodingAgent(Agent):
     def __init__(self, name: str, attributes: Dict[str, Any]):
         super().__init__(name, "Coder", attributes)
 
-    def execute_task(self, task: Dict[str, Any], overall_goal: str) -> Dict[str, Any]:
+    async def aexecute_task(self, task: Dict[str, Any], overall_goal: str) -> Dict[str, Any]:
         system_prompt = AgentPrompts.CODING_TASK_SYSTEM.value
-        user_prompt = AgentPrompts.CODING_TASK_USER.value.format(
+        user_prompt = self.prompt_assembler.render(
+            AgentPrompts.CODING_TASK_USER.value,
+            system_prompt=system_prompt,
             task=task['task_description'],
-            context=self.get_relevant_context(task['task_description']),
-            goal=overall_goal
+            context=Section(self.get_relevant_context(task['task_description'], task.get('file_path')), priority=1, keep="tail"),
+            goal=Section(overall_goal, priority=2)
         )
-        response = self.llm.generate_response(system_prompt, user_prompt, TOOL_DEFINITIONS + TOOL_DEFINITIONS_REVIEWER)
-        result = self.handle_tool_call(response, task)
+        result = await self.arun_tool_loop(system_prompt, user_prompt, TOOL_DEFINITIONS + TOOL_DEFINITIONS_REVIEWER, task)
         
         # Ensure result is always a dictionary
         if isinstance(result, str):
@@ -110,7 +139,7 @@ class CodingAgent(Agent):
         
         file_type = self._determine_file_type(task)
         if file_type == 'python':
-            sandbox_result = self.run_code_in_sandbox(task, result)
+            sandbox_result = await self.arun_code_in_sandbox(task, result)
             result['sandbox_result'] = sandbox_result
         else:
             result['manual_testing_strategy'] = self._generate_manual_testing_strategy(file_type)
@@ -139,14 +168,20 @@ class CodingAgent(Agent):
         return strategies.get(file_type, "Please review the file manually and provide feedback on its functionality and appearance.")
 
     def run_code_in_sandbox(self, task: Dict[str, Any], result: Dict[str, Any]) -> str:
-        # Implement sandbox execution logic here
-        # Use the run_python_file function from the ToolHandler
-        file_path = result.get('file_path', '')
-        is_unit_test = result.get('is_unit_test', False)
+        return asyncio.run(self.arun_code_in_sandbox(task, result))
+
+    async def arun_code_in_sandbox(self, task: Dict[str, Any], result: Dict[str, Any]) -> str:
+        # Runs through ToolHandler.arun_python_file, so unchanged files and tests reuse earlier results
+        file_path = result.get('file_path') or task.get('file_path', '')
+        is_unit_test = result.get('is_unit_test', os.path.basename(file_path).startswith('test'))
         
-        if file_path:
-            sandbox_result = self.tool_handler.run_python_file(file_path, is_unit_test)
-            return f"Sandbox execution result:\nReturn Code: {sandbox_result['return_code']}\nOutput: {sandbox_result['output']}\nErrors: {sandbox_result['errors']}"
+        if file_path.endswith('.py'):
+            sandbox_result = await self.tool_handler.arun_python_file(file_path, is_unit_test)
+            output = f"Sandbox execution result:\nReturn Code: {sandbox_result['return_code']}\nOutput: {sandbox_result['output']}\nErrors: {sandbox_result['errors']}"
+            if "tests" in sandbox_result:
+                # One JSON line the reviewers can read without parsing unittest text
+                output += f"\nTest results: {json.dumps(compact_results(sandbox_result))}"
+            return output
         else:
             return "No file path provided for sandbox execution."
 
@@ -154,16 +189,17 @@ class TestingAgent(Agent):
     def __init__(self, name: str, attributes: Dict[str, Any]):
         super().__init__(name, "Tester", attributes)
 
-    def execute_task(self, task: Dict[str, Any], overall_goal: str) -> Dict[str, Any]:
+    async def aexecute_task(self, task: Dict[str, Any], overall_goal: str) -> Dict[str, Any]:
         system_prompt = AgentPrompts.TESTING_TASK_SYSTEM.value
-        user_prompt = AgentPrompts.TESTING_TASK_USER.value.format(
+        user_prompt = self.prompt_assembler.render(
+            AgentPrompts.TESTING_TASK_USER.value,
+            system_prompt=system_prompt,
             task=task['task_description'],
-            context=self.get_relevant_context(task['task_description']),
-            goal=overall_goal
+            context=Section(self.get_relevant_context(task['task_description'], task.get('file_path')), priority=1, keep="tail"),
+            goal=Section(overall_goal, priority=2)
         )
         combined_tools = TOOL_DEFINITIONS + TOOL_DEFINITIONS_REVIEWER
-        response = self.llm.generate_response(system_prompt, user_prompt, combined_tools)
-        result = self.handle_tool_call(response, task)
+        result = await self.arun_tool_loop(system_prompt, user_prompt, combined_tools, task)
         
         # Ensure result is always a dictionary
         if isinstance(result, str):
@@ -175,18 +211,26 @@ class ReviewAgent(Agent):
     def __init__(self, name: str, attributes: Dict[str, Any]):
         super().__init__(name, "Review", attributes)
 
-    def review_task(self, task: Dict[str, Any], result: Union[str, Dict[str, Any]], overall_goal: str) -> Dict[str, Any]:
+    async def areview_task(self, task: Dict[str, Any], result: Union[str, Dict[str, Any]], overall_goal: str) -> Dict[str, Any]:
         if isinstance(result, str):
             result = {'content': result}
+        if task.get('file_path'):
+            # Diff of the file's last two recorded versions, checked against the sandbox run
+            version_review = await asyncio.to_thread(self.code_reviewer.review_file, task['task_description'], project_relative_path(task['file_path']), result.get('sandbox_result'))
+            result = dict(result, version_review=version_review)
         
         system_prompt = AgentPrompts.TASK_REVIEW_SYSTEM.value
-        user_prompt = AgentPrompts.TASK_REVIEW_USER.value.format(
+        user_prompt = self.prompt_assembler.render(
+            AgentPrompts.TASK_REVIEW_USER.value,
+            system_prompt=system_prompt,
             task=json.dumps(task),
-            result=json.dumps(result),
-            overall_goal=overall_goal
+            # The end of a tool loop's output holds its final summary
+            result=Section(json.dumps(result), priority=2, keep="tail"),
+            overall_goal=Section(overall_goal, priority=3),
+            context=Section(self.get_relevant_context(task['task_description'], task.get('file_path')), priority=1, keep="tail")
         )
 
-        response = self.llm.generate_response(system_prompt, user_prompt)
+        response = await self.llm.generate_response(system_prompt, user_prompt)
         review_result = response["content"].strip()
 
         return self._process_review_result(review_result)
@@ -217,15 +261,30 @@ class ReviewAgent(Agent):
         return " | ".join(key_points)
 
     def review_overall_progress(self, task_history: List[Dict[str, Any]], overall_goal: str) -> str:
+        return asyncio.run(self.areview_overall_progress(task_history, overall_goal))
+
+    async def areview_overall_progress(self, task_history: List[Dict[str, Any]], overall_goal: str) -> str:
         system_prompt = AgentPrompts.PROGRESS_REVIEW_SYSTEM.value
-        user_prompt = AgentPrompts.PROGRESS_REVIEW_USER.value.format(
-            task_history=json.dumps(task_history),
-            overall_goal=overall_goal
+        user_prompt = self.prompt_assembler.render(
+            AgentPrompts.PROGRESS_REVIEW_USER.value,
+            system_prompt=system_prompt,
+            task_history=Section(json.dumps(task_history), priority=1, summarize=lambda: self._summarize_task_history(task_history)),
+            overall_goal=Section(overall_goal, priority=2)
         )
 
-        response = self.llm.generate_response(system_prompt, user_prompt)
+        response = await self.llm.generate_response(system_prompt, user_prompt)
         return self._summarize_progress_review(response["content"].strip())
 
+    @staticmethod
+    def _summarize_task_history(task_history: List[Dict[str, Any]]) -> str:
+        # One line per task when the full history does not fit the prompt
+        lines = []
+        for task in task_history:
+            status = "completed" if task.get('completed') else "not completed"
+            file_path = f" ({task['file_path']})" if task.get('file_path') else ""
+            lines.append(f"#{task.get('id')} [{status}] {task.get('task_description', '')}{file_path}")
+        return "\n".join(lines)
+
     def _summarize_progress_review(self, review: str) -> str:
         # Summarize the progress review to focus on key points
         summary = []
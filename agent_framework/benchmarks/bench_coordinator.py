@@ -0,0 +1,140 @@
+"""
+Offline end-to-end benchmark for Coordinator.process_goal.
+
+Runs the full planner -> scheduler -> agents -> tools -> review pipeline against FakeLLMBackend,
+so the numbers measure the framework's own overhead (plus any simulated LLM latency) without
+touching the network. Each goal size runs in a fresh process so peak memory is not shared.
+
+Usage (from agent_framework/):
+    python benchmarks/bench_coordinator.py --sizes 10 100 1000 --workers 4 --json results.json
+    python benchmarks/bench_coordinator.py --latency-ms 200 --jitter-ms 50 --baseline results.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def _summarize(timings: List[float]) -> Dict[str, float]:
+    if not timings:
+        return {"count": 0}
+    ordered = sorted(timings)
+    return {
+        "count": len(ordered),
+        "mean_ms": 1000 * sum(ordered) / len(ordered),
+        "p50_ms": 1000 * ordered[len(ordered) // 2],
+        "p95_ms": 1000 * ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max_ms": 1000 * ordered[-1]
+    }
+
+def _peak_rss_bytes() -> int:
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def run_benchmark(size: int, workers: int, latency: float, jitter: float, seed: int) -> Dict[str, Any]:
+    os.environ["LLM_CACHE"] = "off"
+    from llm.backends import FakeLLMBackend, set_default_backend
+    from coordinator import Coordinator
+    # The framework logs every step at INFO; keep that I/O out of the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+
+    backend = FakeLLMBackend(plan_size=size, latency_mean=latency, latency_jitter=jitter, seed=seed)
+    set_default_backend(backend)
+
+    # FileOperations writes relative to the working directory
+    os.chdir(tempfile.mkdtemp(prefix="ensemble-bench-"))
+    coordinator = Coordinator(max_workers=workers)
+
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    coordinator.process_goal(f"Benchmark goal with {size} independent modules")
+    wall_clock = time.perf_counter() - started
+    cpu_time = time.process_time() - cpu_started
+
+    completed = sum(1 for task in coordinator.task_history if task.get("completed"))
+    llm_calls = sum(usage["calls"] for usage in backend.stats().values())
+    return {
+        "tasks": size,
+        "completed": completed,
+        "workers": workers,
+        "wall_clock_s": wall_clock,
+        "cpu_s": cpu_time,
+        "throughput_tasks_per_s": size / wall_clock if wall_clock > 0 else 0.0,
+        "llm_calls": llm_calls,
+        "peak_rss_bytes": _peak_rss_bytes(),
+        "stages": {stage: _summarize(timings) for stage, timings in coordinator.stage_timings.items()}
+    }
+
+def _print_result(result: Dict[str, Any]):
+    print(f"\n=== {result['tasks']} tasks, {result['workers']} workers ===")
+    print(f"completed {result['completed']}/{result['tasks']}, {result['llm_calls']} LLM calls")
+    print(f"wall {result['wall_clock_s']:.3f}s, cpu {result['cpu_s']:.3f}s, "
+          f"throughput {result['throughput_tasks_per_s']:.1f} tasks/s, peak RSS {result['peak_rss_bytes'] / (1024 * 1024):.1f} MiB")
+    for stage, summary in result["stages"].items():
+        if summary["count"]:
+            print(f"  {stage:<16} n={summary['count']:<6} mean {summary['mean_ms']:8.2f}ms  p50 {summary['p50_ms']:8.2f}ms  "
+                  f"p95 {summary['p95_ms']:8.2f}ms  max {summary['max_ms']:8.2f}ms")
+
+def _find_regressions(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    regressions = []
+    previous = {entry["tasks"]: entry for entry in baseline}
+    for result in results:
+        old = previous.get(result["tasks"])
+        if old is None:
+            continue
+        if result["throughput_tasks_per_s"] < old["throughput_tasks_per_s"] * (1 - tolerance):
+            regressions.append(f"{result['tasks']} tasks: throughput {result['throughput_tasks_per_s']:.1f} < baseline {old['throughput_tasks_per_s']:.1f} tasks/s")
+        if old["peak_rss_bytes"] and result["peak_rss_bytes"] > old["peak_rss_bytes"] * (1 + tolerance):
+            regressions.append(f"{result['tasks']} tasks: peak RSS {result['peak_rss_bytes']} > baseline {old['peak_rss_bytes']} bytes")
+        if result["cpu_s"] > old["cpu_s"] * (1 + tolerance):
+            regressions.append(f"{result['tasks']} tasks: CPU {result['cpu_s']:.3f}s > baseline {old['cpu_s']:.3f}s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline Coordinator.process_goal benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Number of planned tasks per run")
+    parser.add_argument("--workers", type=int, default=4, help="Scheduler worker pool size")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mean simulated LLM latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Standard deviation of simulated LLM latency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare against a previous --json output and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before flagging a regression")
+    args = parser.parse_args()
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for size in args.sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_benchmark, size, args.workers, args.latency_ms / 1000, args.jitter_ms / 1000, args.seed).result()
+        _print_result(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = _find_regressions(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
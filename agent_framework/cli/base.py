@@ -11,6 +11,7 @@ class BasicCLI:
         self.tasks = []
         self.current_task = ""
         self.last_output = ""
+        self.current_progress = ""
         self.goal_input_event = Event()
         self.user_goal = ""
         self.input_lock = Event()
@@ -67,6 +68,9 @@ class BasicCLI:
         print("\n" + self.term.bold("Current Task:"))
         print(self.current_task[:50] + "...")
         
+        print("\n" + self.term.bold("Progress:"))
+        print(self.current_progress[-100:])
+
         print("\n" + self.term.bold("Last Output:"))
         print(self.last_output[:100] + "...")
 
@@ -83,6 +87,27 @@ class BasicCLI:
                 self.current_task = update['content']
             elif update['type'] == 'output':
                 self.last_output = update['content']
+            elif update['type'] == 'progress':
+                self.current_progress = self.format_progress(update['content'])
+            elif update['type'] == 'sandbox_output':
+                event = update['content']
+                self.last_output = f"[{event['file_path']}] {event['line']}"
+
+    def format_progress(self, event):
+        prefix = f"[{event['agent']} / task {event['task']}] "
+        if event['event'] == 'content':
+            # Append streamed text to the running preview of the same task
+            text = event['text']
+            if self.current_progress.startswith(prefix):
+                text = self.current_progress[len(prefix):] + text
+            return prefix + text[-200:]
+        elif event['event'] == 'tool_call_started':
+            return prefix + f"calling {event['name']}..."
+        elif event['event'] == 'tool_arguments':
+            return prefix + f"{event['name']}: {event['chars']} characters generated"
+        elif event['event'] == 'tool_call_ready':
+            return prefix + f"{event['name']} ready ({event['chars']} characters)"
+        return prefix + "response complete"
 
     def update(self, update_type, content):
         self.update_queue.put({'type': update_type, 'content': content})
@@ -1,53 +1,109 @@
 import logging
-from typing import List, Dict, Any
-from collections import Counter
+from typing import List, Dict, Any, Tuple
+from collections import Counter, defaultdict
 from agent_factory import AgentFactory
+from utils.task_scheduler import TaskScheduler
+from utils.blackboard import Blackboard
+from tools.file_ops import FileOperations, project_relative_path
+from tools.overlay import Overlay, use_overlay, reset_overlay
+from llm.cache import get_default_cache
+from llm.backends import get_backend
+import asyncio
 import json
+import time
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class Coordinator:
-    def __init__(self, cli=None):
+    def __init__(self, cli=None, max_workers: int = 4, run_log=None):
         self.cli = cli
+        self.max_workers = max_workers
+        self.run_log = run_log
         self.agents = {
             "planner": AgentFactory.create_agent("planner", "PlannerAgent", {}),
             "coding": AgentFactory.create_agent("coding", "CodingAgent", {}),
             "testing": AgentFactory.create_agent("testing", "TestingAgent", {}),
             "review": AgentFactory.create_agent("review", "ReviewAgent", {})
         }
+        # Agents share their context through the blackboard instead of re-reading files
+        self.blackboard = Blackboard()
+        for agent in self.agents.values():
+            agent.attach_blackboard(self.blackboard)
+        if self.cli:
+            for agent in self.agents.values():
+                agent.set_progress_callback(lambda event: self.cli.update('progress', event))
+                agent.tool_handler.output_callback = lambda event: self.cli.update('sandbox_output', event)
+        if self.run_log:
+            # LLM calls are captured by the RecordingBackend; tools and sandbox runs are logged here
+            for agent in self.agents.values():
+                agent.tool_handler.run_log = self.run_log
+        self.file_ops = FileOperations()
         self.task_history = []
         self.overall_goal = ""
         self.tool_usage = Counter()
+        self.stage_timings = defaultdict(list)  # Seconds per call of each pipeline stage
 
     def process_goal(self, goal: str):
+        return asyncio.run(self.aprocess_goal(goal))
+
+    async def aprocess_goal(self, goal: str):
         try:
             self.overall_goal = goal
             logger.info(f"Processing goal: {goal}")
-            tasks = self.agents["planner"].analyze_goal(goal)
+            started = time.perf_counter()
+            tasks = await self.agents["planner"].aanalyze_goal(goal)
+            self.stage_timings["planning"].append(time.perf_counter() - started)
             self.task_history = tasks
             logger.info(f"Goal broken down into {len(tasks)} tasks")
 
-            for task in tasks:
-                self._process_task(task)
+            scheduler = TaskScheduler(tasks, max_workers=self.max_workers)
+            schedule_report = await scheduler.arun(self._process_task)
 
             self._output_tool_usage_stats()
-            self.review_overall_progress()
+            self._output_schedule_stats(schedule_report)
+            await self.areview_overall_progress()
         except Exception as e:
             logger.error(f"An error occurred while processing the goal: {str(e)}", exc_info=True)
             raise
 
-    def _process_task(self, task: Dict[str, Any], retry_count: int = 0):
+    async def _process_task(self, task: Dict[str, Any], retry_count: int = 0):
         if retry_count >= 3:
             logger.warning(f"Failed to complete task after 3 attempts: {task['task_description']}")
             return
 
+        # Project writes of this attempt stay in memory until the review approves them
+        overlay = Overlay(self.file_ops.project_folder, label=f"task {task['id']}")
+        token = use_overlay(overlay)
+        try:
+            approved, feedback = await self._attempt_task(task)
+            if approved:
+                committed = self.file_ops.commit_overlay(overlay)
+                if committed:
+                    logger.info(f"Task {task['id']} committed {len(committed)} file(s): {', '.join(committed)}")
+        except Exception as e:
+            logger.error(f"An error occurred while committing task {task['id']}: {str(e)}", exc_info=True)
+            approved, feedback = False, f"Error: {str(e)}"
+        finally:
+            reset_overlay(token)
+            overlay.discard()
+
+        if approved:
+            logger.info(f"Task {task['id']} completed successfully")
+            task['completed'] = True
+        else:
+            await self.ahandle_unapproved_task(task, feedback, retry_count)
+
+    async def _attempt_task(self, task: Dict[str, Any]) -> Tuple[bool, str]:
+        # (approved, review feedback) for one execution and review of the task
         try:
             logger.info(f"Processing task {task['id']}: {task['task_description']}")
             agent_type = self.determine_agent_type(task)
             logger.info(f"Assigned to {agent_type} agent")
             
-            result = self.agents[agent_type].execute_task(task, self.overall_goal)
+            started = time.perf_counter()
+            result = await self.agents[agent_type].aexecute_task(task, self.overall_goal)
+            self.stage_timings["execution"].append(time.perf_counter() - started)
             
             # Ensure result is always a dictionary
             if isinstance(result, str):
@@ -62,17 +118,18 @@ class Coordinator:
             if 'tool' in result:
                 self.tool_usage[result['tool']] += 1
             
-            review_result = self.agents["review"].review_task(task, result, self.overall_goal)
+            started = time.perf_counter()
+            review_result = await self.agents["review"].areview_task(task, result, self.overall_goal)
+            self.stage_timings["review"].append(time.perf_counter() - started)
             logger.info(f"Review result: {review_result}")
-
-            if not review_result["approved"]:
-                self.handle_unapproved_task(task, review_result["feedback"], retry_count)
-            else:
-                logger.info(f"Task {task['id']} completed successfully")
-                task['completed'] = True
+            review_entry = {"action": "task_review", "task": task['id'], "result": f"{'Approved' if review_result['approved'] else 'Not approved'}: {review_result['feedback']}"}
+            if task.get('file_path'):
+                review_entry["file_path"] = project_relative_path(task['file_path'])
+            self.blackboard.post("Coordinator", review_entry)
+            return review_result["approved"], review_result["feedback"]
         except Exception as e:
             logger.error(f"An error occurred while processing task {task['id']}: {str(e)}", exc_info=True)
-            self.handle_unapproved_task(task, f"Error: {str(e)}", retry_count)
+            return False, f"Error: {str(e)}"
 
     def determine_agent_type(self, task: Dict[str, Any]) -> str:
         task_description = task['task_description'].lower()
@@ -83,23 +140,46 @@ class Coordinator:
         return "coding"  # Default to coding agent
 
     def handle_unapproved_task(self, task: Dict[str, Any], feedback: str, retry_count: int):
+        return asyncio.run(self.ahandle_unapproved_task(task, feedback, retry_count))
+
+    async def ahandle_unapproved_task(self, task: Dict[str, Any], feedback: str, retry_count: int):
         logger.warning(f"Task {task['id']} not approved: {task['task_description']}")
         logger.warning(f"Feedback: {feedback}")
         
         updated_task = task.copy()
         updated_task['task_description'] += f"\nPrevious attempt feedback: {feedback}"
         
-        self._process_task(updated_task, retry_count + 1)
+        await self._process_task(updated_task, retry_count + 1)
 
     def _output_tool_usage_stats(self):
         logger.info("Tool Usage Statistics:")
         for tool, count in self.tool_usage.items():
             logger.info(f"{tool}: used {count} times")
         logger.info(f"Total tool uses: {sum(self.tool_usage.values())}")
+
+        cache_stats = get_default_cache().stats()
+        if cache_stats["enabled"]:
+            logger.info(f"LLM cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses this run ({cache_stats['entries']} entries, {cache_stats['bytes']} bytes stored)")
+
+        backend = get_backend()
+        for agent_name, usage in backend.stats().items():
+            logger.info(f"LLM usage for {agent_name}: {usage['calls']} calls ({usage['errors']} errors), {usage['prompt_tokens']} prompt + {usage['completion_tokens']} completion tokens, {usage['latency']:.2f}s")
+        if hasattr(backend, "rate_limiter"):
+            rate_stats = backend.rate_limiter.stats()
+            logger.info(f"LLM throttling: {rate_stats['throttled']} delayed requests, {rate_stats['retries']} retried requests, concurrency limit {rate_stats['concurrency']}")
         
+        blackboard_stats = self.blackboard.stats()
+        logger.info(f"Blackboard: {blackboard_stats['posts']} posts shared between {blackboard_stats['subscribers']} agents ({blackboard_stats['dropped']} dropped from the window)")
+
         completed_tasks = sum(1 for task in self.task_history if task.get('completed', False))
         logger.info(f"Completed tasks: {completed_tasks}/{len(self.task_history)}")
 
+    def _output_schedule_stats(self, report: Dict[str, Any]):
+        logger.info("Schedule Statistics:")
+        logger.info(f"Ran {report['tasks']} tasks on {report['max_workers']} workers")
+        logger.info(f"Wall-clock time: {report['wall_clock']:.2f}s, serial time: {report['serial_time']:.2f}s (speedup {report['speedup']:.2f}x)")
+        logger.info(f"Critical path: {len(report['critical_path'])} tasks, {report['critical_path_time']:.2f}s ({' -> '.join(str(task_id) for task_id in report['critical_path'])})")
+
     def run_in_sandbox(self, task: Dict[str, Any], result: Dict[str, Any]) -> str:
         # Implement sandbox execution logic here
         # This should use the run_code_in_sandbox function from the ToolHandler
@@ -107,6 +187,11 @@ class Coordinator:
         pass
 
     def review_overall_progress(self):
-        progress_summary = self.agents["review"].review_overall_progress(self.task_history, self.overall_goal)
+        return asyncio.run(self.areview_overall_progress())
+
+    async def areview_overall_progress(self):
+        started = time.perf_counter()
+        progress_summary = await self.agents["review"].areview_overall_progress(self.task_history, self.overall_goal)
+        self.stage_timings["progress_review"].append(time.perf_counter() - started)
         logger.info(f"Overall Progress Review: {progress_summary}")
         # Implement logic to adjust the plan or create new tasks based on this review
\ No newline at end of file
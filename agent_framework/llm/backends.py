@@ -0,0 +1,204 @@
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional, Callable, AsyncIterator
+
+class LLMBackend:
+    """
+    Transport used by OA_LLM / AsyncOA_LLM.
+
+    `request` is the chat.completions keyword dict built by llm.core; implementations return
+    objects shaped like the OpenAI SDK's ChatCompletion (and ChatCompletionChunk for astream).
+    """
+    def complete(self, request: Dict[str, Any], agent: str = "default"):
+        raise NotImplementedError("LLM backends must implement complete")
+
+    async def acomplete(self, request: Dict[str, Any], agent: str = "default"):
+        raise NotImplementedError("LLM backends must implement acomplete")
+
+    async def astream(self, request: Dict[str, Any], agent: str = "default") -> AsyncIterator[Any]:
+        raise NotImplementedError("LLM backends must implement astream")
+        yield
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {}
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> SimpleNamespace:
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens)
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Deterministic offline backend for benchmarks and local runs.
+
+    Responses come from `responder(request) -> dict`, or from `script` (a list consumed in
+    order) when given; a scripted item is either {"content": str} or
+    {"tool_calls": [{"name": str, "arguments": dict | str}, ...]}. The default responder drives
+    the coordinator end to end: it plans `plan_size` tasks, writes each task's file, then
+    finishes the tool loop, and approves every review.
+
+    Latency per call is drawn from a seeded normal distribution (`latency_mean`,
+    `latency_jitter`, in seconds, clipped at zero), so runs are reproducible.
+    """
+    def __init__(self, responder: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None, script: Optional[List[Dict[str, Any]]] = None,
+                 plan_size: int = 10, latency_mean: float = 0.0, latency_jitter: float = 0.0, seed: int = 0):
+        self.responder = responder or self.default_responder
+        self.script = list(script) if script is not None else None
+        self.plan_size = plan_size
+        self.latency_mean = latency_mean
+        self.latency_jitter = latency_jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._call_ids = 0
+        self.usage: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
+            "calls": 0,
+            "errors": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "latency": 0.0
+        })
+
+    def default_responder(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        messages = request["messages"]
+        if request.get("response_format", {}).get("type") == "json_object":
+            tasks = []
+            for i in range(1, self.plan_size + 1):
+                # A few dependency chains so the scheduler has real work to do
+                depends_on = [i - 3] if i > 3 and i % 3 == 0 else []
+                tasks.append({
+                    "task_description": f"Implement module_{i}.py with a function named task_{i}",
+                    "estimated_complexity": "Low",
+                    "file_path": f"src/module_{i}.py",
+                    "depends_on": depends_on
+                })
+            return {"content": json.dumps({"tasks": tasks})}
+
+        if request.get("tools"):
+            if messages[-1]["role"] == "tool":
+                return {"content": "Task complete."}
+            match = re.search(r"(module_\d+)\.py", messages[-1]["content"])
+            name = match.group(1) if match else "fake_module"
+            return {"tool_calls": [{
+                "name": "write_file",
+                "arguments": {"is_project_file": True, "filename": f"{name}.py", "content": f"def {name}():\n    return {name!r}\n"}
+            }]}
+
+        return {"content": "Approved\nProgress: All planned tasks were completed.\nMissing: Nothing.\nNext steps: None."}
+
+    def _next_reply(self, request: Dict[str, Any], agent: str) -> Dict[str, Any]:
+        with self._lock:
+            if self.script is not None:
+                if not self.script:
+                    raise RuntimeError("FakeLLMBackend script exhausted")
+                return self.script.pop(0)
+        return self.responder(request)
+
+    def _reply_latency(self, reply: Dict[str, Any]) -> float:
+        return self._sample_latency()
+
+    def _sample_latency(self) -> float:
+        with self._lock:
+            return max(0.0, self._random.gauss(self.latency_mean, self.latency_jitter)) if (self.latency_mean or self.latency_jitter) else 0.0
+
+    def _tool_calls(self, reply: Dict[str, Any]) -> List[Dict[str, str]]:
+        tool_calls = []
+        with self._lock:
+            for call in reply.get("tool_calls") or []:
+                self._call_ids += 1
+                arguments = call["arguments"] if isinstance(call["arguments"], str) else json.dumps(call["arguments"])
+                tool_calls.append({"id": call.get("id") or f"call_fake_{self._call_ids}", "name": call["name"], "arguments": arguments})
+        return tool_calls
+
+    def _build_completion(self, request: Dict[str, Any], reply: Dict[str, Any]) -> SimpleNamespace:
+        tool_calls = self._tool_calls(reply)
+        message = SimpleNamespace(
+            role="assistant",
+            content=reply.get("content") or (None if tool_calls else ""),
+            tool_calls=[
+                SimpleNamespace(id=call["id"], type="function", function=SimpleNamespace(name=call["name"], arguments=call["arguments"]))
+                for call in tool_calls
+            ] or None
+        )
+        choice = SimpleNamespace(index=0, message=message, finish_reason="tool_calls" if tool_calls else "stop")
+        return SimpleNamespace(choices=[choice], usage=self._count_usage(request, reply))
+
+    def _count_usage(self, request: Dict[str, Any], reply: Dict[str, Any]) -> SimpleNamespace:
+        if reply.get("usage"):
+            return _usage(reply["usage"]["prompt_tokens"], reply["usage"]["completion_tokens"])
+        return _usage(len(json.dumps(request.get("messages", []))) // 4, len(json.dumps(reply)) // 4)
+
+    def _record(self, agent: str, latency: float, usage: SimpleNamespace):
+        with self._lock:
+            stats = self.usage[agent]
+            stats["calls"] += 1
+            stats["latency"] += latency
+            stats["prompt_tokens"] += usage.prompt_tokens
+            stats["completion_tokens"] += usage.completion_tokens
+
+    def complete(self, request: Dict[str, Any], agent: str = "default"):
+        reply = self._next_reply(request, agent)
+        latency = self._reply_latency(reply)
+        if latency:
+            time.sleep(latency)
+        completion = self._build_completion(request, reply)
+        self._record(agent, latency, completion.usage)
+        return completion
+
+    async def acomplete(self, request: Dict[str, Any], agent: str = "default"):
+        reply = self._next_reply(request, agent)
+        latency = self._reply_latency(reply)
+        if latency:
+            await asyncio.sleep(latency)
+        completion = self._build_completion(request, reply)
+        self._record(agent, latency, completion.usage)
+        return completion
+
+    async def astream(self, request: Dict[str, Any], agent: str = "default") -> AsyncIterator[Any]:
+        completion = await self.acomplete(request, agent)
+        message = completion.choices[0].message
+
+        def chunk(delta: SimpleNamespace, finish_reason: Optional[str] = None) -> SimpleNamespace:
+            return SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta, finish_reason=finish_reason)], usage=None)
+
+        for index, tool_call in enumerate(message.tool_calls or []):
+            yield chunk(SimpleNamespace(content=None, tool_calls=[SimpleNamespace(index=index, id=tool_call.id, function=SimpleNamespace(name=tool_call.function.name, arguments=""))]))
+            arguments = tool_call.function.arguments
+            for start in range(0, len(arguments), 64):
+                yield chunk(SimpleNamespace(content=None, tool_calls=[SimpleNamespace(index=index, id=None, function=SimpleNamespace(name=None, arguments=arguments[start:start + 64]))]))
+        content = message.content or ""
+        for start in range(0, len(content), 16):
+            yield chunk(SimpleNamespace(content=content[start:start + 16], tool_calls=None))
+        yield chunk(SimpleNamespace(content=None, tool_calls=None), completion.choices[0].finish_reason)
+        yield SimpleNamespace(choices=[], usage=completion.usage)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {agent: dict(stats) for agent, stats in self.usage.items()}
+
+_default_backend = None
+_default_backend_lock = threading.Lock()
+
+def set_default_backend(backend: Optional[LLMBackend]):
+    """Route every OA_LLM created afterwards through `backend` (None restores the default)."""
+    global _default_backend
+    with _default_backend_lock:
+        _default_backend = backend
+
+def get_backend() -> LLMBackend:
+    """
+    Backend for new OA_LLM instances: the one passed to set_default_backend, a FakeLLMBackend when
+    LLM_BACKEND=fake, otherwise the shared OpenAI gateway.
+    """
+    global _default_backend
+    with _default_backend_lock:
+        if _default_backend is None and os.environ.get("LLM_BACKEND", "openai").lower() == "fake":
+            _default_backend = FakeLLMBackend()
+        if _default_backend is not None:
+            return _default_backend
+    from .gateway import get_gateway
+    return get_gateway()
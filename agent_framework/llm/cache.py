@@ -0,0 +1,233 @@
+import asyncio
+import atexit
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(".ensemble_cache", "llm_responses.sqlite3")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL = 7 * 24 * 60 * 60  # Seconds
+FLUSH_EVERY = 32  # Reads whose hit/miss counts and access times are written in one transaction
+
+class ResponseCache:
+    """
+    On-disk, content-addressed cache for LLM responses.
+
+    Keys are a SHA-256 of the full request (model, messages, tool schema, response_format),
+    values are the parsed response dicts returned by OA_LLM. The database runs in WAL mode
+    with a busy timeout and every operation is its own short transaction, so several worker
+    processes can share one file. Entries expire after `ttl` seconds and the least recently
+    used ones are evicted once the stored payloads exceed `max_bytes`.
+
+    Reads only read: hit/miss counts and access times are written in batches. The payload
+    total is kept in the counters table, so a write does not have to sum the table. Async
+    callers use aget/aset, which run on a worker thread and keep SQLite off the event loop.
+    """
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES, ttl: Optional[float] = DEFAULT_TTL, enabled: bool = True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+        self._pending_counts: Dict[str, int] = {}
+        self._pending_access: Dict[str, float] = {}  # key -> last hit not yet written
+        self._pending_reads = 0
+        if self.enabled:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._init_db()
+            atexit.register(self.flush)
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connection()
+        conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        # Running payload total; summed once for databases written before it existed
+        conn.execute("INSERT OR IGNORE INTO counters (name, value) SELECT 'bytes', COALESCE(SUM(size), 0) FROM responses")
+
+    @staticmethod
+    def make_key(request: Dict[str, Any]) -> str:
+        payload = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        try:
+            row = self._connection().execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            # Expired rows are deleted by the next write's sweep
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                self._record_read("misses")
+                return None
+            self._record_read("hits", key, now)
+            return json.loads(row[0])
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache read failed, treating as miss: {str(e)}")
+            return None
+
+    async def aget(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        return await asyncio.to_thread(self.get, key)
+
+    def set(self, key: str, value: Any):
+        if not self.enabled:
+            return
+        payload = json.dumps(value)
+        now = time.time()
+        try:
+            conn = self._connection()
+            self._flush(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, payload, len(payload), now, now)
+                )
+                self._add_bytes(conn, len(payload) - (row[0] if row else 0))
+                self._evict(conn)
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache write failed: {str(e)}")
+
+    async def aset(self, key: str, value: Any):
+        if self.enabled:
+            await asyncio.to_thread(self.set, key, value)
+
+    @staticmethod
+    def _add_bytes(conn: sqlite3.Connection, delta: int):
+        if delta:
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = 'bytes'", (delta,))
+
+    def _evict(self, conn: sqlite3.Connection):
+        # Runs inside set()'s transaction
+        if self.ttl is not None:
+            cutoff = time.time() - self.ttl
+            expired = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses WHERE created_at < ?", (cutoff,)).fetchone()[0]
+            if expired:
+                conn.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,))
+                self._add_bytes(conn, -expired)
+        total = conn.execute("SELECT value FROM counters WHERE name = 'bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            if total - freed <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            freed += size
+        self._add_bytes(conn, -freed)
+
+    def _record_read(self, name: str, key: Optional[str] = None, now: Optional[float] = None):
+        with self._counter_lock:
+            setattr(self, name, getattr(self, name) + 1)
+            self._pending_counts[name] = self._pending_counts.get(name, 0) + 1
+            if key is not None:
+                self._pending_access[key] = now
+            self._pending_reads += 1
+            due = self._pending_reads >= FLUSH_EVERY
+        if due:
+            self._flush(self._connection())
+
+    def flush(self):
+        """Write batched hit/miss counts and access times now."""
+        if self.enabled:
+            try:
+                self._flush(self._connection())
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache counter write failed: {str(e)}")
+
+    def _flush(self, conn: sqlite3.Connection):
+        # Write the batched counts and access times in one transaction
+        with self._counter_lock:
+            counts, self._pending_counts = self._pending_counts, {}
+            accessed, self._pending_access = self._pending_access, {}
+            self._pending_reads = 0
+        if not counts and not accessed:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO counters (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                list(counts.items())
+            )
+            conn.executemany("UPDATE responses SET last_access = ? WHERE key = ?", [(at, key) for key, at in accessed.items()])
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"enabled": self.enabled, "hits": self.hits, "misses": self.misses}
+        if self.enabled:
+            conn = self._connection()
+            self._flush(conn)
+            totals = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            stats.update({
+                "total_hits": totals.get("hits", 0),
+                "total_misses": totals.get("misses", 0),
+                "entries": entries,
+                "bytes": totals.get("bytes", 0)
+            })
+        return stats
+
+    def clear(self):
+        if self.enabled:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM responses")
+            conn.execute("UPDATE counters SET value = 0 WHERE name = 'bytes'")
+            conn.execute("COMMIT")
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache() -> ResponseCache:
+    """
+    Process-wide cache configured from the environment:
+    LLM_CACHE=off bypasses it, LLM_CACHE_PATH, LLM_CACHE_MAX_MB and LLM_CACHE_TTL override the defaults.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            ttl = os.environ.get("LLM_CACHE_TTL")
+            _default_cache = ResponseCache(
+                path=os.environ.get("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+                max_bytes=int(float(os.environ.get("LLM_CACHE_MAX_MB", DEFAULT_MAX_BYTES / (1024 * 1024))) * 1024 * 1024),
+                ttl=float(ttl) if ttl else DEFAULT_TTL,
+                enabled=os.environ.get("LLM_CACHE", "on").lower() not in ("0", "off", "false", "no")
+            )
+        return _default_cache
@@ -1,67 +1,252 @@
-import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 from pydantic import BaseModel
 import json
-from openai import OpenAI
 from dotenv import load_dotenv
+from .cache import ResponseCache, get_default_cache
+from .backends import LLMBackend, get_backend
+from .tokenizer import count_message_tokens
 
 load_dotenv()
 
-openai_api_key = os.environ.get("OPENAI_API_KEY")
-if not openai_api_key:
-    raise ValueError("OPENAI_API_KEY not found in environment variables")
-
 class Task(BaseModel):
     task_description: str
     estimated_complexity: str
     completed: bool = False
 
-class OA_LLM:
+def _build_messages(system_prompt: str, user_prompt: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    return count_message_tokens(messages)
+
+def _build_request(model: str, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    request = {"model": model, "messages": messages}
+    if tools:
+        request["tools"] = tools
+        request["tool_choice"] = "auto"
+    return request
+
+def _build_structured_request(model: str, system_prompt: str, user_prompt: str) -> Dict[str, Any]:
+    return {
+        "model": model,
+        "messages": _build_messages(system_prompt, f"{user_prompt}\n\nPlease provide your response in JSON format."),
+        "response_format": {"type": "json_object"}
+    }
+
+def _parse_response(response) -> Dict[str, Any]:
+    choice = response.choices[0]
+    message = choice.message
+
+    if choice.finish_reason == "tool_calls":
+        function_calls = [
+            {
+                "id": tool_call.id,
+                "name": tool_call.function.name,
+                "arguments": tool_call.function.arguments
+            }
+            for tool_call in message.tool_calls
+        ]
+        # "function_call" keeps the first call for callers that only handle one
+        return {"function_call": function_calls[0], "function_calls": function_calls}
+    else:
+        return {"content": message.content}
+
+class _JsonObjectTracker:
+    """Detects when a streamed JSON object is complete in O(n) over all fragments."""
     def __init__(self):
-        self.client = OpenAI(api_key=openai_api_key)
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, fragment: str) -> bool:
+        for char in fragment:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+                self.started = True
+            elif char in "}]":
+                self.depth -= 1
+        return self.started and self.depth == 0
+
+class _StreamAssembler:
+    """
+    Rebuilds a chat completion from streamed chunks.
+
+    Emits progress events as content and tool-call arguments arrive, and calls `on_tool_ready`
+    with a complete function call as soon as its arguments JSON closes, before the stream ends.
+    """
+    PROGRESS_EVERY = 512  # Characters of tool arguments between progress events
+
+    def __init__(self, on_event: Optional[Callable[[Dict[str, Any]], None]] = None, on_tool_ready: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.on_event = on_event
+        self.on_tool_ready = on_tool_ready
+        self.content = []
+        self.tool_calls: Dict[int, Dict[str, Any]] = {}
+        self.finish_reason = None
+
+    def _emit(self, event: Dict[str, Any]):
+        if self.on_event:
+            self.on_event(event)
+
+    def _ready(self, index: int):
+        call = self.tool_calls[index]
+        if call["ready"]:
+            return
+        call["ready"] = True
+        function_call = {"id": call["id"], "name": call["name"], "arguments": "".join(call["arguments"])}
+        self._emit({"event": "tool_call_ready", "name": call["name"], "chars": call["chars"]})
+        if self.on_tool_ready:
+            self.on_tool_ready(function_call)
+
+    def feed(self, chunk):
+        if not chunk.choices:
+            return
+        choice = chunk.choices[0]
+        delta = choice.delta
+
+        if delta.content:
+            self.content.append(delta.content)
+            self._emit({"event": "content", "text": delta.content})
+
+        for tool_call in delta.tool_calls or []:
+            # A new index means the model has moved on, so every earlier call is complete
+            for index in self.tool_calls:
+                if index < tool_call.index:
+                    self._ready(index)
+            call = self.tool_calls.setdefault(tool_call.index, {
+                "id": None, "name": "", "arguments": [], "chars": 0, "reported": 0, "ready": False, "tracker": _JsonObjectTracker()
+            })
+            if tool_call.id:
+                call["id"] = tool_call.id
+            function = tool_call.function
+            if function is None:
+                continue
+            if function.name:
+                call["name"] += function.name
+                self._emit({"event": "tool_call_started", "name": call["name"]})
+            if function.arguments:
+                call["arguments"].append(function.arguments)
+                call["chars"] += len(function.arguments)
+                if call["chars"] - call["reported"] >= self.PROGRESS_EVERY:
+                    call["reported"] = call["chars"]
+                    self._emit({"event": "tool_arguments", "name": call["name"], "chars": call["chars"]})
+                if call["tracker"].feed(function.arguments):
+                    self._ready(tool_call.index)
+
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+            for index in self.tool_calls:
+                self._ready(index)
+
+    def result(self) -> Dict[str, Any]:
+        self._emit({"event": "done", "finish_reason": self.finish_reason})
+        if self.finish_reason == "tool_calls" and self.tool_calls:
+            function_calls = [
+                {
+                    "id": self.tool_calls[index]["id"],
+                    "name": self.tool_calls[index]["name"],
+                    "arguments": "".join(self.tool_calls[index]["arguments"])
+                }
+                for index in sorted(self.tool_calls)
+            ]
+            return {"function_call": function_calls[0], "function_calls": function_calls}
+        return {"content": "".join(self.content)}
+
+class OA_LLM:
+    def __init__(self, agent_name: str = "default", cache: Optional[ResponseCache] = None, backend: Optional[LLMBackend] = None):
+        self.agent_name = agent_name
+        self.backend = backend or get_backend()
         self.model = "gpt-4o-mini"
+        self.cache = cache or get_default_cache()
 
     def generate_response(self, system_prompt: str, user_prompt: str, tools: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-        
-        if tools:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                tools=tools,
-                tool_choice="auto"
-            )
-        else:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages
-            )
-        
-        choice = response.choices[0]
-        message = choice.message
-        
-        if choice.finish_reason == "tool_calls":
-            return {
-                "function_call": {
-                    "name": message.tool_calls[0].function.name,
-                    "arguments": message.tool_calls[0].function.arguments
-                }
-            }
-        else:
-            return {"content": message.content}
+        return self.generate_chat(_build_messages(system_prompt, user_prompt), tools)
+
+    def generate_chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        request = _build_request(self.model, messages, tools)
+        cache_key = self.cache.make_key(request)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        response = self.backend.complete(request, agent=self.agent_name)
+        result = _parse_response(response)
+        self.cache.set(cache_key, result)
+        return result
 
     def generate_structured_response(self, system_prompt: str, user_prompt: str) -> Dict[str, List[Dict[str, Any]]]:
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"{user_prompt}\n\nPlease provide your response in JSON format."}
-            ],
-            response_format={"type": "json_object"}
-        )
-        
+        request = _build_structured_request(self.model, system_prompt, user_prompt)
+        cache_key = self.cache.make_key(request)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        response = self.backend.complete(request, agent=self.agent_name)
+
+        tasks_data = json.loads(response.choices[0].message.content)
+        self.cache.set(cache_key, tasks_data)
+        return tasks_data  # This should be a dictionary with a 'tasks' key
+
+class AsyncOA_LLM:
+    def __init__(self, agent_name: str = "default", cache: Optional[ResponseCache] = None, backend: Optional[LLMBackend] = None):
+        self.agent_name = agent_name
+        self.backend = backend or get_backend()
+        self.model = "gpt-4o-mini"
+        self.cache = cache or get_default_cache()
+
+    async def generate_response(self, system_prompt: str, user_prompt: str, tools: Optional[List[Dict[str, Any]]] = None,
+                                on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                on_tool_ready: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        return await self.generate_chat(_build_messages(system_prompt, user_prompt), tools, on_event, on_tool_ready)
+
+    async def generate_chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None,
+                            on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+                            on_tool_ready: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Complete a full message list (system, user, assistant and tool messages).
+
+        Passing `on_event` or `on_tool_ready` switches to a streamed completion: progress events are
+        reported while the response is generated and each tool call is handed to `on_tool_ready`
+        as soon as its arguments are complete. The returned dict has the same shape either way.
+        """
+        request = _build_request(self.model, messages, tools)
+        cache_key = self.cache.make_key(request)
+        cached = await self.cache.aget(cache_key)
+        if cached is not None:
+            return cached
+
+        if on_event or on_tool_ready:
+            assembler = _StreamAssembler(on_event, on_tool_ready)
+            async for chunk in self.backend.astream(request, agent=self.agent_name):
+                assembler.feed(chunk)
+            result = assembler.result()
+        else:
+            response = await self.backend.acomplete(request, agent=self.agent_name)
+            result = _parse_response(response)
+        await self.cache.aset(cache_key, result)
+        return result
+
+    async def generate_structured_response(self, system_prompt: str, user_prompt: str) -> Dict[str, List[Dict[str, Any]]]:
+        request = _build_structured_request(self.model, system_prompt, user_prompt)
+        cache_key = self.cache.make_key(request)
+        cached = await self.cache.aget(cache_key)
+        if cached is not None:
+            return cached
+
+        response = await self.backend.acomplete(request, agent=self.agent_name)
+
         tasks_data = json.loads(response.choices[0].message.content)
-        return tasks_data  # This should be a dictionary with a 'tasks' key
\ No newline at end of file
+        await self.cache.aset(cache_key, tasks_data)
+        return tasks_data  # This should be a dictionary with a 'tasks' key
@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import deque, defaultdict
+from typing import Dict, Any, Optional, AsyncIterator
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from .backends import LLMBackend
+from .rate_limiter import AdaptiveRateLimiter, estimate_request_tokens, DEFAULT_REQUESTS_PER_MIN, DEFAULT_TOKENS_PER_MIN
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_CONCURRENCY = 8
+
+class ConcurrencyLimiter:
+    """
+    Counting semaphore shared by threads and event loops.
+
+    Sync callers block on a threading.Event, async callers await a future on their own loop;
+    release() wakes waiters in FIFO order whichever side they are on. The limit can be changed
+    at runtime.
+    """
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._waiters = deque()
+
+    def acquire(self):
+        with self._lock:
+            if self.in_flight < self.limit and not self._waiters:
+                self.in_flight += 1
+                return
+            event = threading.Event()
+            self._waiters.append(("thread", event))
+        event.wait()
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_flight < self.limit and not self._waiters:
+                self.in_flight += 1
+                return
+            future = loop.create_future()
+            waiter = ("async", (loop, future))
+            self._waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            # The slot was handed to us just before cancellation; pass it on
+            self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._wake_waiters()
+
+    def set_limit(self, limit: int):
+        with self._lock:
+            self.limit = max(1, limit)
+            self._wake_waiters()
+
+    def _wake_waiters(self):
+        # Called with self._lock held; each woken waiter takes over one slot
+        while self._waiters and self.in_flight < self.limit:
+            kind, waiter = self._waiters.popleft()
+            self.in_flight += 1
+            if kind == "thread":
+                waiter.set()
+            else:
+                loop, future = waiter
+                loop.call_soon_threadsafe(self._resolve, future)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future):
+        if not future.done():
+            future.set_result(None)
+
+class LLMGateway(LLMBackend):
+    """
+    Process-wide entry point for chat completions.
+
+    Owns one pooled sync client (and one async client per event loop, since async pools are
+    loop-bound; each is closed when its loop shuts down) with a shared connection cap, limits
+    the number of requests in flight across every agent, and keeps per-agent call, token and
+    latency accounting.
+
+    Throttling and transient failures (429, 5xx, connection errors) are absorbed here by the
+    AdaptiveRateLimiter, so callers only see an exception once its retries are exhausted.
+    The SDK's own retries are disabled to keep a single backoff policy.
+    """
+    def __init__(self, api_key: Optional[str], max_connections: int = DEFAULT_MAX_CONNECTIONS, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 requests_per_min: float = DEFAULT_REQUESTS_PER_MIN, tokens_per_min: float = DEFAULT_TOKENS_PER_MIN):
+        self.api_key = api_key
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.limiter = ConcurrencyLimiter(max_concurrency)
+        self.rate_limiter = AdaptiveRateLimiter(self.limiter, max_concurrency, requests_per_min=requests_per_min, tokens_per_min=tokens_per_min)
+        self.client = OpenAI(api_key=api_key, max_retries=0, http_client=httpx.Client(limits=self.limits))
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._stats_lock = threading.Lock()
+        self.usage: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
+            "calls": 0,
+            "errors": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "latency": 0.0
+        })
+
+    def async_client(self) -> AsyncOpenAI:
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(api_key=self.api_key, max_retries=0, http_client=httpx.AsyncClient(limits=self.limits))
+            self._async_clients[loop] = client
+            loop.create_task(self._close_on_shutdown(loop, client))
+        return client
+
+    async def _close_on_shutdown(self, loop: asyncio.AbstractEventLoop, client: AsyncOpenAI):
+        # asyncio.run cancels leftover tasks before closing its loop; that is when the loop's pool goes
+        try:
+            await loop.create_future()
+        finally:
+            self._async_clients.pop(loop, None)
+            await client.close()
+
+    def complete(self, request: Dict[str, Any], agent: str = "default"):
+        estimated_tokens = estimate_request_tokens(request)
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(estimated_tokens)
+            self.limiter.acquire()
+            started = time.perf_counter()
+            try:
+                raw = self.client.chat.completions.with_raw_response.create(**request)
+                response = raw.parse()
+            except Exception as e:
+                self._record(agent, started, error=True)
+                delay = self.rate_limiter.retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            else:
+                self.rate_limiter.on_success(raw.headers, estimated_tokens, getattr(response, "usage", None))
+                self._record(agent, started, usage=getattr(response, "usage", None))
+                return response
+            finally:
+                self.limiter.release()
+            time.sleep(delay)
+            attempt += 1
+
+    async def acomplete(self, request: Dict[str, Any], agent: str = "default"):
+        estimated_tokens = estimate_request_tokens(request)
+        attempt = 0
+        while True:
+            await self.rate_limiter.aacquire(estimated_tokens)
+            await self.limiter.aacquire()
+            started = time.perf_counter()
+            try:
+                raw = await self.async_client().chat.completions.with_raw_response.create(**request)
+                response = await raw.parse()
+            except Exception as e:
+                self._record(agent, started, error=True)
+                delay = self.rate_limiter.retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            else:
+                self.rate_limiter.on_success(raw.headers, estimated_tokens, getattr(response, "usage", None))
+                self._record(agent, started, usage=getattr(response, "usage", None))
+                return response
+            finally:
+                self.limiter.release()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def astream(self, request: Dict[str, Any], agent: str = "default") -> AsyncIterator[Any]:
+        """
+        Stream completion chunks. Throttling and retries apply until the stream is opened; the
+        concurrency slot is held until the stream is exhausted or closed.
+        """
+        request = dict(request, stream=True, stream_options={"include_usage": True})
+        estimated_tokens = estimate_request_tokens(request)
+        attempt = 0
+        while True:
+            await self.rate_limiter.aacquire(estimated_tokens)
+            await self.limiter.aacquire()
+            started = time.perf_counter()
+            try:
+                raw = await self.async_client().chat.completions.with_raw_response.create(**request)
+                stream = await raw.parse()
+            except Exception as e:
+                self.limiter.release()
+                self._record(agent, started, error=True)
+                delay = self.rate_limiter.retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            break
+
+        usage = None
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                yield chunk
+        except Exception:
+            self._record(agent, started, error=True)
+            raise
+        finally:
+            self.limiter.release()
+        self.rate_limiter.on_success(raw.headers, estimated_tokens, usage)
+        self._record(agent, started, usage=usage)
+
+    def _record(self, agent: str, started: float, usage=None, error: bool = False):
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            stats = self.usage[agent]
+            stats["calls"] += 1
+            stats["latency"] += elapsed
+            if error:
+                stats["errors"] += 1
+            if usage is not None:
+                stats["prompt_tokens"] += usage.prompt_tokens or 0
+                stats["completion_tokens"] += usage.completion_tokens or 0
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._stats_lock:
+            return {agent: dict(stats) for agent, stats in self.usage.items()}
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+def get_gateway(api_key: Optional[str] = None) -> LLMGateway:
+    """
+    Shared gateway for the process. LLM_MAX_CONNECTIONS and LLM_MAX_CONCURRENCY override the
+    connection pool size and the maximum number of requests in flight; LLM_REQUESTS_PER_MIN and
+    LLM_TOKENS_PER_MIN seed the rate limiter until the provider's headers are seen.
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            api_key = api_key or os.environ.get("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY not found in environment variables")
+            _gateway = LLMGateway(
+                api_key,
+                max_connections=int(os.environ.get("LLM_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+                max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+                requests_per_min=float(os.environ.get("LLM_REQUESTS_PER_MIN", DEFAULT_REQUESTS_PER_MIN)),
+                tokens_per_min=float(os.environ.get("LLM_TOKENS_PER_MIN", DEFAULT_TOKENS_PER_MIN))
+            )
+        return _gateway
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import logging
+import random
+import re
+import threading
+import time
+from typing import Dict, Any, Optional
+from openai import RateLimitError, APIStatusError, APIConnectionError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REQUESTS_PER_MIN = 500
+DEFAULT_TOKENS_PER_MIN = 200000
+DEFAULT_COMPLETION_TOKENS = 1000  # Reserved per request until the real usage is known
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    # Rate-limit reset headers look like "1s", "6m0s" or "20ms"
+    if not value:
+        return None
+    seconds = 0.0
+    for amount, unit in _DURATION_PART.findall(value):
+        seconds += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return seconds
+
+def estimate_request_tokens(request: Dict[str, Any]) -> int:
+    # Roughly four characters per token for the prompt, plus headroom for the completion
+    prompt_chars = len(json.dumps(request.get("messages", []))) + len(json.dumps(request.get("tools", [])))
+    return prompt_chars // 4 + request.get("max_tokens", DEFAULT_COMPLETION_TOKENS)
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `capacity` per minute.
+
+    reserve() always takes the amount immediately (the level may go negative) and returns how
+    long the caller has to wait, so concurrent callers queue up fairly without polling.
+    """
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+            return max(0.0, -self.level / self.rate)
+
+    def adjust(self, amount: float):
+        # Positive refunds an over-reservation, negative charges for an under-estimate
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+    def sync(self, limit: Optional[float], remaining: Optional[float], reset: Optional[float] = None):
+        # Follow the provider's view of our quota from the x-ratelimit-* headers
+        with self._lock:
+            self._refill()
+            if limit:
+                self.capacity = float(limit)
+                self.rate = self.capacity / 60.0
+            if remaining is not None:
+                self.level = min(self.level, float(remaining))
+                if remaining <= 0 and reset:
+                    # Exhausted: hold new reservations until the provider's window resets
+                    self.level = min(self.level, -reset * self.rate)
+
+class AdaptiveRateLimiter:
+    """
+    Client-side throttling for the LLM gateway.
+
+    Requests/min and tokens/min buckets gate every attempt and are kept in sync with the
+    provider's rate-limit headers. 429s, 5xx responses and connection errors are retried with
+    jittered exponential backoff (honouring retry-after), and the gateway's concurrency limit is
+    adjusted AIMD-style: halved on a 429, raised by one after a full window of successes.
+    """
+    def __init__(self, concurrency=None, max_concurrency: Optional[int] = None,
+                 requests_per_min: float = DEFAULT_REQUESTS_PER_MIN, tokens_per_min: float = DEFAULT_TOKENS_PER_MIN,
+                 max_retries: int = 6, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.requests = TokenBucket(requests_per_min)
+        self.tokens = TokenBucket(tokens_per_min)
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency or (concurrency.limit if concurrency else 1)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.throttled = 0
+        self.retries = 0
+        self._successes = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        if wait > 0:
+            with self._lock:
+                self.throttled += 1
+        return wait
+
+    def acquire(self, estimated_tokens: int):
+        wait = self._reserve(estimated_tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, estimated_tokens: int):
+        wait = self._reserve(estimated_tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self, headers, estimated_tokens: int, usage=None):
+        self._sync_headers(headers)
+        if usage is not None and usage.total_tokens is not None:
+            self.tokens.adjust(estimated_tokens - usage.total_tokens)
+        if self.concurrency is None:
+            return
+        with self._lock:
+            self._successes += 1
+            if self._successes >= self.concurrency.limit and self.concurrency.limit < self.max_concurrency:
+                self._successes = 0
+                self.concurrency.set_limit(self.concurrency.limit + 1)
+
+    def retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying `error`, or None if it should propagate to the caller."""
+        if attempt >= self.max_retries or not self._is_retryable(error):
+            return None
+
+        response = getattr(error, "response", None)
+        headers = response.headers if response is not None else {}
+        self._sync_headers(headers)
+        if isinstance(error, RateLimitError) and self.concurrency is not None:
+            with self._lock:
+                self._successes = 0
+                self.concurrency.set_limit(max(1, self.concurrency.limit // 2))
+
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt)) * random.uniform(0.5, 1.0)
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        with self._lock:
+            self.retries += 1
+        logger.warning(f"LLM request failed ({type(error).__name__}), retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+        return delay
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, (RateLimitError, APIConnectionError)):
+            return True
+        return isinstance(error, APIStatusError) and error.status_code >= 500
+
+    def _sync_headers(self, headers):
+        if not headers:
+            return
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            try:
+                bucket.sync(float(limit) if limit else None, float(remaining) if remaining else None, reset)
+            except ValueError:
+                continue
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "concurrency": self.concurrency.limit if self.concurrency else None
+        }
@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from typing import List, Dict, Any, Optional, AsyncIterator
+from .backends import LLMBackend, FakeLLMBackend, get_backend, set_default_backend
+from .cache import ResponseCache
+
+RUN_LOG_VERSION = 1
+
+_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?")
+
+class RunLog:
+    """
+    Append-only JSON-lines log of one goal run.
+
+    Each line is one event: {"seq", "kind", "t" (start time, in seconds since the log was opened), "latency", ...}.
+    Kinds are "llm" (one backend call and its normalized response), "tool" (a tool call with
+    its result) and "sandbox" (a sandbox execution). Lines are flushed as they are written, so a
+    crashed run still leaves a usable log.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._started = time.perf_counter()
+        self.record("run", {"version": RUN_LOG_VERSION, "started_at": time.time()})
+
+    def record(self, kind: str, payload: Dict[str, Any], latency: float = 0.0):
+        with self._lock:
+            self._seq += 1
+            entry = {"seq": self._seq, "kind": kind, "t": round(max(0.0, time.perf_counter() - self._started - latency), 6), "latency": round(latency, 6)}
+            entry.update(payload)
+            self._file.write(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    @staticmethod
+    def read(path: str) -> List[Dict[str, Any]]:
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+def loose_key(request: Dict[str, Any]) -> str:
+    # Cache key with timestamps blanked out, so context entries stamped at run time still match
+    return ResponseCache.make_key(json.loads(_TIMESTAMP.sub("<time>", json.dumps(request, default=str))))
+
+def _usage_dict(usage) -> Optional[Dict[str, int]]:
+    if usage is None:
+        return None
+    return {"prompt_tokens": usage.prompt_tokens or 0, "completion_tokens": usage.completion_tokens or 0}
+
+def _reply_from_completion(completion) -> Dict[str, Any]:
+    choice = completion.choices[0]
+    reply = {"content": choice.message.content, "finish_reason": choice.finish_reason}
+    if choice.message.tool_calls:
+        reply["tool_calls"] = [
+            {"id": tool_call.id, "name": tool_call.function.name, "arguments": tool_call.function.arguments}
+            for tool_call in choice.message.tool_calls
+        ]
+    usage = _usage_dict(getattr(completion, "usage", None))
+    if usage:
+        reply["usage"] = usage
+    return reply
+
+class _StreamRecorder:
+    """Rebuilds the final message from stream chunks so a streamed call logs like a plain one."""
+    def __init__(self):
+        self.content = []
+        self.tool_calls = {}
+        self.finish_reason = None
+        self.usage = None
+
+    def feed(self, chunk):
+        if getattr(chunk, "usage", None) is not None:
+            self.usage = chunk.usage
+        for choice in chunk.choices or []:
+            if choice.finish_reason:
+                self.finish_reason = choice.finish_reason
+            delta = choice.delta
+            if delta.content:
+                self.content.append(delta.content)
+            for tool_call in delta.tool_calls or []:
+                call = self.tool_calls.setdefault(tool_call.index, {"id": None, "name": "", "arguments": []})
+                if tool_call.id:
+                    call["id"] = tool_call.id
+                if tool_call.function and tool_call.function.name:
+                    call["name"] = tool_call.function.name
+                if tool_call.function and tool_call.function.arguments:
+                    call["arguments"].append(tool_call.function.arguments)
+
+    def reply(self) -> Dict[str, Any]:
+        reply = {"content": "".join(self.content) or None, "finish_reason": self.finish_reason}
+        if self.tool_calls:
+            reply["tool_calls"] = [
+                {"id": call["id"], "name": call["name"], "arguments": "".join(call["arguments"])}
+                for _, call in sorted(self.tool_calls.items())
+            ]
+        usage = _usage_dict(self.usage)
+        if usage:
+            reply["usage"] = usage
+        return reply
+
+class RecordingBackend(LLMBackend):
+    """
+    Wraps another backend and logs every call to a RunLog.
+
+    Requests are logged by their cache key (plus the agent name) rather than in full, which
+    keeps the log compact and is all ReplayBackend needs to match them; pass
+    include_requests=True to keep the full request bodies for inspection.
+    """
+    def __init__(self, inner: LLMBackend, run_log: RunLog, include_requests: bool = False):
+        self.inner = inner
+        self.run_log = run_log
+        self.include_requests = include_requests
+
+    def _record(self, request: Dict[str, Any], agent: str, started: float, reply: Dict[str, Any]):
+        payload = {"agent": agent, "key": ResponseCache.make_key(request), "loose_key": loose_key(request), "response": reply}
+        if self.include_requests:
+            payload["request"] = request
+        self.run_log.record("llm", payload, time.perf_counter() - started)
+
+    def complete(self, request: Dict[str, Any], agent: str = "default"):
+        started = time.perf_counter()
+        completion = self.inner.complete(request, agent)
+        self._record(request, agent, started, _reply_from_completion(completion))
+        return completion
+
+    async def acomplete(self, request: Dict[str, Any], agent: str = "default"):
+        started = time.perf_counter()
+        completion = await self.inner.acomplete(request, agent)
+        self._record(request, agent, started, _reply_from_completion(completion))
+        return completion
+
+    async def astream(self, request: Dict[str, Any], agent: str = "default") -> AsyncIterator[Any]:
+        started = time.perf_counter()
+        recorder = _StreamRecorder()
+        async for chunk in self.inner.astream(request, agent):
+            recorder.feed(chunk)
+            yield chunk
+        self._record(request, agent, started, recorder.reply())
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return self.inner.stats()
+
+    def __getattr__(self, name: str):
+        # Expose the wrapped backend's extras (e.g. the gateway's rate_limiter)
+        return getattr(self.inner, name)
+
+class ReplayBackend(FakeLLMBackend):
+    """
+    Serves the LLM responses of a recorded run, with no network access.
+
+    Each request is matched to an unused recording with the same cache key, then with the same
+    key once timestamps are ignored; when the request has drifted further (e.g. a scheduler or
+    context change altered a prompt) it falls back to the agent's next unused recording in the
+    original order. Recorded latencies are replayed
+    scaled by `latency_scale`: 1.0 reproduces the original timing, 0.1 runs ten times faster
+    and 0 removes it.
+    """
+    def __init__(self, entries: List[Dict[str, Any]], latency_scale: float = 1.0):
+        super().__init__()
+        self.latency_scale = latency_scale
+        self._by_key = defaultdict(deque)
+        self._by_loose_key = defaultdict(deque)
+        self._by_agent = defaultdict(deque)
+        self._used = set()
+        self.matched = 0
+        self.drifted = 0
+        self.total = 0
+        for entry in entries:
+            if entry["kind"] == "llm":
+                self._by_key[entry["key"]].append(entry)
+                self._by_loose_key[entry.get("loose_key")].append(entry)
+                self._by_agent[entry["agent"]].append(entry)
+                self.total += 1
+
+    def _take(self, queue: Optional[deque]) -> Optional[Dict[str, Any]]:
+        while queue:
+            entry = queue.popleft()
+            if entry["seq"] not in self._used:
+                self._used.add(entry["seq"])
+                return entry
+        return None
+
+    def _next_reply(self, request: Dict[str, Any], agent: str) -> Dict[str, Any]:
+        key = ResponseCache.make_key(request)
+        with self._lock:
+            entry = self._take(self._by_key.get(key)) or self._take(self._by_loose_key.get(loose_key(request)))
+            if entry is not None:
+                self.matched += 1
+            else:
+                entry = self._take(self._by_agent.get(agent))
+                if entry is None:
+                    raise RuntimeError(f"Run log has no more recorded LLM responses for {agent}")
+                self.drifted += 1
+        return dict(entry["response"], latency=entry["latency"])
+
+    def _reply_latency(self, reply: Dict[str, Any]) -> float:
+        return reply.get("latency", 0.0) * self.latency_scale
+
+    def report(self) -> Dict[str, int]:
+        with self._lock:
+            return {"recorded": self.total, "matched": self.matched, "drifted": self.drifted, "unused": self.total - len(self._used)}
+
+def record_run(path: str, include_requests: bool = False) -> RunLog:
+    """Start logging every LLM call made by OA_LLM instances created from now on."""
+    run_log = RunLog(path)
+    set_default_backend(RecordingBackend(get_backend(), run_log, include_requests))
+    return run_log
+
+def replay_run(path: str, latency_scale: float = 1.0) -> ReplayBackend:
+    """Serve LLM calls made by OA_LLM instances created from now on from a recorded run."""
+    backend = ReplayBackend(RunLog.read(path), latency_scale)
+    set_default_backend(backend)
+    return backend
+
+def summarize_run(entries: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Call counts and total latency per LLM agent, tool and sandbox, plus the run's wall clock."""
+    summary = defaultdict(lambda: {"count": 0, "latency": 0.0})
+    for entry in entries:
+        if entry["kind"] == "llm":
+            name = f"llm:{entry['agent']}"
+        elif entry["kind"] == "tool":
+            name = f"tool:{entry['name']}"
+        elif entry["kind"] == "sandbox":
+            name = "sandbox"
+        else:
+            continue
+        summary[name]["count"] += 1
+        summary[name]["latency"] += entry["latency"]
+    summary["wall_clock"] = {"count": 1, "latency": max((entry["t"] + entry["latency"] for entry in entries), default=0.0)}
+    return dict(summary)
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a recorded run, or compare two runs")
+    parser.add_argument("run_log")
+    parser.add_argument("other", nargs="?", help="Second run log to compare against the first")
+    args = parser.parse_args()
+
+    first = summarize_run(RunLog.read(args.run_log))
+    second = summarize_run(RunLog.read(args.other)) if args.other else None
+    for name in sorted(set(first) | set(second or {})):
+        a = first.get(name, {"count": 0, "latency": 0.0})
+        line = f"{name:<28} {a['count']:>6} calls {a['latency']:10.3f}s"
+        if second is not None:
+            b = second.get(name, {"count": 0, "latency": 0.0})
+            delta = (b["latency"] - a["latency"]) / a["latency"] * 100 if a["latency"] else 0.0
+            line += f"  ->  {b['count']:>6} calls {b['latency']:10.3f}s ({delta:+.1f}%)"
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Dict, Any
+
+# Same pre-tokenization shape as the GPT BPE tokenizers (contractions, words with their leading
+# space, short digit runs, punctuation runs, whitespace), with long words and symbol runs split
+# into chunks so that every match is roughly one token and counting never leaves C code.
+_TOKENS = re.compile(r"'(?:s|t|re|ve|m|ll|d)| ?[A-Za-z]{1,6}| ?\d{1,3}| ?[^\sA-Za-z\d]{1,4}|\s+")
+
+SHORT_TEXT_CHARS = 2048  # Texts up to this long are cached by value
+MAX_LONG_COUNTS = 1024
+
+_long_counts = OrderedDict()  # digest of a longer text -> its count, LRU
+_long_counts_lock = threading.Lock()
+
+@lru_cache(maxsize=8192)
+def _count_short(text: str) -> int:
+    return len(_TOKENS.findall(text))
+
+def count_tokens(text: str) -> int:
+    """
+    Approximate token count of `text` for the GPT-4o family, computed locally.
+
+    Errs slightly high against the real tokenizer on English and code, which is what budgeting
+    needs. Results are cached, so re-measuring the same prompt sections is free; longer texts
+    (file contents, tool output) are cached by digest so the cache does not keep them alive.
+    """
+    if not text:
+        return 0
+    if len(text) <= SHORT_TEXT_CHARS:
+        return _count_short(text)
+    key = hashlib.blake2b(text.encode("utf-8", errors="surrogatepass"), digest_size=16).digest()
+    with _long_counts_lock:
+        count = _long_counts.get(key)
+        if count is not None:
+            _long_counts.move_to_end(key)
+            return count
+    count = len(_TOKENS.findall(text))
+    with _long_counts_lock:
+        _long_counts[key] = count
+        while len(_long_counts) > MAX_LONG_COUNTS:
+            _long_counts.popitem(last=False)
+    return count
+
+def count_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    # Each chat message carries a few tokens of framing on top of its content
+    total = 2
+    for message in messages:
+        total += 4 + count_tokens(message.get("content") or "")
+        for tool_call in message.get("tool_calls") or []:
+            function = tool_call.get("function", {})
+            total += count_tokens(function.get("name", "")) + count_tokens(function.get("arguments", ""))
+    return total
+
+def count_json_tokens(value: Any) -> int:
+    return count_tokens(json.dumps(value))
+
+def truncate_to_tokens(text: str, max_tokens: int, keep: str = "head") -> str:
+    """
+    Cut `text` to at most `max_tokens`, keeping the start ("head") or the end ("tail") and
+    marking the cut so the model knows something was left out.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    marker_budget = 12
+    budget = max(0, max_tokens - marker_budget)
+    pieces = _TOKENS.findall(text)
+    omitted = len(pieces) - budget
+    if keep == "tail":
+        return f"[... {omitted} tokens omitted ...]\n" + "".join(pieces[len(pieces) - budget:] if budget else [])
+    return "".join(pieces[:budget]) + f"\n[... {omitted} tokens omitted ...]"
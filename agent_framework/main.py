@@ -1,14 +1,29 @@
 from coordinator import Coordinator
+import argparse
 import logging
+import os
 from cli.base import BasicCLI
+from llm.recorder import record_run, replay_run
 import threading
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 def main():
+    parser = argparse.ArgumentParser(description="Run the multi-agent framework on a goal")
+    parser.add_argument("--record", metavar="RUN_LOG", help="Append every LLM call, tool call and sandbox result to this run log")
+    parser.add_argument("--replay", metavar="RUN_LOG", help="Serve LLM responses from a recorded run instead of the network")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="Scale recorded LLM latency during replay (0 disables it)")
+    args = parser.parse_args()
+
+    if args.record or args.replay:
+        # Cache hits would hide calls from the recording and skip recorded ones on replay
+        os.environ["LLM_CACHE"] = "off"
+    replay_backend = replay_run(args.replay, args.replay_speed) if args.replay else None
+    run_log = record_run(args.record) if args.record else None
+
     # cli = BasicCLI()
-    coordinator = Coordinator()
+    coordinator = Coordinator(run_log=run_log)
     
     # cli_thread = threading.Thread(target=cli.start)
     # cli_thread.start()
@@ -28,7 +43,11 @@ def main():
         coordinator.process_goal(goal)
     except KeyboardInterrupt:
         logger.info("Keyboard interrupt received. Stopping the program.")
-    # finally:
+    finally:
+        if run_log:
+            run_log.close()
+        if replay_backend:
+            logger.info(f"Replay: {replay_backend.report()}")
         # cli.stop()
         # cli_thread.join()
 
@@ -26,6 +26,7 @@ class AgentPrompts(Enum):
                 "task_description": "Detailed description of the specific task",
                 "estimated_complexity": "Low/Medium/High",
                 "file_path": "Exact file path for the task (e.g., 'src/game.js')",
+                "depends_on": [1, 2]
             }},
             // ... more tasks ...
         ]
@@ -43,6 +44,7 @@ class AgentPrompts(Enum):
     - Add tasks for writing unit tests and performing code reviews after implementation tasks.
     - Include tasks for refactoring and optimizing code after initial implementation.
     - Always include the file_path for each task, even if it's not a coding task (use an empty string if not applicable).
+    - Tasks are numbered from 1 in the order you list them. Use depends_on to list the numbers of earlier tasks that must be finished first (use an empty list if the task is independent). Independent tasks may be executed in parallel.
     - The agent can only execute Python code directly. For HTML, CSS, and JavaScript, the agent can only write and read files.
     - Do not include tasks that require external tools or environments that are not explicitly provided.
     - Include tasks for integrating different components of the project.
@@ -66,9 +68,9 @@ class AgentPrompts(Enum):
 
     Your objective is to complete this task while keeping the overall goal in mind. Follow these guidelines:
 
-    1. Read the existing code ONLY if necessary for the current task. Do not read files unnecessarily.
+    1. Read the existing code ONLY if necessary for the current task. Do not read files unnecessarily; use list_symbols and read_symbol to read just the definitions you need.
     2. Write clean, efficient, and well-documented code that fully implements the required functionality.
-    3. Use the write_file function to create or update files, setting is_project_file to true for source code files.
+    3. Use the write_file function to create files, setting is_project_file to true for source code files. To change an existing file, use apply_patch with only the lines that change instead of rewriting the whole file. If an edit made things worse, use rollback_file to restore an earlier version.
     4. After writing code, use the read_codebase function to verify the changes.
     5. For Python files, use the run_python_file function to test your code in a sandbox environment.
     6. For HTML, CSS, and JavaScript files, perform a self-review and explain your testing strategy.
@@ -78,6 +80,8 @@ class AgentPrompts(Enum):
     10. If you complete the task, use the mark_task_complete function to indicate that the task is finished.
     11. Before marking a task as complete, review the overall goal and ensure your implementation aligns with it.
 
+    You can call tools over several turns: the result of each tool call is sent back to you, so you can read, write, run and fix code within this task. When the task is done, call mark_task_complete or reply with a short summary and no tool calls.
+
     Remember: Only Python files can be executed in the sandbox environment. For HTML, CSS, and JavaScript, provide a detailed explanation of how you would test these files manually, including different scenarios and edge cases.
     """
 
@@ -94,11 +98,11 @@ class AgentPrompts(Enum):
 
     Your objective is to complete this testing task thoroughly. Follow these guidelines:
 
-    1. Read the code to be tested using the read_file function.
+    1. Read the code to be tested using list_symbols and read_symbol, or read_file when you need the whole file.
     2. Design a comprehensive test suite that covers all scenarios, edge cases, and potential issues.
     3. Write clear, well-structured unit tests using the unittest framework.
     4. Ensure that your tests cover all features mentioned in the overall goal.
-    5. Use the write_file function to create or update test files, setting is_project_file to true.
+    5. Use the write_file function to create test files, setting is_project_file to true, and apply_patch to change existing ones.
     6. After writing tests, use the read_codebase function to verify the changes.
     7. Use the run_python_file function to execute the tests in a safe environment. Set is_unit_test to true when running unit tests.
     8. Analyze the execution results carefully, paying attention to any failures or unexpected behaviors.
@@ -107,6 +111,8 @@ class AgentPrompts(Enum):
     11. Provide a detailed report of the test results, including any issues found, suggestions for improvement, and confirmation that all features are working as expected.
     12. If you identify any missing features or inconsistencies with the overall goal, report them clearly.
 
+    You can call tools over several turns: the result of each tool call is sent back to you. When the task is done, call mark_task_complete or reply with a short report and no tool calls.
+
     Always use the run_python_file function to run your tests and verify the results. If you encounter any issues, explain your reasoning and the steps you're taking to resolve them. Your thorough testing is crucial to ensuring the project meets all requirements.
     """
 
@@ -118,6 +124,9 @@ class AgentPrompts(Enum):
     Result: {result}
     Overall Goal: {overall_goal}
 
+    What other agents have done so far:
+    {context}
+
     Provide a concise review focusing on:
     1. Task completion and correctness
     2. Alignment with the overall goal
@@ -152,4 +161,10 @@ class AgentPrompts(Enum):
     Next steps: [Key next step or adjustment]
 
     Be concise and to the point, ensuring only the most important information is included.
-    """
\ No newline at end of file
+    """
+    CONTEXT_SUMMARY_SYSTEM = """You compress the working history of an AI agent. Keep every fact a later task could need: files created or changed, what they contain, test results, errors and decisions. Drop repetition and anything that no longer matters."""
+
+    CONTEXT_SUMMARY_USER = """Rewrite the following history as a compact summary of at most {max_tokens} tokens, as short bullet points, oldest first:
+
+    {history}
+    """
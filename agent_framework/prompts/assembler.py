@@ -0,0 +1,77 @@
+import logging
+from typing import Any, Optional, Callable
+from llm.tokenizer import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# Context window per model, in tokens
+MODEL_CONTEXT_LIMITS = {
+    "gpt-4o-mini": 128000,
+    "gpt-4o": 128000,
+}
+DEFAULT_CONTEXT_LIMIT = 16000
+RESERVED_COMPLETION_TOKENS = 4000
+DEFAULT_PROMPT_BUDGET = 12000  # Well under the limit: smaller prompts are cheaper and faster
+
+REQUIRED = None  # Priority of sections that are never shrunk
+
+class Section:
+    """
+    One field of a prompt template.
+
+    Sections with a lower priority are shrunk first. `summarize`, when given, produces a
+    compact rendering that is tried before plain truncation; `keep` chooses whether
+    truncation keeps the start ("head") or the most recent end ("tail") of the text.
+    """
+    def __init__(self, text: str, priority: Optional[int] = REQUIRED, keep: str = "head",
+                 summarize: Optional[Callable[[], str]] = None, min_tokens: int = 0):
+        self.text = text
+        self.priority = priority
+        self.keep = keep
+        self.summarize = summarize
+        self.min_tokens = min_tokens
+
+    def shrink(self, max_tokens: int) -> str:
+        text = self.text
+        if self.summarize is not None:
+            text = self.summarize()
+        return truncate_to_tokens(text, max(max_tokens, self.min_tokens), self.keep)
+
+class PromptAssembler:
+    """
+    Fills a prompt template while keeping system prompt + user prompt within a token budget.
+
+    Every section is measured with the local tokenizer; when the total is over budget the
+    lowest-priority sections are summarized or truncated until it fits. Each assembled prompt
+    is logged with its per-section token counts so budgets can be tuned.
+    """
+    def __init__(self, model: str, agent: str = "default", budget: Optional[int] = None):
+        limit = MODEL_CONTEXT_LIMITS.get(model, DEFAULT_CONTEXT_LIMIT) - RESERVED_COMPLETION_TOKENS
+        self.model = model
+        self.agent = agent
+        self.budget = min(limit, budget or DEFAULT_PROMPT_BUDGET)
+
+    def render(self, template: str, system_prompt: str = "", **sections: Any) -> str:
+        sections = {name: value if isinstance(value, Section) else Section(str(value)) for name, value in sections.items()}
+        fixed = count_tokens(system_prompt) + count_tokens(template.format(**{name: "" for name in sections}))
+        texts = {name: section.text for name, section in sections.items()}
+        sizes = {name: count_tokens(text) for name, text in texts.items()}
+        original = sum(sizes.values()) + fixed
+
+        shrinkable = sorted((name for name, section in sections.items() if section.priority is not REQUIRED), key=lambda name: sections[name].priority)
+        for name in shrinkable:
+            excess = fixed + sum(sizes.values()) - self.budget
+            if excess <= 0:
+                break
+            texts[name] = sections[name].shrink(sizes[name] - excess)
+            sizes[name] = count_tokens(texts[name])
+
+        total = fixed + sum(sizes.values())
+        breakdown = ", ".join(f"{name}={size}" for name, size in sizes.items())
+        if total < original:
+            logger.info(f"Prompt for {self.agent}: {total} tokens (trimmed from {original}, budget {self.budget}; fixed={fixed}, {breakdown})")
+        else:
+            logger.info(f"Prompt for {self.agent}: {total} tokens (budget {self.budget}; fixed={fixed}, {breakdown})")
+        if total > self.budget:
+            logger.warning(f"Prompt for {self.agent} is still {total - self.budget} tokens over budget after trimming")
+        return template.format(**texts)
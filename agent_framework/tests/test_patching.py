@@ -0,0 +1,61 @@
+import unittest
+from tools.patching import apply_patch_text, parse_search_replace, PatchConflict
+
+class SearchReplaceTests(unittest.TestCase):
+    def test_parses_blocks(self):
+        patch = "<<<<<<< SEARCH\na = 1\n=======\na = 2\n>>>>>>> REPLACE\n<<<<<<< SEARCH\nb\n=======\n>>>>>>> REPLACE\n"
+        self.assertEqual(parse_search_replace(patch), [("a = 1\n", "a = 2\n"), ("b\n", "")])
+
+    def test_unclosed_block_is_a_conflict(self):
+        with self.assertRaises(PatchConflict):
+            parse_search_replace("<<<<<<< SEARCH\na\n=======\nb\n")
+
+    def test_replaces_unique_match(self):
+        patch = "<<<<<<< SEARCH\n    return 1\n=======\n    return 2\n>>>>>>> REPLACE\n"
+        self.assertEqual(apply_patch_text("def f():\n    return 1\n", patch), ("def f():\n    return 2\n", 1))
+
+    def test_last_line_without_trailing_newline(self):
+        patch = "<<<<<<< SEARCH\n    return 1\n=======\n    return 2\n>>>>>>> REPLACE\n"
+        self.assertEqual(apply_patch_text("def f():\n    return 1", patch), ("def f():\n    return 2", 1))
+
+    def test_ambiguous_and_missing_matches_change_nothing(self):
+        patch = ("<<<<<<< SEARCH\nx\n=======\ny\n>>>>>>> REPLACE\n"
+                 "<<<<<<< SEARCH\nmissing\n=======\nz\n>>>>>>> REPLACE\n")
+        with self.assertRaises(PatchConflict) as caught:
+            apply_patch_text("x\nx\n", patch)
+        self.assertEqual(len(caught.exception.conflicts), 2)
+
+    def test_empty_search_creates_file(self):
+        self.assertEqual(apply_patch_text("", "<<<<<<< SEARCH\n=======\nnew\n>>>>>>> REPLACE\n"), ("new\n", 1))
+
+class UnifiedDiffTests(unittest.TestCase):
+    def test_applies_hunk_with_file_headers(self):
+        patch = "--- a/m.py\n+++ b/m.py\n@@ -1,2 +1,2 @@\n def f():\n-    return 1\n+    return 2\n"
+        self.assertEqual(apply_patch_text("def f():\n    return 1\n", patch), ("def f():\n    return 2\n", 1))
+
+    def test_removed_and_added_lines_that_look_like_headers(self):
+        # A SQL comment "-- old" removed and "++ new" added, inside the hunk's counts
+        original = "select 1;\n-- old\nselect 2;\n"
+        patch = "--- a/q.sql\n+++ b/q.sql\n@@ -1,3 +1,3 @@\n select 1;\n--- old\n+++ new\n select 2;\n"
+        self.assertEqual(apply_patch_text(original, patch), ("select 1;\n++ new\nselect 2;\n", 1))
+
+    def test_header_pair_after_short_counts_starts_next_file(self):
+        patch = ("--- a/m.py\n+++ b/m.py\n@@ -1 +1 @@\n-a\n+b\n c\n"
+                 "--- a/other.py\n+++ b/other.py\n")
+        self.assertEqual(apply_patch_text("a\nc\n", patch), ("b\nc\n", 1))
+
+    def test_keeps_missing_trailing_newline(self):
+        patch = "@@ -2 +2 @@\n-    return 1\n+    return 2\n"
+        self.assertEqual(apply_patch_text("def f():\n    return 1", patch), ("def f():\n    return 2", 1))
+
+    def test_drifted_hunk_still_applies(self):
+        original = "".join(f"line {i}\n" for i in range(10))
+        patch = "@@ -2,1 +2,1 @@\n-line 5\n+LINE 5\n"
+        self.assertEqual(apply_patch_text(original, patch)[0], original.replace("line 5", "LINE 5"))
+
+    def test_mismatched_context_is_a_conflict(self):
+        with self.assertRaises(PatchConflict):
+            apply_patch_text("a\nb\n", "@@ -1,2 +1,2 @@\n a\n-x\n+y\n")
+
+if __name__ == "__main__":
+    unittest.main()
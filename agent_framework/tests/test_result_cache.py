@@ -0,0 +1,101 @@
+import os
+import sys
+import tempfile
+import unittest
+from tools.result_cache import ResultCache
+from tools.unittest_shard import Footprint
+
+def _record(test_id, status="passed"):
+    return {"id": test_id, "status": status, "duration": 0.0}
+
+class SelectTests(unittest.TestCase):
+    """ResultCache._select: which tests rerun after a change, given the last run's footprints."""
+    def setUp(self):
+        self.files = {"test_m.py": ("t1", "ts1"), "a.py": ("a1", "as1"), "b.py": ("b1", "bs1"), "fixture.py": ("f1", "fs1")}
+        self.previous = {
+            "files": dict(self.files),
+            "tests": [_record("test_m.A.test_a"), _record("test_m.A.test_b"), _record("test_m.B.test_c")],
+            "footprints": {
+                "": ["test_m.py"],
+                "test_m.A": ["fixture.py"],
+                "test_m.A.test_a": ["test_m.py", "a.py"],
+                "test_m.A.test_b": ["test_m.py"],
+                "test_m.B.test_c": ["test_m.py", "b.py"],
+            },
+        }
+
+    def select(self, **changes):
+        files = dict(self.files, **{f"{name}.py": value for name, value in changes.items()})
+        return ResultCache._select("test_m.py", self.previous, files)
+
+    def test_without_previous_run_everything_runs(self):
+        self.assertIsNone(ResultCache._select("test_m.py", None, self.files))
+
+    def test_nothing_changed_reuses_everything(self):
+        only, reuse = self.select()
+        self.assertEqual(only, [])
+        self.assertEqual(len(reuse), 3)
+
+    def test_body_change_reruns_only_tests_that_called_it(self):
+        only, reuse = self.select(a=("a2", "as1"))
+        self.assertEqual(only, ["A.test_a"])
+        self.assertEqual([record["id"] for record in reuse], ["test_m.A.test_b", "test_m.B.test_c"])
+
+    def test_class_fixture_change_reruns_whole_class(self):
+        only, _ = self.select(fixture=("f2", "fs1"))
+        self.assertEqual(only, ["A.test_a", "A.test_b"])
+
+    def test_import_time_change_reruns_module(self):
+        self.assertIsNone(self.select(b=("b2", "bs2")))
+
+    def test_test_module_change_reruns_module(self):
+        self.assertIsNone(self.select(test_m=("t2", "ts1")))
+
+    def test_module_fixture_change_reruns_module(self):
+        self.previous["footprints"][""].append("b.py")
+        self.assertIsNone(self.select(b=("b2", "bs1")))
+
+    def test_failed_tests_always_rerun(self):
+        self.previous["tests"][2] = _record("test_m.B.test_c", "failed")
+        only, _ = self.select(a=("a2", "as1"))
+        self.assertEqual(only, ["A.test_a", "B.test_c"])
+
+    def test_missing_footprints_rerun_module(self):
+        # Interpreters without sys.monitoring record none
+        self.previous["footprints"] = {}
+        self.assertIsNone(self.select(a=("a2", "as1")))
+
+@unittest.skipUnless(Footprint.available(), "needs sys.monitoring (Python 3.12+)")
+class FootprintTests(unittest.TestCase):
+    def test_records_each_test_and_class_fixture(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "helper.py")
+            with open(path, "w") as f:
+                f.write("def work():\n    return 1\n")
+            sys.path.insert(0, root)
+            try:
+                import helper
+                footprint = Footprint(root)
+                footprint.start()
+                try:
+                    footprint.begin_test("m.C.test_one")
+                    helper.work()
+                    helper.work()
+                    footprint.end_test()
+                    footprint.begin_test("m.C.test_two")
+                    footprint.end_test()
+                    footprint.begin_test("m.C.test_three")
+                    helper.work()
+                    footprint.end_test()
+                finally:
+                    footprint.stop()
+            finally:
+                sys.path.remove(root)
+                sys.modules.pop("helper", None)
+        report = footprint.report()
+        self.assertEqual(report["m.C.test_one"], [path])
+        self.assertEqual(report["m.C.test_two"], [])
+        self.assertEqual(report["m.C.test_three"], [path])
+
+if __name__ == "__main__":
+    unittest.main()
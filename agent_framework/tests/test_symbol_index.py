@@ -0,0 +1,20 @@
+import os
+import tempfile
+import unittest
+from tools.symbol_index import SymbolIndex, extract_symbols
+
+class SymbolIndexTests(unittest.TestCase):
+    def test_read_returns_symbol_from_crlf_file(self):
+        with tempfile.TemporaryDirectory() as root:
+            with open(os.path.join(root, "m.py"), "wb") as f:
+                f.write(b"def a():\r\n    return 1\r\n\r\ndef b():\r\n    return 2\r\n")
+            index = SymbolIndex(root)
+            symbol, _ = index.find("m.py", "b")
+            self.assertEqual(index.read("m.py", symbol), "def b():\r\n    return 2\r\n")
+
+    def test_null_bytes_fall_back_to_line_scan(self):
+        symbols = extract_symbols("m.py", "x = 1\x00\ndef g():\n    pass\n")
+        self.assertEqual([symbol["name"] for symbol in symbols], ["g"])
+
+if __name__ == "__main__":
+    unittest.main()
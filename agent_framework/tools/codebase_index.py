@@ -0,0 +1,176 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Any, Optional, List
+
+logger = logging.getLogger(__name__)
+
+MAX_FILE_BYTES = 256 * 1024  # Larger files are listed but never inlined
+INDEX_VERSION = 1
+
+def _is_binary(data: bytes) -> bool:
+    if b"\0" in data[:8192]:
+        return True
+    try:
+        data.decode("utf-8")
+    except UnicodeDecodeError:
+        return True
+    return False
+
+class CodebaseIndex:
+    """
+    Persistent index of the project folder keyed by relative path.
+
+    Each file is tracked by mtime, size and SHA-256; refresh() re-stats the tree and only reads
+    files whose mtime or size changed, bumping the snapshot number when any content actually
+    changed. Every file remembers the snapshot it last changed in (deleted files leave a
+    tombstone), so snapshot(since=N) returns only what changed after N. Binary and oversized
+    files are listed with a reason instead of their content. Metadata is saved to `index_path`
+    so a restarted run does not re-hash an unchanged tree.
+    """
+    def __init__(self, root: str, index_path: Optional[str] = None, max_file_bytes: int = MAX_FILE_BYTES):
+        self.root = root
+        self.index_path = index_path
+        self.max_file_bytes = max_file_bytes
+        self.snapshot_id = 0
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.deleted: Dict[str, int] = {}  # path -> snapshot it was deleted in
+        self._contents: Dict[str, str] = {}  # path -> text of indexed text files
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.index_path or not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path) as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self.snapshot_id = data["snapshot"]
+                self.files = data["files"]
+                self.deleted = data["deleted"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable codebase index {self.index_path}: {str(e)}")
+
+    def _save(self):
+        if not self.index_path:
+            return
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": INDEX_VERSION, "snapshot": self.snapshot_id, "files": self.files, "deleted": self.deleted}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _walk(self) -> Dict[str, os.stat_result]:
+        found = {}
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            found[os.path.relpath(entry.path, self.root).replace(os.sep, "/")] = entry.stat()
+            except FileNotFoundError:
+                continue
+        return found
+
+    def refresh(self) -> int:
+        """Bring the index up to date with the folder and return the current snapshot number."""
+        with self._lock:
+            found = self._walk()
+            changed, touched = [], False
+            for path, stat in found.items():
+                known = self.files.get(path)
+                if known and known["mtime_ns"] == stat.st_mtime_ns and known["size"] == stat.st_size:
+                    continue
+                record = self._index_file(path, stat)
+                touched = True
+                if known is None or known["hash"] != record["hash"]:
+                    changed.append((path, record))
+                else:
+                    # Touched but identical: keep the snapshot it last really changed in
+                    record["changed_in"] = known["changed_in"]
+                    self.files[path] = record
+            removed = [path for path in self.files if path not in found]
+
+            if changed or removed:
+                self.snapshot_id += 1
+                for path, record in changed:
+                    record["changed_in"] = self.snapshot_id
+                    self.files[path] = record
+                    self.deleted.pop(path, None)
+                for path in removed:
+                    del self.files[path]
+                    self._contents.pop(path, None)
+                    self.deleted[path] = self.snapshot_id
+            if changed or removed or touched:
+                self._save()
+            return self.snapshot_id
+
+    def _index_file(self, path: str, stat: os.stat_result) -> Dict[str, Any]:
+        record = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "hash": None, "skipped": None}
+        self._contents.pop(path, None)
+        if stat.st_size > self.max_file_bytes:
+            record["hash"] = f"size:{stat.st_size}:{stat.st_mtime_ns}"
+            record["skipped"] = f"too large ({stat.st_size} bytes)"
+            return record
+        with open(os.path.join(self.root, path), "rb") as f:
+            data = f.read()
+        record["hash"] = hashlib.sha256(data).hexdigest()
+        if _is_binary(data):
+            record["skipped"] = "binary"
+        else:
+            self._contents[path] = data.decode("utf-8")
+        return record
+
+    def _content(self, path: str) -> Optional[str]:
+        # Contents are not persisted; after a restart unchanged files are read on first use
+        if path not in self._contents:
+            try:
+                with open(os.path.join(self.root, path), encoding="utf-8") as f:
+                    self._contents[path] = f.read()
+            except (OSError, UnicodeDecodeError):
+                return None
+        return self._contents[path]
+
+    def snapshot(self, since: Optional[int] = None) -> Dict[str, Any]:
+        """
+        {"snapshot", "since", "files": [{"path", "size", "hash", "content" | "skipped"}], "deleted", "unchanged"}
+        with every file, or only those changed after snapshot `since`.
+        """
+        current = self.refresh()
+        with self._lock:
+            files: List[Dict[str, Any]] = []
+            for path in sorted(self.files):
+                record = self.files[path]
+                if since is not None and record["changed_in"] <= since:
+                    continue
+                item = {"path": path, "size": record["size"], "hash": record["hash"][:12]}
+                if record["skipped"]:
+                    item["skipped"] = record["skipped"]
+                else:
+                    item["content"] = self._content(path)
+                files.append(item)
+            deleted = sorted(path for path, snapshot in self.deleted.items() if since is not None and snapshot > since)
+            return {
+                "snapshot": current,
+                "since": since,
+                "files": files,
+                "deleted": deleted,
+                "unchanged": len(self.files) - len(files)
+            }
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_codebase_index(root: str, index_path: Optional[str] = None) -> CodebaseIndex:
+    """One index per project folder, shared by every FileOperations in the process."""
+    key = os.path.abspath(root)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = CodebaseIndex(root, index_path)
+        return _indexes[key]
@@ -0,0 +1,212 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Callable, Awaitable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMPILE_CACHE_DIR = os.path.join(".ensemble_cache", "compiled")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+MIN_ENTRY_AGE = 60  # Seconds; younger entries may still be running and are never evicted
+
+_LOCAL_INCLUDE = re.compile(r'^\s*#\s*include\s*"([^"]+)"', re.MULTILINE)
+
+def _java_siblings(source: str) -> List[str]:
+    # javac also compiles the classes it finds on its default sourcepath (the working
+    # directory) and the ones next to the source, so their edits must be a miss too
+    found = []
+    for directory in dict.fromkeys([os.path.dirname(os.path.abspath(source)), os.getcwd()]):
+        found.extend(os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith(".java"))
+    return found
+
+def _source_closure(source: str) -> List[str]:
+    # The source plus the local headers it includes, transitively, so a header edit is a miss
+    seen, pending = [], [os.path.abspath(source)]
+    if source.endswith(".java"):
+        pending.extend(reversed(_java_siblings(source)))
+    while pending:
+        path = pending.pop()
+        if path in seen or not os.path.isfile(path):
+            continue
+        seen.append(path)
+        with open(path, "rb") as f:
+            text = f.read().decode("utf-8", errors="replace")
+        pending.extend(os.path.join(os.path.dirname(path), header) for header in _LOCAL_INCLUDE.findall(text))
+    return seen
+
+def _tree_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(directory, file)) for directory, _, files in os.walk(path) for file in files)
+
+class CompileCache:
+    """
+    Bounded on-disk cache of compiler output.
+
+    An entry is keyed by the SHA-256 of the source (with its local headers), the compiler (its
+    resolved path and mtime, so an upgrade invalidates) and the exact flags. It is a directory
+    holding the artifacts and the compile result, so failed compiles are cached as well (but not
+    compilers killed by a signal, which is transient). Entries are built in a private directory
+    and renamed into place, which makes concurrent builds of the same key safe; hits refresh the
+    entry's mtime and the least recently used entries are removed once the cache grows past
+    `max_bytes`. Entry sizes are walked once per process and then kept in an index; entries
+    other processes add are counted from the next process on.
+    """
+    def __init__(self, root: str = DEFAULT_COMPILE_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES, enabled: bool = True):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, List[float]]] = None  # entry -> [mtime, bytes]
+
+    @staticmethod
+    def make_key(source: str, compiler: str, flags: List[str]) -> str:
+        digest = hashlib.sha256()
+        resolved = shutil.which(compiler) or compiler
+        try:
+            compiler_id = f"{resolved}:{os.stat(resolved).st_mtime_ns}"
+        except OSError:
+            compiler_id = resolved
+        digest.update(json.dumps([compiler_id, flags]).encode("utf-8"))
+        for path in _source_closure(source):
+            with open(path, "rb") as f:
+                digest.update(os.path.basename(path).encode("utf-8") + b"\0" + f.read() + b"\0")
+        return digest.hexdigest()
+
+    @asynccontextmanager
+    async def compiled(self, source: str, compiler: str, flags: List[str],
+                       build: Callable[[str], Awaitable[Dict[str, Any]]]):
+        """
+        Yields (output directory, compile result) for `source`, running `build(output_dir)` only
+        on a miss. With the cache disabled the output lives in a temporary directory removed on exit.
+        """
+        if not self.enabled:
+            output_dir = tempfile.mkdtemp(prefix="ensemble-build-")
+            try:
+                yield output_dir, await build(output_dir)
+            finally:
+                shutil.rmtree(output_dir, ignore_errors=True)
+            return
+
+        key = self.make_key(source, compiler, flags)
+        entry = os.path.join(self.root, key[:2], key)
+        result = self._load(entry)
+        if result is not None:
+            with self._lock:
+                self.hits += 1
+                if self._index is not None and entry in self._index:
+                    self._index[entry][0] = time.time()
+            yield entry, result
+            return
+
+        with self._lock:
+            self.misses += 1
+        building = f"{entry}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(building)
+        try:
+            result = await build(building)
+            # A compiler killed by a signal (e.g. a resource limit) says nothing about the source
+            if result["return_code"] >= 0:
+                with open(os.path.join(building, "result.json"), "w") as f:
+                    json.dump(result, f)
+                size = _tree_size(building)
+                try:
+                    os.rename(building, entry)
+                    with self._lock:
+                        if self._index is not None:
+                            self._index[entry] = [time.time(), size]
+                except OSError:
+                    # Another run stored the same key first; both builds are equivalent
+                    if os.path.isdir(entry):
+                        shutil.rmtree(building, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(building, ignore_errors=True)
+            raise
+        output_dir = entry if os.path.isdir(entry) and result["return_code"] >= 0 else building
+        self._evict()
+        try:
+            yield output_dir, result
+        finally:
+            if output_dir == building:
+                shutil.rmtree(building, ignore_errors=True)
+
+    def _load(self, entry: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(entry, "result.json")) as f:
+                result = json.load(f)
+            os.utime(entry)
+            return result
+        except (OSError, ValueError):
+            return None
+
+    def _entries(self) -> Dict[str, List[float]]:
+        # The size index, built from disk on first use
+        with self._lock:
+            if self._index is not None:
+                return self._index
+        index = {}
+        if os.path.isdir(self.root):
+            for shard in os.listdir(self.root):
+                shard_dir = os.path.join(self.root, shard)
+                for name in os.listdir(shard_dir) if os.path.isdir(shard_dir) else []:
+                    if name.endswith(".tmp"):
+                        continue
+                    entry = os.path.join(shard_dir, name)
+                    index[entry] = [os.path.getmtime(entry), _tree_size(entry)]
+        with self._lock:
+            if self._index is None:
+                self._index = index
+            return self._index
+
+    def _evict(self):
+        index = self._entries()
+        with self._lock:
+            total = sum(size for _, size in index.values())
+            if total <= self.max_bytes:
+                return
+            now = time.time()
+            victims = []
+            for entry, (mtime, size) in sorted(index.items(), key=lambda item: item[1][0]):
+                if total <= self.max_bytes:
+                    break
+                if now - mtime < MIN_ENTRY_AGE:
+                    continue
+                victims.append(entry)
+                total -= size
+                del index[entry]
+        for entry in victims:
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"enabled": self.enabled, "hits": self.hits, "misses": self.misses}
+        if self.enabled:
+            index = self._entries()
+            with self._lock:
+                stats.update({"entries": len(index), "bytes": sum(size for _, size in index.values())})
+        return stats
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_compile_cache() -> CompileCache:
+    """
+    Process-wide compile cache configured from the environment:
+    COMPILE_CACHE=off bypasses it, COMPILE_CACHE_DIR and COMPILE_CACHE_MAX_MB override the defaults.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = CompileCache(
+                root=os.environ.get("COMPILE_CACHE_DIR", DEFAULT_COMPILE_CACHE_DIR),
+                max_bytes=int(float(os.environ.get("COMPILE_CACHE_MAX_MB", DEFAULT_MAX_BYTES / (1024 * 1024))) * 1024 * 1024),
+                enabled=os.environ.get("COMPILE_CACHE", "on").lower() not in ("0", "off", "false", "no")
+            )
+        return _default_cache
@@ -30,6 +30,52 @@ TOOL_DEFINITIONS: Dict[str, Dict[str, Any]] = [
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "apply_patch",
+            "description": "Change part of an existing project file without rewriting it. Prefer this over write_file for edits. The patch is either a unified diff with @@ hunk headers, or one or more blocks of the form:\n<<<<<<< SEARCH\n(exact lines currently in the file)\n=======\n(lines to put in their place)\n>>>>>>> REPLACE\nEach SEARCH text must match the file exactly once. If any hunk does not match, nothing is changed and the conflicts are reported.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "filename": {
+                        "type": "string",
+                        "description": "The name of the project file to patch (including extension)"
+                    },
+                    "patch": {
+                        "type": "string",
+                        "description": "A unified diff or SEARCH/REPLACE blocks"
+                    },
+                    "base_version": {
+                        "type": "integer",
+                        "description": "The file version the patch was written against, as shown by read_file; the patch is refused if the file has changed since"
+                    }
+                },
+                "required": ["filename", "patch"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "rollback_file",
+            "description": "Restore a project file to an earlier version, as numbered by read_file. The restore is recorded as a new version, so it can itself be undone.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "filename": {
+                        "type": "string",
+                        "description": "The name of the project file to restore (including extension)"
+                    },
+                    "version": {
+                        "type": "integer",
+                        "description": "The version to restore"
+                    }
+                },
+                "required": ["filename", "version"]
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
@@ -51,18 +97,78 @@ TOOL_DEFINITIONS: Dict[str, Dict[str, Any]] = [
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "list_symbols",
+            "description": "List the classes, functions, methods and top-level variables (Python, JavaScript), CSS rules and HTML elements with an id defined in the project files, with their line ranges. Much cheaper than reading whole files.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "filename": {
+                        "type": "string",
+                        "description": "Only list this project file (including extension); omit to list every file"
+                    }
+                },
+                "required": []
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "read_symbol",
+            "description": "Return the source of a single definition from a project file, such as a class, a function, a method (as Class.method), a CSS selector or an HTML element id (as #id).",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "filename": {
+                        "type": "string",
+                        "description": "The project file that defines the symbol (including extension)"
+                    },
+                    "symbol": {
+                        "type": "string",
+                        "description": "The symbol name as shown by list_symbols"
+                    }
+                },
+                "required": ["filename", "symbol"]
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
             "name": "read_codebase",
-            "description": "Read and return the entire codebase structure including file contents from the project folder.",
+            "description": "Read and return the files in the project folder with their contents. The result carries a snapshot number; pass it back as since_snapshot to get only the files changed after it.",
             "parameters": {
                 "type": "object",
-                "properties": {},
+                "properties": {
+                    "since_snapshot": {
+                        "type": "integer",
+                        "description": "Only return files changed (or deleted) after this snapshot number from an earlier read_codebase result"
+                    }
+                },
                 "required": []
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "read_context",
+            "description": "Return the full text of a large context item that is shown only as a preview with a ctx: reference.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "reference": {
+                        "type": "string",
+                        "description": "The reference from the context, such as ctx:1a2b3c4d5e6f"
+                    }
+                },
+                "required": ["reference"]
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
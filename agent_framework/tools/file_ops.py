@@ -1,12 +1,47 @@
 import os
-import json
+import hashlib
+import logging
+import tempfile
+import threading
+from contextlib import ExitStack
+from typing import Dict, Any, List, Optional
+from .codebase_index import get_codebase_index
+from .version_store import get_version_store
+from .patching import apply_patch_text, PatchConflict
+from .symbol_index import get_symbol_index, extract_symbols
+from .overlay import Overlay, current_overlay
+
+logger = logging.getLogger(__name__)
+
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+def project_relative_path(path: str) -> str:
+    # Normalize planner/tool paths ("src/game.js", "agentFiles/src/game.js", "game.js") to one key
+    path = os.path.normpath(path.strip()).replace(os.sep, "/")
+    for prefix in ("agentFiles/src/", "src/", "./"):
+        if path.startswith(prefix):
+            path = path[len(prefix):]
+    return path
+
+def get_file_lock(path: str) -> threading.RLock:
+    # One process-wide lock per project file so concurrent coders never interleave writes
+    key = project_relative_path(path)
+    with _file_locks_guard:
+        if key not in _file_locks:
+            _file_locks[key] = threading.RLock()
+        return _file_locks[key]
 
 class FileOperations():
     def __init__(self):
         self.directory_path = "agentFiles"
         self.project_folder = os.path.join(self.directory_path, "src")
+        self.staging_folder = os.path.join(self.directory_path, ".staging")  # Same file system as src, for os.replace
         os.makedirs(self.directory_path, exist_ok=True)
         os.makedirs(self.project_folder, exist_ok=True)
+        self.codebase_index = get_codebase_index(self.project_folder, os.path.join(self.directory_path, ".codebase_index.json"))
+        self.version_store = get_version_store(os.path.join(self.directory_path, ".versions"))
+        self.symbol_index = get_symbol_index(self.project_folder)
 
     def write_file(self, is_project_file: bool, content: str, filename: str) -> str:
         if not content:
@@ -16,12 +51,113 @@ class FileOperations():
         
         file_path = os.path.join(self.project_folder, filename) if is_project_file else os.path.join(self.directory_path, filename)
         try:
-            with open(file_path, "w") as file:
-                file.write(content)
+            overlay = current_overlay()
+            if is_project_file and overlay is not None:
+                # Held in the task attempt's overlay until the attempt is approved
+                overlay.write(project_relative_path(filename), content)
+            elif is_project_file:
+                with get_file_lock(filename):
+                    self._write_project_file(project_relative_path(filename), content)
+            else:
+                with get_file_lock(file_path):
+                    with open(file_path, "w") as file:
+                        file.write(content)
             return f"File '{filename}' created successfully in {'src' if is_project_file else self.directory_path}"
         except Exception as e:
             return f"Error creating file '{filename}': {str(e)}"
-    
+
+    def _stage_project_file(self, key: str, content: str) -> str:
+        # Write `content` to a staging file ready for os.replace; returns its path. Staging sits
+        # outside the project folder, where the indexes and overlays would see half a commit
+        os.makedirs(os.path.dirname(os.path.join(self.project_folder, key)), exist_ok=True)
+        os.makedirs(self.staging_folder, exist_ok=True)
+        handle, tmp_path = tempfile.mkstemp(dir=self.staging_folder, suffix=".tmp")
+        try:
+            # Written verbatim, so the symbol index's byte offsets match on every platform
+            with open(handle, "w", newline="") as file:
+                file.write(content)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def _write_project_file(self, key: str, content: str) -> int:
+        # Atomic replace, then record the new version; the caller holds the file's lock
+        os.replace(self._stage_project_file(key, content), os.path.join(self.project_folder, key))
+        version = self.version_store.record(key, content)
+        self.symbol_index.update(key, content)
+        return version
+
+    def _read_project_file(self, key: str) -> Optional[str]:
+        overlay = current_overlay()
+        content = overlay.read(key) if overlay is not None else None
+        if content is not None:
+            return content
+        return self._read_disk_file(key)
+
+    def file_version(self, filename: str) -> int:
+        # Recorded versions plus writes made by the current task attempt
+        key = project_relative_path(filename)
+        overlay = current_overlay()
+        return self.version_store.count(key) + (overlay.versions.get(key, 0) if overlay is not None else 0)
+
+    def commit_overlay(self, overlay: Overlay) -> List[str]:
+        """
+        Write an approved attempt's files into the project folder and discard the overlay.
+
+        Every file is staged next to its target before any is replaced, and a failed replace
+        puts back the files already replaced, so the folder gets all of the attempt or none of it.
+        Versions and symbols are recorded once every file is in place.
+        """
+        paths = sorted(overlay.writes)
+        with ExitStack() as stack:
+            # Sorted acquisition keeps two commits touching the same files from deadlocking
+            for path in paths:
+                stack.enter_context(get_file_lock(path))
+            staged = {}
+            try:
+                for path in paths:
+                    staged[path] = self._stage_project_file(path, overlay.writes[path])
+                originals = {path: self._read_disk_file(path) for path in paths}
+                replaced = []
+                try:
+                    for path in paths:
+                        os.replace(staged[path], os.path.join(self.project_folder, path))
+                        del staged[path]
+                        replaced.append(path)
+                except OSError:
+                    self._restore_files(replaced, originals)
+                    raise
+            finally:
+                for tmp_path in staged.values():
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+            for path in paths:
+                self.version_store.record(path, overlay.writes[path])
+                self.symbol_index.update(path, overlay.writes[path])
+        overlay.discard()
+        return paths
+
+    def _read_disk_file(self, key: str) -> Optional[str]:
+        file_path = os.path.join(self.project_folder, key)
+        if not os.path.isfile(file_path):
+            return None
+        with open(file_path, "r") as file:
+            return file.read()
+
+    def _restore_files(self, keys: List[str], originals: Dict[str, Optional[str]]):
+        # Roll back a partly applied commit: earlier contents back, new files removed
+        for key in keys:
+            file_path = os.path.join(self.project_folder, key)
+            try:
+                if originals[key] is None:
+                    os.remove(file_path)
+                else:
+                    os.replace(self._stage_project_file(key, originals[key]), file_path)
+            except OSError as e:
+                logger.error(f"Could not roll back {key} after a failed commit: {str(e)}")
+
     # def create_folder(self, folder_name: str) -> str:
     #     if not folder_name:
     #         raise ValueError("Empty folder name: Tried to create a folder with an empty name")
@@ -33,36 +169,94 @@ class FileOperations():
     #     except Exception as e:
     #         return f"Error creating folder '{folder_name}': {str(e)}"
 
-    def read_codebase(self):
-        codebase_structure = {}
-        for root, dirs, files in os.walk(self.project_folder):
-            relative_path = os.path.relpath(root, self.project_folder)
-            if relative_path == '.':
-                codebase_structure['src'] = {}
-                current_level = codebase_structure['src']
+    def read_codebase(self, since_snapshot: Optional[int] = None) -> Dict[str, Any]:
+        # Served from the shared incremental index; callers serialize the result themselves
+        snapshot = self.codebase_index.snapshot(since_snapshot)
+        overlay = current_overlay()
+        if overlay is None or not overlay.writes:
+            return snapshot
+        files = {file["path"]: file for file in snapshot["files"]}
+        listed_now = sum(1 for path in overlay.writes if path not in files and path in self.codebase_index.files)
+        for path, content in overlay.writes.items():
+            data = content.encode("utf-8")
+            files[path] = {"path": path, "size": len(data), "hash": hashlib.sha256(data).hexdigest()[:12], "content": content, "uncommitted": True}
+        snapshot["files"] = [files[path] for path in sorted(files)]
+        snapshot["unchanged"] -= listed_now
+        return snapshot
+
+    def apply_patch(self, filename: str, patch: str, base_version: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Apply a unified diff or SEARCH/REPLACE blocks to a project file.
+
+        All hunks are matched against the current contents before anything is written, and the
+        result replaces the file atomically (or goes to the task attempt's overlay). With
+        `base_version`, the patch is refused if the file has been written since that version was read.
+        """
+        key = project_relative_path(filename)
+        with get_file_lock(key):
+            version = self.file_version(key)
+            if base_version is not None and base_version != version:
+                return {"status": "conflict", "version": version, "conflicts": [f"'{key}' is at version {version}, but the patch was made against version {base_version}"]}
+            original = self._read_project_file(key) or ""
+            try:
+                patched, hunks = apply_patch_text(original, patch)
+            except PatchConflict as e:
+                return {"status": "conflict", "version": version, "conflicts": e.conflicts}
+            overlay = current_overlay()
+            if overlay is not None:
+                overlay.write(key, patched)
             else:
-                current_level = codebase_structure['src']
-                for folder in relative_path.split(os.sep):
-                    if folder not in current_level:
-                        current_level[folder] = {}
-                    current_level = current_level[folder]
-            
-            for file in files:
-                file_path = os.path.join(root, file)
-                with open(file_path, 'r') as f:
-                    content = f.read()
-                current_level[file] = {
-                    'content': content,
-                    'path': os.path.relpath(file_path, self.project_folder)
-                }
-        
-        if not codebase_structure.get('src'):
-            return json.dumps({"status": "empty", "message": "The codebase is currently empty. You may need to use the write_file function to create the file."})
-        
-        return json.dumps(codebase_structure)
+                self._write_project_file(key, patched)
+            return {"status": "applied", "version": self.file_version(key), "hunks": hunks}
+
+    def list_symbols(self, filename: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Definitions per project file (just `filename`, if given) with their line ranges."""
+        overlay = current_overlay()
+        pending = dict(overlay.writes) if overlay is not None else {}
+        if filename:
+            key = project_relative_path(filename)
+            if key in pending:
+                return {key: extract_symbols(key, pending[key])}
+            symbols = self.symbol_index.symbols(key)
+            return {} if symbols is None else {key: symbols}
+        listing = self.symbol_index.all_symbols()
+        listing.update({path: extract_symbols(path, content) for path, content in pending.items()})
+        return listing
+
+    def read_symbol(self, filename: str, symbol: str) -> Dict[str, Any]:
+        key = project_relative_path(filename)
+        overlay = current_overlay()
+        pending = overlay.read(key) if overlay is not None else None
+        if pending is not None:
+            return self._read_pending_symbol(key, pending, symbol)
+        with get_file_lock(key):
+            found, candidates = self.symbol_index.find(key, symbol)
+            if found is None:
+                return {"status": "not_found", "candidates": candidates}
+            return {"status": "found", "symbol": found, "source": self.symbol_index.read(key, found)}
+
+    @staticmethod
+    def _read_pending_symbol(key: str, content: str, symbol: str) -> Dict[str, Any]:
+        symbols = extract_symbols(key, content)
+        matches = [found for found in symbols if found["name"] == symbol] or [found for found in symbols if found["name"].rsplit(".", 1)[-1] == symbol]
+        if len(matches) != 1:
+            return {"status": "not_found", "candidates": [found["name"] for found in matches]}
+        data = content.encode("utf-8")
+        return {"status": "found", "symbol": matches[0], "source": data[matches[0]["start"]:matches[0]["end"]].decode("utf-8", errors="replace")}
+
+    def rollback_file(self, filename: str, version: int) -> str:
+        # Restoring an old version is itself a write, so it can be rolled forward again
+        key = project_relative_path(filename)
+        content = self.version_store.get(key, version)
+        if content is None:
+            return f"Error rolling back '{filename}': no version {version} recorded"
+        return self.write_file(True, content, key)
 
     def read_file(self, is_project_file: bool, filename: str) -> str:
-        file_path = os.path.join(self.project_folder if is_project_file else self.directory_path, filename)
+        if is_project_file:
+            content = self._read_project_file(project_relative_path(filename))
+            return content if content is not None else f"File not found: {filename}"
+        file_path = os.path.join(self.directory_path, filename)
         if os.path.exists(file_path) and os.path.isfile(file_path):
             with open(file_path, "r") as file:
                 return file.read()
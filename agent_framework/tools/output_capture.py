@@ -0,0 +1,80 @@
+import time
+from typing import Callable, Optional
+
+OUTPUT_HEAD_BYTES = 8 * 1024  # Start of a stream kept verbatim
+OUTPUT_TAIL_BYTES = 8 * 1024  # End of a stream kept verbatim; everything between is counted and dropped
+LIVE_LINE_INTERVAL = 0.1  # Seconds between forwarded lines of one stream
+MAX_LIVE_LINE = 1000  # Characters of a forwarded line
+
+def render(head: bytes, tail: bytes, truncated: int) -> str:
+    if not truncated:
+        return (head + tail).decode(errors="replace")
+    return head.decode(errors="replace") + f"\n[... truncated {truncated} bytes ...]\n" + tail.decode(errors="replace")
+
+class BoundedOutput:
+    """
+    Captures a stream in constant memory: the first `head` bytes, the last `tail` bytes and
+    a count of everything. `text()` joins the two with a "truncated N bytes" marker when
+    anything was dropped.
+    """
+    def __init__(self, head: int = OUTPUT_HEAD_BYTES, tail: int = OUTPUT_TAIL_BYTES):
+        self.head_limit = head
+        self.tail_limit = tail
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def feed(self, data: bytes):
+        self.total += len(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data and self.tail_limit:
+            self.tail += data
+            # Trim in batches so a stream of small writes is not quadratic
+            if len(self.tail) > 2 * self.tail_limit:
+                del self.tail[:-self.tail_limit]
+
+    def _tail(self) -> bytes:
+        return bytes(self.tail[-self.tail_limit:]) if self.tail_limit else b""
+
+    @property
+    def truncated(self) -> int:
+        return self.total - len(self.head) - len(self._tail())
+
+    def text(self) -> str:
+        return render(bytes(self.head), self._tail(), self.truncated)
+
+class LiveLines:
+    """
+    Forwards a stream's complete lines to `callback(stream, line)` as they arrive, at most one
+    every `interval` seconds; lines in between are skipped in favour of the newest.
+    """
+    def __init__(self, callback: Callable[[str, str], None], stream: str, interval: float = LIVE_LINE_INTERVAL):
+        self.callback = callback
+        self.stream = stream
+        self.interval = interval
+        self.partial = b""
+        self.pending: Optional[bytes] = None
+        self.last_sent = 0.0
+
+    def feed(self, data: bytes):
+        lines = (self.partial + data).split(b"\n")
+        self.partial = lines.pop()[-MAX_LIVE_LINE:]
+        if lines:
+            self.pending = lines[-1]
+        if self.pending is not None and time.monotonic() - self.last_sent >= self.interval:
+            self._send()
+
+    def _send(self):
+        self.callback(self.stream, self.pending.decode(errors="replace")[-MAX_LIVE_LINE:])
+        self.pending = None
+        self.last_sent = time.monotonic()
+
+    def close(self):
+        if self.partial:
+            self.pending = self.partial
+            self.partial = b""
+        if self.pending is not None:
+            self._send()
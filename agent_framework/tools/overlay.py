@@ -0,0 +1,98 @@
+import contextvars
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+_current_overlay = contextvars.ContextVar("overlay", default=None)
+
+class Overlay:
+    """
+    In-memory copy-on-write layer over the project folder for one task attempt.
+
+    Writes land in `writes` and reads fall through to the folder for anything the attempt has
+    not written, so a discarded attempt never touched the disk. FileOperations.commit_overlay
+    moves the layer into the folder once the attempt is approved. Sandbox runs see the layer
+    through materialize(): a temporary directory with copies of the folder's files and the
+    layer's files written over them, updated incrementally and removed by discard(). Copies,
+    not links, so a run that writes to a project file cannot change the real one.
+    """
+    def __init__(self, base_dir: str, label: str = ""):
+        self.base_dir = base_dir
+        self.label = label
+        self.writes: Dict[str, str] = {}
+        self.versions: Dict[str, int] = {}  # Writes per file within this layer
+        self._dirty: Set[str] = set()  # Written since the last materialize()
+        self._copied: Dict[str, Tuple[int, int]] = {}  # Base file -> (mtime_ns, size) when copied in
+        self._root: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def read(self, path: str) -> Optional[str]:
+        with self._lock:
+            return self.writes.get(path)
+
+    def write(self, path: str, content: str):
+        with self._lock:
+            self.writes[path] = content
+            self.versions[path] = self.versions.get(path, 0) + 1
+            self._dirty.add(path)
+
+    def materialize(self) -> str:
+        """Directory showing the project folder as this attempt sees it."""
+        with self._lock:
+            if self._root is None:
+                self._root = tempfile.mkdtemp(prefix="ensemble-overlay-")
+                self._dirty = set(self.writes)
+                self._copied = {}
+            # Files committed by other tasks since the last call are copied in as well
+            for directory, _, names in os.walk(self.base_dir):
+                relative = os.path.relpath(directory, self.base_dir)
+                for name in names:
+                    path = os.path.normpath(os.path.join(relative, name)).replace(os.sep, "/")
+                    if path in self.writes:
+                        continue
+                    source = os.path.join(directory, name)
+                    stat = os.stat(source)
+                    if self._copied.get(path) == (stat.st_mtime_ns, stat.st_size):
+                        continue
+                    target = os.path.join(self._root, path)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    if os.path.lexists(target):
+                        os.remove(target)
+                    shutil.copy2(source, target)
+                    self._copied[path] = (stat.st_mtime_ns, stat.st_size)
+            for path in self._dirty:
+                target = os.path.join(self._root, path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if os.path.lexists(target):
+                    os.remove(target)
+                with open(target, "w") as f:
+                    f.write(self.writes[path])
+            self._dirty.clear()
+            return self._root
+
+    def discard(self):
+        with self._lock:
+            self.writes.clear()
+            self.versions.clear()
+            self._dirty.clear()
+            self._copied.clear()
+            root, self._root = self._root, None
+        if root:
+            shutil.rmtree(root, ignore_errors=True)
+
+def current_overlay() -> Optional[Overlay]:
+    """The overlay of the task attempt running in this context, if any."""
+    return _current_overlay.get()
+
+def use_overlay(overlay: Optional[Overlay]) -> contextvars.Token:
+    # Context variables follow asyncio tasks and asyncio.to_thread, so tool calls made for
+    # this attempt see the overlay while attempts running in parallel see their own
+    return _current_overlay.set(overlay)
+
+def reset_overlay(token: contextvars.Token):
+    _current_overlay.reset(token)
@@ -0,0 +1,147 @@
+import re
+from difflib import get_close_matches
+from typing import List, Tuple
+
+SEARCH_MARKER = "<<<<<<< SEARCH"
+DIVIDER_MARKER = "======="
+REPLACE_MARKER = ">>>>>>> REPLACE"
+MAX_HUNK_OFFSET = 200  # How far from its stated line a diff hunk may have drifted
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+class PatchConflict(Exception):
+    """A patch that does not match the current file; nothing is applied."""
+    def __init__(self, conflicts: List[str]):
+        super().__init__("; ".join(conflicts))
+        self.conflicts = conflicts
+
+def apply_patch_text(original: str, patch: str) -> Tuple[str, int]:
+    """
+    Apply a unified diff or a series of SEARCH/REPLACE blocks to `original`.
+
+    Returns (patched text, number of hunks). Every hunk is checked before anything is changed,
+    so either the whole patch applies or PatchConflict lists every hunk that did not match.
+    """
+    if SEARCH_MARKER in patch:
+        return _apply_search_replace(original, parse_search_replace(patch))
+    if re.search(r"^@@ ", patch, re.MULTILINE):
+        return _apply_unified_diff(original, patch)
+    raise PatchConflict(["Unrecognized patch format: send a unified diff (with @@ hunk headers) or SEARCH/REPLACE blocks"])
+
+def parse_search_replace(patch: str) -> List[Tuple[str, str]]:
+    blocks = []
+    lines = patch.splitlines(keepends=True)
+    i = 0
+    while i < len(lines):
+        if lines[i].rstrip() != SEARCH_MARKER:
+            i += 1
+            continue
+        search, replace, i = [], [], i + 1
+        while i < len(lines) and lines[i].rstrip() != DIVIDER_MARKER:
+            search.append(lines[i])
+            i += 1
+        i += 1
+        while i < len(lines) and lines[i].rstrip() != REPLACE_MARKER:
+            replace.append(lines[i])
+            i += 1
+        if i >= len(lines):
+            raise PatchConflict([f"SEARCH/REPLACE block {len(blocks) + 1} is not closed with {REPLACE_MARKER}"])
+        blocks.append(("".join(search), "".join(replace)))
+        i += 1
+    return blocks
+
+def _apply_search_replace(original: str, blocks: List[Tuple[str, str]]) -> Tuple[str, int]:
+    # Blocks end in a newline, so a last line without one gets it while matching
+    missing_newline = bool(original) and not original.endswith("\n")
+    text, conflicts = original + "\n" if missing_newline else original, []
+    for number, (search, replace) in enumerate(blocks, 1):
+        if not search:
+            if text:
+                conflicts.append(f"Block {number}: empty SEARCH is only allowed when creating a file")
+                continue
+            text = replace
+            continue
+        occurrences = text.count(search)
+        if occurrences == 1:
+            text = text.replace(search, replace, 1)
+        elif occurrences == 0:
+            conflicts.append(f"Block {number}: SEARCH text not found{_closest_hint(text, search)}")
+        else:
+            conflicts.append(f"Block {number}: SEARCH text matches {occurrences} places; include more surrounding lines")
+    if conflicts:
+        raise PatchConflict(conflicts)
+    if missing_newline and text.endswith("\n"):
+        text = text[:-1]
+    return text, len(blocks)
+
+def _closest_hint(text: str, search: str) -> str:
+    first_line = next((line for line in search.splitlines() if line.strip()), "")
+    match = get_close_matches(first_line, text.splitlines(), n=1, cutoff=0.6)
+    return f" (closest line in the file: {match[0].strip()!r})" if match else ""
+
+def _parse_hunks(patch: str) -> List[Tuple[int, List[str], List[str]]]:
+    # (1-based start line in the old file, old lines, new lines) per hunk
+    hunks, current, remaining = [], None, [0, 0]
+    lines = patch.splitlines(keepends=True)
+    for index, line in enumerate(lines):
+        header = _HUNK_HEADER.match(line)
+        if header:
+            current = (int(header.group(1)), [], [])
+            hunks.append(current)
+            # Old and new line counts still to come; omitted counts mean 1
+            remaining = [int(header.group(2) or 1), int(header.group(4) or 1)]
+            continue
+        if current is None or line.startswith("\\"):
+            continue
+        # Within the header's counts, "--- x" is a removed "-- x" line; past them, a
+        # "--- "/"+++ " pair starts the next file (writers often get the counts short)
+        if remaining[0] <= 0 and remaining[1] <= 0 and line.startswith("--- ") and index + 1 < len(lines) and lines[index + 1].startswith("+++ "):
+            current = None
+        elif line.startswith("-"):
+            current[1].append(line[1:])
+            remaining[0] -= 1
+        elif line.startswith("+"):
+            current[2].append(line[1:])
+            remaining[1] -= 1
+        elif line.startswith(" ") or line in ("\n", "\r\n"):
+            # Some writers drop the space before blank context lines
+            content = line[1:] if line.startswith(" ") else line
+            current[1].append(content)
+            current[2].append(content)
+            remaining[0] -= 1
+            remaining[1] -= 1
+    return hunks
+
+def _apply_unified_diff(original: str, patch: str) -> Tuple[str, int]:
+    lines = original.splitlines(keepends=True)
+    if lines and not lines[-1].endswith("\n"):
+        lines[-1] += "\n"
+    hunks = _parse_hunks(patch)
+    normalized = [line.rstrip("\r\n") for line in lines]
+    placements, conflicts, floor = [], [], 0
+    for number, (start, old, new) in enumerate(hunks, 1):
+        target = [line.rstrip("\r\n") for line in old]
+        position = _locate(normalized, target, max(start - 1, 0), floor)
+        if position is None:
+            conflicts.append(f"Hunk {number} (@@ -{start}): context does not match the current file{_closest_hint(original, ''.join(old))}")
+            continue
+        placements.append((position, len(old), new))
+        floor = position + len(old)
+    if conflicts:
+        raise PatchConflict(conflicts)
+    for position, length, new in reversed(placements):
+        lines[position:position + length] = [line if line.endswith("\n") else line + "\n" for line in new]
+    patched = "".join(lines)
+    if not original.endswith("\n") and patched.endswith("\n") and original:
+        patched = patched[:-1]
+    return patched, len(hunks)
+
+def _locate(lines: List[str], target: List[str], expected: int, floor: int):
+    # Nearest exact match to the stated line, never before the end of the previous hunk
+    if not target:
+        return min(max(expected, floor), len(lines))
+    for offset in range(MAX_HUNK_OFFSET + 1):
+        for position in ((expected + offset, expected - offset) if offset else (expected,)):
+            if floor <= position <= len(lines) - len(target) and lines[position:position + len(target)] == target:
+                return position
+    return None
@@ -0,0 +1,234 @@
+import ast
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Callable, Awaitable, Optional, Tuple
+from .sandbox_limits import get_limits
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 256
+MAX_SCANNED_FILES = 4096
+PASSING_STATUSES = ("passed", "skipped", "expected_failure")
+
+class _Blanker(ast.NodeTransformer):
+    # Function bodies only run when called; everything else in a module runs on import
+    def visit_FunctionDef(self, node):
+        node.body = [ast.Pass()]
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+def _scan(source: str) -> Tuple[str, List[Tuple[int, str, List[str]]]]:
+    # (hash of the import-time skeleton, [(level, module, imported names)])
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return hashlib.sha256(source.encode("utf-8")).hexdigest(), []
+    imports = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.extend((0, alias.name, []) for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            imports.append((node.level, node.module or "", [alias.name for alias in node.names]))
+    skeleton = ast.dump(_Blanker().visit(tree))
+    return hashlib.sha256(skeleton.encode("utf-8")).hexdigest(), imports
+
+def _resolve(root: str, importer: str, level: int, module: str, names: List[str]) -> List[str]:
+    # Project files an import statement can load, relative to root
+    if level:
+        base = os.path.dirname(importer)
+        for _ in range(level - 1):
+            base = os.path.dirname(base)
+        bases = [base]
+    else:
+        # The importer's directory (scripts) and the root (unittest runs from there)
+        bases = list(dict.fromkeys([os.path.dirname(importer), ""]))
+    modules = [module] if module else []
+    modules += [f"{module}.{name}" if module else name for name in names if name != "*"]
+    found = []
+    for base in bases:
+        for name in modules:
+            parts = name.split(".")
+            # Every package on the way runs its __init__
+            candidates = [os.path.join(base, *parts[:i], "__init__.py") for i in range(1, len(parts) + 1)]
+            candidates.append(os.path.join(base, *parts) + ".py")
+            found.extend(os.path.normpath(c) for c in candidates if os.path.isfile(os.path.join(root, c)))
+    return found
+
+class ResultCache:
+    """
+    Reuses sandbox results while the code they ran is unchanged.
+
+    A run is keyed by the SHA-256 of the executed file and of every project module it imports,
+    transitively (resolved inside the project root), plus the sandbox limits. Only completed
+    runs are kept: no timeouts, limit kills or sandbox errors. Entries live in memory, LRU.
+
+    Test modules also keep the per-test coverage footprint of their last run. When only
+    function bodies changed outside the test module, a test that did not call into a changed
+    file keeps its previous result and only the others run again. A change to a file a class
+    fixture (setUpClass, tearDownClass) called reruns that whole class; any change to code that
+    runs at import time or in a module fixture reruns the whole module.
+    """
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, enabled: bool = True):
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._results = OrderedDict()
+        self._tests = {}  # test file -> {"files", "tests", "footprints"} of its last completed run
+        self._scans = OrderedDict()  # real path -> ((mtime_ns, size), (content hash, skeleton hash, imports)), LRU
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "tests_reused": 0, "tests_run": 0}
+
+    def _scan_file(self, full_path: str) -> Tuple[str, str, List[Tuple[int, str, List[str]]]]:
+        stat = os.stat(full_path)
+        real_path, version = os.path.realpath(full_path), (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            memo = self._scans.get(real_path)
+            if memo is not None and memo[0] == version:
+                self._scans.move_to_end(real_path)
+                return memo[1]
+        with open(full_path, "rb") as f:
+            content = f.read()
+        skeleton, imports = _scan(content.decode("utf-8", errors="replace"))
+        scanned = (hashlib.sha256(content).hexdigest(), skeleton, imports)
+        with self._lock:
+            # Only the latest version of a file is kept
+            self._scans[real_path] = (version, scanned)
+            self._scans.move_to_end(real_path)
+            while len(self._scans) > MAX_SCANNED_FILES:
+                self._scans.popitem(last=False)
+        return scanned
+
+    def fingerprint(self, root: str, path: str) -> Dict[str, Tuple[str, str]]:
+        """{file: (content hash, import-time skeleton hash)} for `path` and its project imports."""
+        files, pending = {}, [os.path.normpath(path)]
+        while pending:
+            rel = pending.pop()
+            full = os.path.join(root, rel)
+            if rel in files or not os.path.isfile(full):
+                continue
+            content_hash, skeleton, imports = self._scan_file(full)
+            files[rel] = (content_hash, skeleton)
+            for level, module, names in imports:
+                pending.extend(_resolve(root, rel, level, module, names))
+        return files
+
+    @staticmethod
+    def _key(path: str, is_unit_test: bool, files: Dict[str, Tuple[str, str]]) -> str:
+        payload = [path, is_unit_test, get_limits("python"), sorted((rel, content) for rel, (content, _) in files.items())]
+        return hashlib.sha256(json.dumps(payload).encode("utf-8")).hexdigest()
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self.counters["misses"] += 1
+                return None
+            self._results.move_to_end(key)
+            self.counters["hits"] += 1
+        return dict(result, cached=True)
+
+    def _put(self, key: str, result: Dict[str, Any]):
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    @staticmethod
+    def _completed(result: Dict[str, Any]) -> bool:
+        return result["return_code"] >= 0 and not any(test["status"] == "timeout" for test in result.get("tests", []))
+
+    async def arun(self, root: str, path: str, run: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """The result of `run()` for the script at root/path, reused while its code is unchanged."""
+        key = self._key(path, False, self.fingerprint(root, path))
+        cached = self._get(key)
+        if cached is not None:
+            return cached
+        result = await run()
+        if self._completed(result):
+            self._put(key, result)
+        return result
+
+    async def arun_tests(self, root: str, path: str,
+                         run: Callable[[Optional[List[str]], Optional[List[Dict[str, Any]]]], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        The result of the test module at root/path. `run(only, reuse)` runs the named tests (all
+        when None), reports `reuse` records alongside, and returns footprints relative to root.
+        """
+        files = self.fingerprint(root, path)
+        key = self._key(path, True, files)
+        cached = self._get(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            previous = self._tests.get(path)
+        selection = self._select(path, previous, files)
+        only, reuse = selection if selection is not None else (None, None)
+        result = await run(only, reuse)
+
+        root_prefix = os.path.join(os.path.abspath(root), "")
+        footprints = {test_id: [os.path.relpath(file, root_prefix) for file in touched if file.startswith(root_prefix)]
+                      for test_id, touched in result.pop("footprints", {}).items()}
+        with self._lock:
+            self.counters["tests_reused"] += len(reuse or [])
+            self.counters["tests_run"] += len(result.get("tests", [])) - len(reuse or [])
+            if self._completed(result):
+                if reuse and previous is not None:
+                    footprints = {**previous["footprints"], **footprints}
+                tests = [{k: v for k, v in test.items() if k != "cached"} for test in result["tests"]]
+                self._tests[path] = {"files": files, "tests": tests, "footprints": footprints}
+            else:
+                self._tests.pop(path, None)
+        if self._completed(result):
+            self._put(key, result)
+        return result
+
+    @staticmethod
+    def _select(path: str, previous: Optional[Dict[str, Any]],
+                files: Dict[str, Tuple[str, str]]) -> Optional[Tuple[List[str], List[Dict[str, Any]]]]:
+        # (tests to run, records to reuse), or None to run the whole module
+        if previous is None:
+            return None
+        old = previous["files"]
+        changed = {rel for rel in files.keys() | old.keys() if files.get(rel) != old.get(rel)}
+        if path in changed:
+            return None
+        # Added or removed imports, and edits outside function bodies, run at import time
+        if any(rel not in files or rel not in old or files[rel][1] != old[rel][1] for rel in changed):
+            return None
+        if changed & set(previous["footprints"].get("", [])):
+            return None
+
+        rerun = []
+        for record in previous["tests"]:
+            test_id = record["id"].split(" ")[0]
+            touched = previous["footprints"].get(test_id)
+            if test_id.count(".") < 2 or touched is None:
+                # An error outside any one test (import, setUpClass): nothing to select by
+                return None
+            # Every test of a class shares what its class fixtures set up
+            fixtures = previous["footprints"].get(test_id.rsplit(".", 1)[0], [])
+            if record["status"] not in PASSING_STATUSES or changed & set(touched) or changed & set(fixtures):
+                rerun.append(test_id)
+        rerun = list(dict.fromkeys(rerun))
+        reuse = [record for record in previous["tests"] if record["id"].split(" ")[0] not in rerun]
+        return [".".join(test_id.split(".")[-2:]) for test_id in rerun], reuse
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counters, enabled=self.enabled, entries=len(self._results))
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_result_cache() -> ResultCache:
+    """Process-wide result cache; SANDBOX_RESULT_CACHE=off runs everything afresh."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache(enabled=os.environ.get("SANDBOX_RESULT_CACHE", "on").lower() not in ("0", "off", "false", "no"))
+        return _default_cache
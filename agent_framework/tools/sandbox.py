@@ -1,24 +1,173 @@
-import subprocess
+import asyncio
+import logging
 import os
-import tempfile
+import signal
+import subprocess
 import sys
+import time
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from .worker_pool import get_worker_pool, WorkerError
+from .compile_cache import get_compile_cache
+from .output_capture import BoundedOutput, LiveLines
+from .sandbox_limits import get_limits, rlimits, apply_rlimits, usage_metrics, describe_kill, resource
+
+logger = logging.getLogger(__name__)
+
+SANDBOX_TIMEOUT = 30  # Seconds; wall time for runs without limits, see sandbox_limits for the per-language ones
+
+async def _pump(stream: asyncio.StreamReader, capture: BoundedOutput, live: Optional[LiveLines]):
+    while True:
+        chunk = await stream.read(64 * 1024)
+        if not chunk:
+            break
+        capture.feed(chunk)
+        if live is not None:
+            live.feed(chunk)
+    if live is not None:
+        live.close()
+
+async def _pipe_reader(pipe) -> Tuple[asyncio.StreamReader, asyncio.BaseTransport]:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+    return reader, transport
+
+def _kill_group(pid: int):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+class SandboxTimeout(asyncio.TimeoutError):
+    """A run killed at its wall-time limit; `metrics` holds the usage it had reached."""
+    def __init__(self, metrics: Optional[Dict[str, Any]] = None):
+        super().__init__()
+        self.metrics = metrics
+
+async def _run_process(command: List[str], timeout: Optional[int] = None, cwd: Optional[str] = None,
+                       on_output: Optional[Callable[[str, str], None]] = None,
+                       limits: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Run a command (in `cwd`, if given) without blocking the event loop and collect its output.
+
+    Output is streamed into bounded head/tail buffers, so a runaway print loop costs neither
+    memory nor prompt space; `on_output(stream, line)` receives live lines as they are written.
+    `limits` (see sandbox_limits.get_limits) are applied with setrlimit in the child, which
+    runs in its own process group. The result reports cpu_time, peak_rss and wall_time.
+    Raises SandboxTimeout, an asyncio.TimeoutError carrying the killed run's usage metrics,
+    (after killing the process group) if it runs longer than `timeout` seconds (the limits'
+    wall time, else SANDBOX_TIMEOUT).
+    """
+    if timeout is None:
+        timeout = limits["wall"] if limits and limits.get("wall") else SANDBOX_TIMEOUT
+    started = time.perf_counter()
+    transports = []
+    if resource is None:
+        # No rlimits or wait4 here (Windows); asyncio's own subprocess support is enough
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd
+        )
+        stdout, stderr = process.stdout, process.stderr
+        waiter = asyncio.ensure_future(process.wait())
+        kill = process.kill
+    else:
+        triples = rlimits(limits) if limits else []
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=cwd,
+            preexec_fn=(lambda: apply_rlimits(triples)) if triples else None,
+            start_new_session=True
+        )
+        (stdout, stdout_transport), (stderr, stderr_transport) = await _pipe_reader(process.stdout), await _pipe_reader(process.stderr)
+        transports = [stdout_transport, stderr_transport]
+        # wait4 reaps the child and returns its resource usage in one call
+        waiter = asyncio.ensure_future(asyncio.to_thread(os.wait4, process.pid, 0))
+        kill = lambda: _kill_group(process.pid)
+        # Background processes the run left in its group do not outlive it (or hold its pipes open)
+        waiter.add_done_callback(lambda _: kill())
+
+    output, errors = BoundedOutput(), BoundedOutput()
+    try:
+        await asyncio.wait_for(asyncio.gather(
+            _pump(stdout, output, LiveLines(on_output, "output") if on_output else None),
+            _pump(stderr, errors, LiveLines(on_output, "errors") if on_output else None),
+            asyncio.shield(waiter)
+        ), timeout)
+    except asyncio.TimeoutError:
+        kill()
+        finished = await waiter
+        # The killed child's usage is what a runaway run needs reported
+        rusage = finished[2] if resource is not None else None
+        raise SandboxTimeout(usage_metrics(rusage, time.perf_counter() - started))
+    finally:
+        for transport in transports:
+            transport.close()
 
-def run_python_file(file_path: str, is_unit_test: bool = False) -> dict:
+    if resource is None:
+        return_code, rusage = waiter.result(), None
+    else:
+        _, status, rusage = waiter.result()
+        return_code = process.returncode = os.waitstatus_to_exitcode(status)
+    metrics = usage_metrics(rusage, time.perf_counter() - started)
+    return {
+        "return_code": return_code,
+        "output": output.text(),
+        "errors": errors.text() + describe_kill(return_code, metrics["cpu_time"], limits),
+        "output_bytes": output.total,
+        "errors_bytes": errors.total,
+        **metrics
+    }
+
+def _timeout_result(wall: float = SANDBOX_TIMEOUT, metrics: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # `metrics`: usage of the killed run, from SandboxTimeout or a pooled result
+    usage = usage_metrics(None, wall)
+    if metrics:
+        usage.update({key: metrics[key] for key in usage if metrics.get(key) is not None})
+    return {
+        "return_code": -1,
+        "output": "",
+        "errors": f"Execution timed out after {wall} seconds.",
+        **usage
+    }
+
+async def arun_python_file(file_path: str, is_unit_test: bool = False, cwd: Optional[str] = None,
+                           on_output: Optional[Callable[[str, str], None]] = None) -> dict:
     """
     Run a Python file, either as a unit test or as a standard script.
     
     Args:
     file_path (str): Path to the Python file to be run.
     is_unit_test (bool): Flag to indicate if the file should be run as a unit test.
+    cwd (str): Directory to run in; `file_path` is relative to it when given.
+    on_output (callable): Receives (stream, line) for live output while the file runs.
     
     Returns:
     dict: A dictionary containing the execution results, including return code, output, and errors.
     """
+    limits = get_limits("python")
     try:
         # Ensure the file exists
-        if not os.path.exists(file_path):
+        if not os.path.exists(os.path.join(cwd or "", file_path)):
             raise FileNotFoundError(f"File not found: {file_path}")
 
+        pool = get_worker_pool()
+        if pool is not None:
+            try:
+                result = await pool.arun(file_path, is_unit_test, cwd, limits["wall"], on_output=on_output, limits=limits)
+                if result.pop("timed_out"):
+                    return _timeout_result(limits["wall"], result)
+                result["errors"] += describe_kill(result["return_code"], result["cpu_time"], limits)
+                return result
+            except WorkerError as e:
+                logger.warning(f"Sandbox worker failed, running {file_path} in a new interpreter: {str(e)}")
+
         # Prepare the command
         if is_unit_test:
             command = ["python", "-m", "unittest", file_path]
@@ -26,24 +175,9 @@ def run_python_file(file_path: str, is_unit_test: bool = False) -> dict:
             command = ["python", file_path]
 
         # Run the file
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            timeout=30  # Set a timeout to prevent infinite loops
-        )
-
-        return {
-            "return_code": result.returncode,
-            "output": result.stdout,
-            "errors": result.stderr
-        }
-    except subprocess.TimeoutExpired:
-        return {
-            "return_code": -1,
-            "output": "",
-            "errors": "Execution timed out after 30 seconds."
-        }
+        return await _run_process(command, cwd=cwd, on_output=on_output, limits=limits)
+    except asyncio.TimeoutError as e:
+        return _timeout_result(limits["wall"], getattr(e, "metrics", None))
     except Exception as e:
         return {
             "return_code": -1,
@@ -51,10 +185,30 @@ def run_python_file(file_path: str, is_unit_test: bool = False) -> dict:
             "errors": f"An error occurred while running the file: {str(e)}"
         }
 
-def run_c_code(file_path: str, is_unit_test: bool = False) -> dict:
+async def _arun_native(file_path: str, compiler: str, flags: List[str], limits: Dict[str, Any]) -> Dict[str, Any]:
+    # Compile (or reuse the cached binary for) a C/C++ file and run it
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+    binary = "program.exe" if sys.platform.startswith('win') else "program"
+
+    async def build(output_dir: str) -> Dict[str, Any]:
+        return await _run_process([compiler] + flags + ["-o", os.path.join(output_dir, binary), file_path], limits=get_limits("compile"))
+
+    async with get_compile_cache().compiled(file_path, compiler, flags, build) as (output_dir, compile_result):
+        if compile_result["return_code"] != 0:
+            return {
+                "return_code": compile_result["return_code"],
+                "output": "",
+                "errors": compile_result["errors"]
+            }
+        return await _run_process([os.path.abspath(os.path.join(output_dir, binary))], limits=limits)
+
+async def arun_c_code(file_path: str, is_unit_test: bool = False) -> dict:
     """
     Run a C code file, either as a unit test or as a standard script.
 
+    The binary comes from the compile cache when the source, compiler and flags are unchanged.
+
     Args:
         file_path (str): Path to the C file to be run.
         is_unit_test (bool): Flag to indicate if the file should be run as a unit test.
@@ -62,80 +216,25 @@ def run_c_code(file_path: str, is_unit_test: bool = False) -> dict:
     Returns:
         dict: A dictionary containing the execution results, including return code, output, and errors.
     """
-    binary_name = ""
+    limits = get_limits("c")
     try:
-        # Ensure the file exists
-        if not os.path.isfile(file_path):
-            raise FileNotFoundError(f"File not found: {file_path}")
-
-        # Prepare the compilation command
-        with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-            binary_name = tmp_file.name
-
-        is_windows = sys.platform.startswith('win')
-        if is_windows:
-            binary_name += ".exe"
-
-        compile_command = ["gcc", "-Wall", "-O2", "-o", binary_name, file_path]
-        run_command = [binary_name]  # Use the absolute path directly
-
-        # Compile the code
-        compile_result = subprocess.run(
-            compile_command,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-
-        if compile_result.returncode != 0:
-            return {
-                "return_code": compile_result.returncode,
-                "output": "",
-                "errors": compile_result.stderr
-            }
-
-        # Make the binary executable (Unix systems)
-        if not is_windows:
-            os.chmod(binary_name, 0o755)
-
-        # Run the compiled binary
-        run_result = subprocess.run(
-            run_command,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-
-        return {
-            "return_code": run_result.returncode,
-            "output": run_result.stdout,
-            "errors": run_result.stderr
-        }
-
-    except subprocess.TimeoutExpired:
-        return {
-            "return_code": -1,
-            "output": "",
-            "errors": "Execution timed out after 30 seconds."
-        }
+        flags = ["-Wall", "-O2"] + (["-DUNIT_TEST"] if is_unit_test else [])
+        return await _arun_native(file_path, "gcc", flags, limits)
+    except asyncio.TimeoutError as e:
+        return _timeout_result(limits["wall"], getattr(e, "metrics", None))
     except Exception as e:
         return {
             "return_code": -1,
             "output": "",
             "errors": f"An error occurred: {str(e)}"
         }
-    finally:
-        if binary_name and os.path.exists(binary_name):
-            try:
-                os.remove(binary_name)
-            except Exception as e:
-                pass  # Optionally log the error
 
-
-def run_cpp_code(file_name: str, is_unit_test: bool = False) -> dict:
+async def arun_cpp_code(file_name: str, is_unit_test: bool = False) -> dict:
     """
     Compile and run a C++ code file, either as a unit test or as a standard script.
 
+    The binary comes from the compile cache when the source, compiler and flags are unchanged.
+
     Args:
         file_name (str): Path to the C++ file to be compiled and run.
         is_unit_test (bool): Flag to indicate if the file should be run as a unit test.
@@ -143,82 +242,25 @@ def run_cpp_code(file_name: str, is_unit_test: bool = False) -> dict:
     Returns:
         dict: A dictionary containing the execution results, including return code, output, and errors.
     """
-    binary_name = ""
+    limits = get_limits("cpp")
     try:
-        if not os.path.isfile(file_name):
-            raise FileNotFoundError(f"File not found: {file_name}")
-
-        # Create a unique temporary file for the binary
-        with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-            binary_name = tmp_file.name
-
-        is_windows = sys.platform.startswith('win')
-        if is_windows:
-            binary_name += ".exe"
-
-        # Prepare the compilation command
-        compile_command = ["g++", "-Wall", "-O2", "-std=c++17", "-o", binary_name, file_name]
-        if is_unit_test:
-            # Add any unit test specific flags or libraries here
-            compile_command.append("-DUNIT_TEST")
-
-        # Compile the code
-        compile_result = subprocess.run(
-            compile_command,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-
-        if compile_result.returncode != 0:
-            return {
-                "return_code": compile_result.returncode,
-                "output": compile_result.stdout,
-                "errors": compile_result.stderr
-            }
-
-        # Make the binary executable (Unix systems)
-        if not is_windows:
-            os.chmod(binary_name, 0o755)
-
-        # Prepare the run command
-        run_command = [binary_name]  # Use the absolute path directly
-
-        # Run the compiled binary
-        run_result = subprocess.run(
-            run_command,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-
-        return {
-            "return_code": run_result.returncode,
-            "output": run_result.stdout,
-            "errors": run_result.stderr
-        }
-    except subprocess.TimeoutExpired as e:
-        return {
-            "return_code": -1,
-            "output": e.stdout or "",
-            "errors": "Execution timed out after 30 seconds."
-        }
+        flags = ["-Wall", "-O2", "-std=c++17"] + (["-DUNIT_TEST"] if is_unit_test else [])
+        return await _arun_native(file_name, "g++", flags, limits)
+    except asyncio.TimeoutError as e:
+        return _timeout_result(limits["wall"], getattr(e, "metrics", None))
     except Exception as e:
         return {
             "return_code": -1,
             "output": "",
             "errors": f"An error occurred: {str(e)}"
         }
-    finally:
-        if binary_name and os.path.exists(binary_name):
-            try:
-                os.remove(binary_name)
-            except Exception:
-                pass  # Optionally log the error
 
-def run_java_code(file_name: str, is_unit_test: bool = False) -> dict:
+async def arun_java_code(file_name: str, is_unit_test: bool = False) -> dict:
     """
     Compile and run a Java code file, either as a unit test or as a standard script.
+
+    Classes are compiled into the compile cache's own directory for this source (never the
+    working directory) and reused while the source is unchanged.
     
     Args:
         file_name (str): Path to the Java file to be compiled and run.
@@ -227,9 +269,9 @@ def run_java_code(file_name: str, is_unit_test: bool = False) -> dict:
     Returns:
         dict: A dictionary containing the execution results, including return code, output, and errors.
     """
-    # Initialize class_name and package_name
     class_name = os.path.splitext(os.path.basename(file_name))[0]
     package_name = ""
+    limits = get_limits("java")
     
     try:
         if not os.path.exists(file_name):
@@ -240,85 +282,51 @@ def run_java_code(file_name: str, is_unit_test: bool = False) -> dict:
             for line in f:
                 stripped_line = line.strip()
                 if stripped_line.startswith('package '):
-                    # Extract package name
-                    package_line = stripped_line[len('package '):].strip(';').strip()
-                    package_name = package_line
+                    package_name = stripped_line[len('package '):].strip(';').strip()
                     break
                 elif stripped_line.startswith('public class'):
                     # No package declaration found
                     break
 
-        # Prepare the compilation command
-        compile_command = ["javac"]
-        if is_unit_test:
-            # Include any unit test specific compile options here
-            pass  # e.g., set classpath to include testing libraries
-
-        compile_command.append(file_name)
-
-        # Compile the Java code
-        compile_result = subprocess.run(
-            compile_command,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-
-        if compile_result.returncode != 0:
-            return {
-                "return_code": compile_result.returncode,
-                "output": compile_result.stdout,
-                "errors": compile_result.stderr
-            }
-
-        # Prepare the fully qualified class name
-        if package_name:
-            full_class_name = f"{package_name}.{class_name}"
-        else:
-            full_class_name = class_name
-
-        # Prepare the run command
-        run_command = ["java"]
-        if is_unit_test:
-            # Include any unit test specific run options here
-            pass  # e.g., set classpath to include testing libraries
-
-        run_command.append(full_class_name)
-
-        # Run the Java program
-        run_result = subprocess.run(
-            run_command,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-
-        return {
-            "return_code": run_result.returncode,
-            "output": run_result.stdout,
-            "errors": run_result.stderr
-        }
-    except subprocess.TimeoutExpired:
-        return {
-            "return_code": -1,
-            "output": "",
-            "errors": "Execution timed out after 30 seconds."
-        }
+        # Include any unit test specific compile options here (e.g. a testing classpath)
+        flags = []
+
+        async def build(output_dir: str) -> Dict[str, Any]:
+            # javac is a JVM too: its memory goes through -J-Xmx rather than RLIMIT_AS
+            compile_limits = get_limits("compile")
+            memory = [f"-J-Xmx{compile_limits['memory_mb']}m"] if compile_limits.get("memory_mb") else []
+            return await _run_process(["javac"] + memory + flags + ["-d", os.path.join(output_dir, "classes"), file_name],
+                                      limits=dict(compile_limits, memory_mb=None))
+
+        async with get_compile_cache().compiled(file_name, "javac", flags, build) as (output_dir, compile_result):
+            if compile_result["return_code"] != 0:
+                return compile_result
+
+            full_class_name = f"{package_name}.{class_name}" if package_name else class_name
+            memory = [f"-Xmx{limits['memory_mb']}m"] if limits.get("memory_mb") else []
+            return await _run_process(["java"] + memory + ["-cp", os.path.abspath(os.path.join(output_dir, "classes")), full_class_name],
+                                      limits=dict(limits, memory_mb=None))
+    except asyncio.TimeoutError as e:
+        return _timeout_result(limits["wall"], getattr(e, "metrics", None))
     except Exception as e:
         return {
             "return_code": -1,
             "output": "",
             "errors": f"An error occurred while running the file: {str(e)}"
         }
-    finally:
-        # Clean up compiled .class files
-        # Handle package directories if necessary
-        class_file_path = os.path.join(*package_name.split('.'), f"{class_name}.class") if package_name else f"{class_name}.class"
-        try:
-            if os.path.exists(class_file_path):
-                os.remove(class_file_path)
-        except Exception as cleanup_error:
-            pass  # Optionally log cleanup errors
+
+# Blocking wrappers for callers without an event loop (e.g. ToolHandler running in a worker thread)
+def run_python_file(file_path: str, is_unit_test: bool = False, cwd: Optional[str] = None) -> dict:
+    return asyncio.run(arun_python_file(file_path, is_unit_test, cwd))
+
+def run_c_code(file_path: str, is_unit_test: bool = False) -> dict:
+    return asyncio.run(arun_c_code(file_path, is_unit_test))
+
+def run_cpp_code(file_name: str, is_unit_test: bool = False) -> dict:
+    return asyncio.run(arun_cpp_code(file_name, is_unit_test))
+
+def run_java_code(file_name: str, is_unit_test: bool = False) -> dict:
+    return asyncio.run(arun_java_code(file_name, is_unit_test))
 
 
 # Example usage
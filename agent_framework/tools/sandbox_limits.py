@@ -0,0 +1,104 @@
+import json
+import logging
+import os
+import signal
+import sys
+from typing import Dict, Any, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows: only the wall-clock timeout applies
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Per-language limits for one sandbox run. None leaves a limit unset.
+#   wall: seconds before the process group is killed
+#   cpu: CPU seconds (SIGXCPU, then SIGKILL a second later)
+#   memory_mb: address space; the JVM reserves far more than it uses, so Java gets -Xmx instead
+#   open_files: file descriptors
+#   processes: RLIMIT_NPROC, which Linux counts per user rather than per run, so it is off by
+#       default (a desktop user already runs hundreds of threads); set it for a dedicated user
+DEFAULT_LIMITS = {
+    "python": {"wall": 30, "cpu": 20, "memory_mb": 1024, "open_files": 256, "processes": None},
+    "c": {"wall": 30, "cpu": 20, "memory_mb": 512, "open_files": 256, "processes": None},
+    "cpp": {"wall": 30, "cpu": 20, "memory_mb": 512, "open_files": 256, "processes": None},
+    "java": {"wall": 30, "cpu": 30, "memory_mb": 512, "open_files": 1024, "processes": None},
+    "compile": {"wall": 60, "cpu": 60, "memory_mb": 2048, "open_files": 1024, "processes": None},
+}
+
+_overrides = None
+
+def _load_overrides() -> Dict[str, Dict[str, Any]]:
+    global _overrides
+    if _overrides is None:
+        try:
+            _overrides = json.loads(os.environ.get("SANDBOX_LIMITS", "{}"))
+        except ValueError as e:
+            logger.warning(f"Ignoring SANDBOX_LIMITS, it is not valid JSON: {str(e)}")
+            _overrides = {}
+    return _overrides
+
+def get_limits(language: str) -> Dict[str, Any]:
+    """
+    Limits for `language`: the defaults above, overridden by the SANDBOX_LIMITS environment
+    variable, e.g. SANDBOX_LIMITS='{"python": {"cpu": 5, "memory_mb": 256}, "*": {"wall": 60}}'.
+    """
+    overrides = _load_overrides()
+    return {**DEFAULT_LIMITS[language], **overrides.get("*", {}), **overrides.get(language, {})}
+
+def rlimits(limits: Dict[str, Any]) -> List[List[int]]:
+    """
+    [resource, soft, hard] triples for setrlimit, capped at this process's hard limits
+    (an unprivileged child cannot raise them).
+    """
+    if resource is None:
+        return []
+    wanted = []
+    if limits.get("cpu") is not None:
+        wanted.append((resource.RLIMIT_CPU, int(limits["cpu"]), int(limits["cpu"]) + 1))
+    if limits.get("memory_mb") is not None:
+        size = int(limits["memory_mb"] * 1024 * 1024)
+        wanted.append((resource.RLIMIT_AS, size, size))
+    if limits.get("open_files") is not None:
+        wanted.append((resource.RLIMIT_NOFILE, int(limits["open_files"]), int(limits["open_files"])))
+    if limits.get("processes") is not None and hasattr(resource, "RLIMIT_NPROC"):
+        wanted.append((resource.RLIMIT_NPROC, int(limits["processes"]), int(limits["processes"])))
+    triples = []
+    for which, soft, hard in wanted:
+        _, current_hard = resource.getrlimit(which)
+        if current_hard != resource.RLIM_INFINITY:
+            soft, hard = min(soft, current_hard), min(hard, current_hard)
+        triples.append([which, soft, hard])
+    return triples
+
+def apply_rlimits(triples: List[List[int]]):
+    # Runs in the child between fork and exec; keep it to system calls
+    for which, soft, hard in triples:
+        resource.setrlimit(which, (soft, hard))
+
+def usage_metrics(rusage: Optional[Any], wall_time: float) -> Dict[str, Any]:
+    """cpu_time (seconds), peak_rss (bytes) and wall_time (seconds) of a finished child."""
+    if rusage is None:
+        return {"cpu_time": None, "peak_rss": None, "wall_time": round(wall_time, 6)}
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+    return {"cpu_time": round(rusage.ru_utime + rusage.ru_stime, 6), "peak_rss": peak, "wall_time": round(wall_time, 6)}
+
+def describe_kill(return_code: int, cpu_time: Optional[float], limits: Optional[Dict[str, Any]]) -> str:
+    """
+    A note for the errors text when a signal ended the run. The CPU limit is only blamed for
+    SIGXCPU, or for SIGKILL once the measured CPU time reached it (the hard limit); memory and
+    external kills get the signal's name.
+    """
+    if return_code >= 0:
+        return ""
+    cpu_limit = limits.get("cpu") if limits else None
+    if cpu_limit is not None and hasattr(signal, "SIGXCPU"):
+        if return_code == -signal.SIGXCPU or (return_code == -signal.SIGKILL and cpu_time is not None and cpu_time >= cpu_limit):
+            return f"\nProcess killed: CPU time limit of {cpu_limit} seconds exceeded."
+    try:
+        name = signal.Signals(-return_code).name
+    except ValueError:
+        name = str(-return_code)
+    return f"\nProcess killed by signal {name}."
@@ -0,0 +1,213 @@
+"""
+Warm sandbox worker, started by tools/worker_pool.py; standard library only.
+
+Reads one JSON job per line on stdin ({"file_path", "is_unit_test", "cwd", "timeout", "args",
+"capture", "live", "rlimits"}), runs it in a forked child so nothing it imports or changes survives
+the run, and writes one JSON result per line on stdout ({"return_code", "output", "errors",
+"output_bytes", "errors_bytes", "timed_out", "cpu_time", "peak_rss", "wall_time", "rss"}).
+The child's output and errors are read from pipes as it runs and only the first and last `capture`
+bytes of each are kept. With "live" set, {"stream", "line"} messages carrying the newest output
+line come first. "rlimits" are [resource, soft, hard] triples
+set in the child before the job runs.
+"""
+import sys
+_STARTUP_MODULES = set(sys.modules)  # What a plain interpreter has loaded before running a file
+
+import json
+import os
+import resource
+import select
+import signal
+import time
+import traceback
+from output_capture import BoundedOutput, LiveLines
+
+# Imported once here and inherited by every forked run
+import runpy
+import unittest
+import unittest.mock  # noqa: F401
+import collections  # noqa: F401
+import dataclasses  # noqa: F401
+import itertools  # noqa: F401
+import math  # noqa: F401
+import random  # noqa: F401
+import re  # noqa: F401
+import typing  # noqa: F401
+
+def _rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+def _evict_shadowed(directory):
+    # `python file.py` would import a project module over a same-named one the worker preloaded
+    for name in list(sys.modules):
+        top = name.partition(".")[0]
+        if top not in _STARTUP_MODULES and (os.path.isfile(os.path.join(directory, top + ".py"))
+                                            or os.path.isfile(os.path.join(directory, top, "__init__.py"))):
+            del sys.modules[name]
+
+def _run_child(job, stdout_fd, stderr_fd, parent_fds):
+    # Runs in the forked child; never returns
+    code = 1
+    try:
+        os.setpgid(0, 0)
+        # The worker's own pipes, the JSON protocol included, are not the run's to write to
+        for fd in parent_fds:
+            os.close(fd)
+        for which, soft, hard in job.get("rlimits", []):
+            resource.setrlimit(which, (soft, hard))
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.close(devnull)
+        os.dup2(stdout_fd, 1)
+        os.dup2(stderr_fd, 2)
+        os.close(stdout_fd)
+        os.close(stderr_fd)
+        sys.stdin = open(0, closefd=False)
+        # Line-buffered stdout only when someone watches it live; it slows print loops down
+        sys.stdout = open(1, "w", buffering=1 if job.get("live") else -1, closefd=False)
+        sys.stderr = open(2, "w", buffering=1, closefd=False)
+        if job.get("cwd"):
+            os.chdir(job["cwd"])
+        file_path = job["file_path"]
+        try:
+            if job.get("is_unit_test"):
+                # Same as `python -m unittest <file>`: the working directory is importable
+                sys.path[0] = os.getcwd()
+                _evict_shadowed(sys.path[0])
+                sys.argv = ["python -m unittest", file_path]
+                unittest.main(module=None, argv=sys.argv)
+            else:
+                sys.path[0] = os.path.dirname(os.path.abspath(file_path))
+                _evict_shadowed(sys.path[0])
+                sys.argv = [file_path] + job.get("args", [])
+                runpy.run_path(os.path.abspath(file_path), run_name="__main__")
+            code = 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                code = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except BaseException as e:
+            # Show the traceback from the user's code down, as a plain `python file.py` would
+            tb = e.__traceback__
+            while tb is not None and (tb.tb_frame.f_code.co_filename == __file__ or tb.tb_frame.f_code.co_filename.startswith("<frozen runpy")):
+                tb = tb.tb_next
+            traceback.print_exception(type(e), e, tb)
+            code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+READ_SIZE = 65536
+
+def _drain(fd, sinks) -> bool:
+    # Feed what the pipe holds to its sinks; False once the write end is closed
+    while True:
+        try:
+            data = os.read(fd, READ_SIZE)
+        except BlockingIOError:
+            return True
+        if not data:
+            return False
+        for sink in sinks:
+            sink.feed(data)
+
+def _wait(pid, timeout, pipes):
+    # (exit code, timed out, rusage), reading the child's pipes into their sinks meanwhile;
+    # pidfd avoids polling where the platform has it
+    deadline = time.monotonic() + timeout
+    pidfd = None
+    if hasattr(os, "pidfd_open"):
+        try:
+            pidfd = os.pidfd_open(pid)
+        except OSError:
+            pidfd = None
+    open_pipes = dict(pipes)
+    try:
+        while True:
+            finished, status, rusage = os.wait4(pid, os.WNOHANG)
+            if finished:
+                # Background processes the run left in its group do not outlive it
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                return os.waitstatus_to_exitcode(status), False, rusage
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except OSError:
+                    os.kill(pid, signal.SIGKILL)
+                _, _, rusage = os.wait4(pid, 0)
+                return -1, True, rusage
+            watched = list(open_pipes) + ([pidfd] if pidfd is not None else [])
+            if pidfd is None:
+                remaining = min(remaining, 0.005)
+            if watched:
+                ready, _, _ = select.select(watched, [], [], remaining)
+            else:
+                ready = []
+                time.sleep(remaining)
+            for fd in ready:
+                if fd in open_pipes and not _drain(fd, open_pipes[fd]):
+                    del open_pipes[fd]
+    finally:
+        # Whatever is left; a background grandchild holding the pipe open is not waited for
+        for fd, sinks in open_pipes.items():
+            _drain(fd, sinks)
+        if pidfd is not None:
+            os.close(pidfd)
+
+def main():
+    protocol_out = os.fdopen(os.dup(1), "w")
+    for line in sys.stdin:
+        job = json.loads(line)
+        head, tail = job.get("capture", [8192, 8192])
+        output, errors = BoundedOutput(head, tail), BoundedOutput(head, tail)
+        sinks = {"output": [output], "errors": [errors]}
+        if job.get("live"):
+            def send_line(stream, line):
+                protocol_out.write(json.dumps({"stream": stream, "line": line}) + "\n")
+                protocol_out.flush()
+
+            live = {name: LiveLines(send_line, name) for name in sinks}
+            for name in sinks:
+                sinks[name].append(live[name])
+        stdout_read, stdout_write = os.pipe()
+        stderr_read, stderr_write = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            _run_child(job, stdout_write, stderr_write, [stdout_read, stderr_read, protocol_out.fileno()])
+        os.close(stdout_write)
+        os.close(stderr_write)
+        try:
+            for fd in (stdout_read, stderr_read):
+                os.set_blocking(fd, False)
+            return_code, timed_out, rusage = _wait(pid, job.get("timeout", 30), {stdout_read: sinks["output"], stderr_read: sinks["errors"]})
+        finally:
+            os.close(stdout_read)
+            os.close(stderr_read)
+        if job.get("live"):
+            for lines in live.values():
+                lines.close()
+        wall_time = time.perf_counter() - started
+        result = {"return_code": return_code, "output": output.text(), "errors": errors.text(), "output_bytes": output.total,
+                  "errors_bytes": errors.total, "timed_out": timed_out, "cpu_time": round(rusage.ru_utime + rusage.ru_stime, 6),
+                  "peak_rss": rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024), "wall_time": round(wall_time, 6), "rss": _rss()}
+        protocol_out.write(json.dumps(result) + "\n")
+        protocol_out.flush()
+
+if __name__ == "__main__":
+    main()
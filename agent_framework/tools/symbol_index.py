@@ -0,0 +1,245 @@
+import ast
+import os
+import re
+import threading
+from difflib import get_close_matches
+from typing import Dict, Any, List, Optional, Tuple
+
+_JS_DECLARATION = re.compile(
+    r"^[ \t]*(?:export\s+(?:default\s+)?)?(?:"
+    r"(?:async\s+)?function\s*\*?\s*(?P<function>[A-Za-z_$][\w$]*)"
+    r"|class\s+(?P<class>[A-Za-z_$][\w$]*)"
+    r"|(?:const|let|var)\s+(?P<binding>[A-Za-z_$][\w$]*)\s*=\s*(?:async\s+)?(?:function\b|class\b|\([^)]*\)\s*=>|[A-Za-z_$][\w$]*\s*=>)"
+    r")",
+    re.MULTILINE
+)
+_JS_METHOD = re.compile(r"^[ \t]*(?:static\s+)?(?:async\s+)?(?:get\s+|set\s+)?(?P<name>[A-Za-z_$][\w$]*)\s*\([^)]*\)\s*\{", re.MULTILINE)
+_JS_KEYWORDS = {"if", "for", "while", "switch", "catch", "function", "return", "with"}
+_HTML_ID = re.compile(r"<(?P<tag>[a-zA-Z][\w-]*)\b[^>]*\bid\s*=\s*[\"'](?P<id>[^\"']+)[\"'][^>]*>")
+_HTML_BLOCK = re.compile(r"<(?P<tag>script|style)\b[^>]*>", re.IGNORECASE)
+
+def _block_end(text: str, start: int) -> int:
+    """Index just past the brace block opening at or after `start`, skipping strings and comments."""
+    depth, i, length = 0, text.find("{", start), len(text)
+    if i < 0:
+        return length
+    while i < length:
+        char = text[i]
+        if char in "\"'`":
+            i += 1
+            while i < length and text[i] != char:
+                i += 2 if text[i] == "\\" else 1
+        elif text.startswith("//", i):
+            i = text.find("\n", i)
+            if i < 0:
+                return length
+        elif text.startswith("/*", i):
+            i = text.find("*/", i + 2)
+            if i < 0:
+                return length
+            i += 1
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return length
+
+def _python_symbols(text: str) -> List[Tuple[str, str, int, int]]:
+    # (qualified name, kind, start, end) as character offsets covering whole lines, decorators included
+    tree = ast.parse(text)
+    line_starts = [0]
+    for line in text.splitlines(keepends=True):
+        line_starts.append(line_starts[-1] + len(line))
+    symbols = []
+
+    def visit(body, prefix: str):
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                first_line = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+                kind = "class" if isinstance(node, ast.ClassDef) else ("method" if prefix else "function")
+                name = prefix + node.name
+                symbols.append((name, kind, line_starts[first_line - 1], line_starts[node.end_lineno]))
+                visit(node.body, name + ".")
+            elif not prefix and isinstance(node, (ast.Assign, ast.AnnAssign)):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                for target in targets:
+                    if isinstance(target, ast.Name):
+                        symbols.append((target.id, "variable", line_starts[node.lineno - 1], line_starts[node.end_lineno]))
+    visit(tree.body, "")
+    return symbols
+
+def _python_fallback_symbols(text: str) -> List[Tuple[str, str, int, int]]:
+    # For files that do not parse yet: top-level defs and classes up to the next top-level statement
+    starts = [(match.group(2), "class" if match.group(1) == "class" else "function", match.start())
+              for match in re.finditer(r"^(class|def|async def)\s+([A-Za-z_]\w*)", text, re.MULTILINE)]
+    top_level = [match.start() for match in re.finditer(r"^\S", text, re.MULTILINE)]
+    symbols = []
+    for name, kind, start in starts:
+        end = next((offset for offset in top_level if offset > start and not text.startswith("@", offset)), len(text))
+        symbols.append((name, kind, start, end))
+    return symbols
+
+def _js_symbols(text: str) -> List[Tuple[str, str, int, int]]:
+    symbols = []
+    for match in _JS_DECLARATION.finditer(text):
+        name = match.group("function") or match.group("class") or match.group("binding")
+        kind = "class" if match.group("class") or re.search(r"=\s*class\b", match.group(0)) else "function"
+        brace = text.find("{", match.end())
+        newline = text.find(";", match.end())
+        # Arrow functions without a body end at the statement's semicolon
+        if brace < 0 or (0 <= newline < brace):
+            end = newline + 1 if newline >= 0 else len(text)
+        else:
+            end = _block_end(text, match.end())
+        symbols.append((name, kind, match.start(), end))
+        if kind == "class":
+            for method in _JS_METHOD.finditer(text, match.end(), end):
+                if method.group("name") not in _JS_KEYWORDS:
+                    symbols.append((f"{name}.{method.group('name')}", "method", method.start(), _block_end(text, method.start())))
+    return symbols
+
+def _css_symbols(text: str) -> List[Tuple[str, str, int, int]]:
+    symbols, i = [], 0
+    stripped = re.sub(r"/\*.*?\*/", lambda m: " " * len(m.group(0)), text, flags=re.DOTALL)
+    while True:
+        brace = stripped.find("{", i)
+        if brace < 0:
+            break
+        selector = stripped[i:brace].strip()
+        end = _block_end(stripped, brace)
+        if selector:
+            start = i + len(stripped[i:brace]) - len(stripped[i:brace].lstrip())
+            symbols.append((" ".join(selector.split()), "at-rule" if selector.startswith("@") else "rule", start, end))
+        i = end
+    return symbols
+
+def _html_symbols(text: str) -> List[Tuple[str, str, int, int]]:
+    symbols = []
+    for match in _HTML_ID.finditer(text):
+        symbols.append(("#" + match.group("id"), "element", match.start(), _html_element_end(text, match.group("tag"), match.end())))
+    for number, match in enumerate(_HTML_BLOCK.finditer(text), 1):
+        tag = match.group("tag").lower()
+        close = text.lower().find(f"</{tag}>", match.end())
+        end = close + len(tag) + 3 if close >= 0 else len(text)
+        symbols.append((f"<{tag}>[{number}]", tag, match.start(), end))
+    return symbols
+
+def _html_element_end(text: str, tag: str, position: int) -> int:
+    pattern = re.compile(rf"<(/?){re.escape(tag)}\b[^>]*?(/?)>", re.IGNORECASE)
+    depth = 1
+    for match in pattern.finditer(text, position):
+        if match.group(1):
+            depth -= 1
+        elif not match.group(2):
+            depth += 1
+        if depth == 0:
+            return match.end()
+    return position
+
+_PARSERS = {".py": _python_symbols, ".js": _js_symbols, ".mjs": _js_symbols, ".css": _css_symbols, ".html": _html_symbols, ".htm": _html_symbols}
+
+def extract_symbols(path: str, text: str) -> List[Dict[str, Any]]:
+    """Definitions in `text` as {"name", "kind", "start", "end", "line", "end_line"} with byte offsets."""
+    parser = _PARSERS.get(os.path.splitext(path)[1].lower())
+    if parser is None:
+        return []
+    try:
+        found = parser(text)
+    except (SyntaxError, ValueError):
+        # ValueError: ast.parse rejects source containing null bytes
+        found = _python_fallback_symbols(text)
+    symbols = []
+    byte_offset = (lambda offset: offset) if text.isascii() else (lambda offset: len(text[:offset].encode("utf-8")))
+    for name, kind, start, end in found:
+        symbols.append({
+            "name": name,
+            "kind": kind,
+            "start": byte_offset(start),
+            "end": byte_offset(end),
+            "line": text.count("\n", 0, start) + 1,
+            "end_line": text.count("\n", 0, max(start, end - 1)) + 1
+        })
+    return symbols
+
+class SymbolIndex:
+    """
+    Definitions in the project folder mapped to byte ranges, per file.
+
+    FileOperations updates a file's entry whenever it writes it; other files are (re)parsed
+    lazily when their mtime or size no longer matches, so lookups never read unchanged files.
+    """
+    def __init__(self, root: str):
+        self.root = root
+        self.files: Dict[str, Dict[str, Any]] = {}  # path -> {"mtime_ns", "size", "symbols"}
+        self._lock = threading.Lock()
+
+    def update(self, path: str, content: str) -> List[Dict[str, Any]]:
+        symbols = extract_symbols(path, content)
+        try:
+            stat = os.stat(os.path.join(self.root, path))
+        except FileNotFoundError:
+            return symbols
+        with self._lock:
+            self.files[path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "symbols": symbols}
+        return symbols
+
+    def symbols(self, path: str) -> Optional[List[Dict[str, Any]]]:
+        """Symbols of one file, or None if it does not exist."""
+        file_path = os.path.join(self.root, path)
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            with self._lock:
+                self.files.pop(path, None)
+            return None
+        with self._lock:
+            entry = self.files.get(path)
+            if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                return entry["symbols"]
+        try:
+            # newline="": offsets must count the "\r" of CRLF files, as read() seeks in bytes
+            with open(file_path, encoding="utf-8", newline="") as f:
+                content = f.read()
+        except UnicodeDecodeError:
+            content = ""
+        return self.update(path, content)
+
+    def all_symbols(self) -> Dict[str, List[Dict[str, Any]]]:
+        result = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, "/")
+                if os.path.splitext(path)[1].lower() in _PARSERS:
+                    result[path] = self.symbols(path) or []
+        return result
+
+    def find(self, path: str, name: str) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+        """(symbol, []) for an exact or unique unqualified match, else (None, candidate names)."""
+        symbols = self.symbols(path) or []
+        exact = [symbol for symbol in symbols if symbol["name"] == name]
+        if not exact:
+            exact = [symbol for symbol in symbols if symbol["name"].rsplit(".", 1)[-1] == name]
+        if len(exact) == 1:
+            return exact[0], []
+        if exact:
+            return None, [symbol["name"] for symbol in exact]
+        return None, get_close_matches(name, [symbol["name"] for symbol in symbols], n=5, cutoff=0.5)
+
+    def read(self, path: str, symbol: Dict[str, Any]) -> str:
+        with open(os.path.join(self.root, path), "rb") as f:
+            f.seek(symbol["start"])
+            return f.read(symbol["end"] - symbol["start"]).decode("utf-8", errors="replace")
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_symbol_index(root: str) -> SymbolIndex:
+    """One index per project folder, shared by every FileOperations in the process."""
+    key = os.path.abspath(root)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = SymbolIndex(root)
+        return _indexes[key]
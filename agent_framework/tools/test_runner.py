@@ -0,0 +1,208 @@
+import ast
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, Any, Callable, List, Optional
+from .sandbox import _run_process, SandboxTimeout
+from .sandbox_limits import get_limits, describe_kill
+from .worker_pool import get_worker_pool, WorkerError
+
+logger = logging.getLogger(__name__)
+
+SHARD_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "unittest_shard.py")
+MIN_TESTS_PER_SHARD = 8  # Smaller suites run in one process; a shard is not worth its fork below this
+FAILED_STATUSES = ("failed", "error", "unexpected_success", "timeout")
+SPLITTABLE_BASES = ("TestCase", "unittest.TestCase", "IsolatedAsyncioTestCase", "unittest.IsolatedAsyncioTestCase")
+
+def discover_tests(source: str) -> Optional[Dict[str, Dict[str, List[str]]]]:
+    """
+    Classes of a test module with their base classes and test methods, read from the source
+    without importing it: {class: {"bases": [...], "tests": [...]}}.
+
+    Returns None when the module cannot be split safely: a syntax error or a `load_tests`
+    hook. Classes that are not TestCases are listed too; the shard runner skips them.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return None
+    classes = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == "load_tests":
+            return None
+        if isinstance(node, ast.ClassDef) and node.bases:
+            classes[node.name] = {
+                "bases": [ast.unparse(base) for base in node.bases],
+                "tests": [item.name for item in node.body
+                          if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and item.name.startswith("test")]
+            }
+    return classes
+
+def plan_shards(source: str, shards: int) -> List[List[str]]:
+    """
+    Split a test module into at most `shards` lists of unittest names ("Class" or
+    "Class.test_method"), balanced by test count. Whole classes are kept together so
+    setUpClass runs once; a class is split by method only when there are fewer classes
+    than shards. An empty name list means "the whole module".
+    """
+    classes = discover_tests(source)
+    if not classes:
+        return [[]]
+    total = sum(len(info["tests"]) for info in classes.values())
+    shards = max(1, min(shards, total // MIN_TESTS_PER_SHARD))
+    if shards == 1:
+        return [[]]
+
+    units = []
+    for name, info in classes.items():
+        tests = info["tests"]
+        # Splitting by method would drop inherited tests, so only plain TestCases are split
+        if len(classes) < shards and len(tests) > 1 and all(base in SPLITTABLE_BASES for base in info["bases"]):
+            size = -(-len(tests) // shards)
+            units.extend((len(chunk), [f"{name}.{test}" for test in chunk])
+                         for chunk in (tests[i:i + size] for i in range(0, len(tests), size)))
+        else:
+            units.append((len(tests) or 1, [name]))
+
+    # Largest unit first onto the lightest shard
+    planned = [[0, []] for _ in range(min(shards, len(units)))]
+    for size, names in sorted(units, key=lambda unit: -unit[0]):
+        lightest = min(planned, key=lambda shard: shard[0])
+        lightest[0] += size
+        lightest[1].extend(names)
+    return [names for _, names in planned]
+
+def _split_names(names: List[str], shards: int) -> List[List[str]]:
+    # Contiguous chunks keep a class's selected tests together where they fit
+    if not names:
+        return []
+    shards = max(1, min(shards, len(names) // MIN_TESTS_PER_SHARD))
+    size = -(-len(names) // shards)
+    return [names[i:i + size] for i in range(0, len(names), size)]
+
+async def _run_shard(file_path: str, names: List[str], cwd: Optional[str],
+                     on_output: Optional[Callable[[str, str], None]], footprint_root: Optional[str]) -> Dict[str, Any]:
+    limits = get_limits("python")
+    handle, results_path = tempfile.mkstemp(prefix="ensemble-tests-", suffix=".json")
+    os.close(handle)
+    try:
+        args = ([f"--footprint={footprint_root}"] if footprint_root else []) + [results_path, file_path] + names
+        result = None
+        pool = get_worker_pool()
+        if pool is not None:
+            try:
+                result = await pool.arun(SHARD_SCRIPT, False, cwd, limits["wall"], args, on_output, limits)
+                if result.pop("timed_out"):
+                    raise SandboxTimeout(result)
+                result["errors"] += describe_kill(result["return_code"], result["cpu_time"], limits)
+            except WorkerError as e:
+                logger.warning(f"Sandbox worker failed, running {file_path} tests in a new interpreter: {str(e)}")
+                result = None
+        if result is None:
+            result = await _run_process(["python", SHARD_SCRIPT] + args, cwd=cwd, on_output=on_output, limits=limits)
+        try:
+            with open(results_path) as f:
+                result.update(json.load(f))
+        except (OSError, ValueError):
+            # The runner died before writing results, e.g. os._exit in a test
+            result["tests"] = [{"id": " ".join(names) or file_path, "status": "error", "duration": 0.0,
+                                "traceback": result["errors"][-2000:] or f"Test process exited with code {result['return_code']}"}]
+        return result
+    except asyncio.TimeoutError as e:
+        metrics = getattr(e, "metrics", None) or {}
+        return {"return_code": -1, "output": "", "errors": "", "cpu_time": metrics.get("cpu_time"), "peak_rss": metrics.get("peak_rss"),
+                "wall_time": metrics.get("wall_time") or float(limits["wall"]),
+                "tests": [{"id": " ".join(names) or file_path, "status": "timeout", "duration": float(limits["wall"]),
+                           "traceback": f"Execution timed out after {limits['wall']} seconds."}]}
+    finally:
+        os.remove(results_path)
+
+def summarize(tests: List[Dict[str, Any]], duration: float, shards: int) -> Dict[str, Any]:
+    counts = {status: 0 for status in ("passed", "failed", "error", "skipped", "expected_failure", "unexpected_success", "timeout")}
+    for test in tests:
+        counts[test["status"]] = counts.get(test["status"], 0) + 1
+    return dict(counts, total=len(tests), duration=round(duration, 3), shards=shards)
+
+def format_report(tests: List[Dict[str, Any]], summary: Dict[str, Any]) -> str:
+    """The familiar unittest text: failure tracebacks, the run count and OK/FAILED."""
+    labels = {"failed": "FAIL", "error": "ERROR", "timeout": "TIMEOUT"}
+    lines = []
+    for test in tests:
+        if test["status"] in labels:
+            lines += ["=" * 70, f"{labels[test['status']]}: {test['id']}", "-" * 70, test.get("traceback", "").rstrip()]
+    lines += ["-" * 70, f"Ran {summary['total']} tests in {summary['duration']:.3f}s", ""]
+    failures = {"failures": summary["failed"], "errors": summary["error"] + summary["timeout"],
+                "unexpected successes": summary["unexpected_success"]}
+    if any(failures.values()):
+        lines.append("FAILED (" + ", ".join(f"{name}={count}" for name, count in failures.items() if count) + ")")
+    else:
+        lines.append(f"OK (skipped={summary['skipped']})" if summary["skipped"] else "OK")
+        lines.append("All tests passed")
+    return "\n".join(lines)
+
+def compact_results(result: Dict[str, Any], max_failures: int = 10) -> Dict[str, Any]:
+    """The summary plus the failing tests, small enough to hand to a reviewer."""
+    failing = [test for test in result.get("tests", []) if test["status"] in FAILED_STATUSES]
+    return {
+        "summary": result.get("summary", {}),
+        "failures": [{"id": test["id"], "status": test["status"], "traceback": test.get("traceback", "")[-600:]}
+                     for test in failing[:max_failures]]
+    }
+
+async def arun_unit_tests(file_path: str, cwd: Optional[str] = None, workers: Optional[int] = None,
+                          on_output: Optional[Callable[[str, str], None]] = None, only: Optional[List[str]] = None,
+                          reuse: Optional[List[Dict[str, Any]]] = None, footprint_root: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Run a unittest module in parallel shards and collect a result per test.
+
+    Returns the usual sandbox dict (return code, output, errors, where errors carries the
+    unittest-style report) plus "tests" ([{"id", "status", "duration", "traceback"?}]) and
+    "summary" (counts per status, total, duration, shards).
+
+    `only` restricts the run to those "Class.test_method" names; `reuse` records from an
+    earlier run are reported alongside the fresh ones, marked "cached". With `footprint_root`,
+    "footprints" maps each test id to the files under that directory whose functions it called,
+    each class id to those its class fixtures called, and "" to the rest (import, module fixtures).
+    """
+    started = time.perf_counter()
+    path = os.path.join(cwd or "", file_path)
+    try:
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+    except OSError:
+        return {"return_code": -1, "output": "", "errors": f"An error occurred while running the file: File not found: {file_path}"}
+
+    if workers is None:
+        pool = get_worker_pool()
+        workers = pool.size if pool is not None else os.cpu_count() or 1
+    shards = plan_shards(source, workers) if only is None else _split_names(only, workers)
+    results = await asyncio.gather(*(_run_shard(file_path, names, cwd, on_output, footprint_root) for names in shards))
+
+    tests = [dict(test, cached=True) for test in reuse or []] + [test for result in results for test in result["tests"]]
+    summary = summarize(tests, time.perf_counter() - started, len(shards))
+    if reuse:
+        summary["reused"] = len(reuse)
+    failed = any(test["status"] in FAILED_STATUSES for test in tests) or not tests
+    stderr = "".join(result["errors"] for result in results if result["errors"].strip())
+    footprints = {}
+    for result in results:
+        # Shards of one split class each run its fixtures
+        for key, files in result.get("footprints", {}).items():
+            footprints[key] = sorted(set(footprints.get(key, [])) | set(files))
+    return {
+        "return_code": (max((result["return_code"] for result in results), key=abs, default=1) or 1) if failed else 0,
+        "output": "".join(result["output"] for result in results),
+        "errors": (stderr + "\n" if stderr else "") + format_report(tests, summary),
+        "output_bytes": sum(result.get("output_bytes", 0) for result in results),
+        "errors_bytes": sum(result.get("errors_bytes", 0) for result in results),
+        # CPU adds up across shards; peak_rss is that of the largest shard
+        "cpu_time": sum(result.get("cpu_time") or 0 for result in results),
+        "peak_rss": max((result.get("peak_rss") or 0 for result in results), default=0),
+        "wall_time": round(time.perf_counter() - started, 6),
+        "tests": tests,
+        "summary": summary,
+        **({"footprints": footprints} if footprint_root else {})
+    }
@@ -1,20 +1,143 @@
+import asyncio
+import contextvars
 import json
 import logging
-from typing import Dict, Any, Tuple
-from .file_ops import FileOperations
-from .sandbox import run_python_file
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Tuple, List, Set, Optional
+from .file_ops import FileOperations, project_relative_path
+from .overlay import current_overlay
+from .sandbox import arun_python_file
+from .test_runner import arun_unit_tests, compact_results
+from .result_cache import get_result_cache
 from .artifacts import run_artifact_review
+from llm.tokenizer import count_tokens
 import os
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Tools without side effects; safe to start before the model has finished its response
+READ_ONLY_TOOLS = {"read_file", "read_codebase", "list_symbols", "read_symbol", "read_context"}
+
+MAX_CODEBASE_TOKENS = 8000  # read_codebase lists every file but inlines contents only up to this
+
+def tool_call_path(function_call: Dict[str, Any]) -> Optional[str]:
+    # Project-relative file a tool call works on, if any
+    try:
+        args = json.loads(function_call["arguments"])
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if not isinstance(args, dict):
+        return None
+    path = args.get("filename") or args.get("file_path")
+    return project_relative_path(str(path)) if path else None
+
 class ToolHandler:
-    def __init__(self):
+    def __init__(self, max_workers: int = 4):
         self.file_ops = FileOperations()
+        self.max_workers = max_workers
+        self.run_log = None  # Optional llm.recorder.RunLog capturing tool calls and sandbox results
+        self.output_callback = None  # Optional callable receiving live sandbox output lines as dicts
+        self.context_manager = None  # Optional utils.context_manager.ContextManager whose ctx: references read_context resolves
         # Remove the initialization of self.artifact_reviewer from here
 
+    def handle_tool_calls(self, function_calls: List[Dict[str, Any]], task_id: int) -> List[Tuple[str, bool]]:
+        """Run a batch of tool calls concurrently on a thread pool, returning results in call order."""
+        results = [None] * len(function_calls)
+        levels = self._execution_levels(function_calls)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(function_calls)))) as pool:
+            for level in sorted(set(levels)):
+                # Pool threads do not inherit context variables; each call carries a copy, so it
+                # writes to the task attempt's overlay like the async path does
+                futures = {
+                    index: pool.submit(contextvars.copy_context().run, self.handle_tool_call, function_calls[index], task_id)
+                    for index, call_level in enumerate(levels) if call_level == level
+                }
+                for index, future in futures.items():
+                    results[index] = future.result()
+        return results
+
+    async def ahandle_tool_calls(self, function_calls: List[Dict[str, Any]], task_id: int, prestarted: Optional[Dict[Tuple[str, str], asyncio.Task]] = None) -> List[Tuple[str, bool]]:
+        """
+        Async variant of handle_tool_calls. `prestarted` maps (name, arguments) to tool runs that were
+        started while the response was still streaming; they are only reused when no earlier call in
+        the batch conflicts with them.
+        """
+        prestarted = prestarted if prestarted is not None else {}
+        results = [None] * len(function_calls)
+        levels = self._execution_levels(function_calls)
+
+        async def run(index: int, level: int) -> Tuple[str, bool]:
+            function_call = function_calls[index]
+            key = (function_call["name"], function_call["arguments"])
+            if level == 0 and key in prestarted:
+                return await prestarted.pop(key)
+            return await self.ahandle_tool_call(function_call, task_id)
+
+        for level in sorted(set(levels)):
+            batch = [index for index, call_level in enumerate(levels) if call_level == level]
+            outcomes = await asyncio.gather(*(run(index, level) for index in batch))
+            for index, outcome in zip(batch, outcomes):
+                results[index] = outcome
+        return results
+
+    def _execution_levels(self, function_calls: List[Dict[str, Any]]) -> List[int]:
+        # Calls in the same level are independent; a call runs after every earlier call it conflicts with
+        footprints = [self._tool_footprint(function_call) for function_call in function_calls]
+        levels = []
+        for index, footprint in enumerate(footprints):
+            level = 0
+            for earlier in range(index):
+                if self._conflicts(footprints[earlier], footprint):
+                    level = max(level, levels[earlier] + 1)
+            levels.append(level)
+        return levels
+
+    def _tool_footprint(self, function_call: Dict[str, Any]) -> Tuple[Set[str], bool]:
+        # (resources the call touches, whether it modifies them)
+        try:
+            args = json.loads(function_call["arguments"])
+        except (json.JSONDecodeError, TypeError):
+            return set(), False
+        if not isinstance(args, dict):
+            return set(), False
+
+        tool_name = function_call["name"]
+        if tool_name in ("write_file", "read_file"):
+            folder = "src/" if args.get("is_project_file") else "agent/"
+            return {folder + project_relative_path(str(args.get("filename", "")))}, tool_name == "write_file"
+        elif tool_name in ("apply_patch", "rollback_file"):
+            return {"src/" + project_relative_path(str(args.get("filename", "")))}, True
+        elif tool_name in ("list_symbols", "read_symbol"):
+            return ({"src/" + project_relative_path(str(args["filename"]))} if args.get("filename") else {"src/*"}), False
+        elif tool_name == "read_codebase":
+            return {"src/*"}, False
+        elif tool_name == "run_python_file":
+            return {"src/" + project_relative_path(str(args.get("file_path", "")))}, False
+        elif tool_name == "request_human_review":
+            # Interactive: never run two reviews at once
+            return {"human", "src/" + project_relative_path(str(args.get("file_path", "")))}, True
+        return set(), False
+
+    @staticmethod
+    def _conflicts(first: Tuple[Set[str], bool], second: Tuple[Set[str], bool]) -> bool:
+        (first_resources, first_writes), (second_resources, second_writes) = first, second
+        if not (first_writes or second_writes):
+            return False
+        for a in first_resources:
+            for b in second_resources:
+                if a == b or (a == "src/*" and b.startswith("src/")) or (b == "src/*" and a.startswith("src/")):
+                    return True
+        return False
+
     def handle_tool_call(self, function_call: Dict[str, Any], task_id: int) -> Tuple[str, bool]:
+        started = time.perf_counter()
+        outcome = self._dispatch_tool_call(function_call, task_id)
+        self._record_tool_call(function_call, task_id, started, outcome)
+        return outcome
+
+    def _dispatch_tool_call(self, function_call: Dict[str, Any], task_id: int) -> Tuple[str, bool]:
         tool_name = function_call["name"]
         logger.info(f"Handling tool call: {tool_name} for task {task_id}")
         
@@ -28,10 +151,20 @@ class ToolHandler:
 
         if tool_name == "write_file":
             return self._handle_write_file(args, task_id)
+        elif tool_name == "apply_patch":
+            return self._handle_apply_patch(args, task_id)
+        elif tool_name == "rollback_file":
+            return self._handle_rollback_file(args, task_id)
         elif tool_name == "read_file":
             return self._handle_read_file(args, task_id)
         elif tool_name == "read_codebase":
-            return self._handle_read_codebase(task_id)
+            return self._handle_read_codebase(args, task_id)
+        elif tool_name == "list_symbols":
+            return self._handle_list_symbols(args, task_id)
+        elif tool_name == "read_symbol":
+            return self._handle_read_symbol(args, task_id)
+        elif tool_name == "read_context":
+            return self._handle_read_context(args, task_id)
         elif tool_name == "mark_task_complete":
             return self._handle_mark_task_complete(args, task_id)
         elif tool_name == "run_python_file":
@@ -43,6 +176,76 @@ class ToolHandler:
             logger.error(error_msg)
             return error_msg, False
 
+    async def ahandle_tool_call(self, function_call: Dict[str, Any], task_id: int) -> Tuple[str, bool]:
+        started = time.perf_counter()
+        outcome = await self._adispatch_tool_call(function_call, task_id)
+        self._record_tool_call(function_call, task_id, started, outcome)
+        return outcome
+
+    async def _adispatch_tool_call(self, function_call: Dict[str, Any], task_id: int) -> Tuple[str, bool]:
+        # Sandbox runs are awaited natively; the remaining tools are quick file operations run off-loop
+        if function_call["name"] == "run_python_file":
+            try:
+                args = json.loads(function_call["arguments"])
+            except json.JSONDecodeError:
+                error_msg = f"Error: Invalid JSON in function arguments for task {task_id}"
+                logger.error(error_msg)
+                return error_msg, False
+            logger.info(f"Handling tool call: run_python_file for task {task_id}")
+            return await self._ahandle_run_python_file(args, task_id)
+        return await asyncio.to_thread(self._dispatch_tool_call, function_call, task_id)
+
+    def _record_tool_call(self, function_call: Dict[str, Any], task_id: int, started: float, outcome: Tuple[str, bool]):
+        if self.run_log is not None:
+            self.run_log.record("tool", {
+                "task": task_id,
+                "name": function_call["name"],
+                "arguments": function_call["arguments"],
+                "result": outcome[0],
+                "success": outcome[1]
+            }, time.perf_counter() - started)
+
+    def run_python_file(self, file_path: str, is_unit_test: bool = False) -> Dict[str, Any]:
+        return asyncio.run(self.arun_python_file(file_path, is_unit_test))
+
+    async def arun_python_file(self, file_path: str, is_unit_test: bool = False) -> Dict[str, Any]:
+        started = time.perf_counter()
+        on_output = None
+        if self.output_callback is not None:
+            on_output = lambda stream, line: self.output_callback({"file_path": file_path, "stream": stream, "line": line})
+        # Project files run from the project folder, as they do under an overlay
+        key = project_relative_path(file_path)
+        root = self.file_ops.project_folder
+        overlay = current_overlay()
+        if overlay is not None and overlay.writes:
+            # Run against the task attempt's uncommitted files
+            overlay_root = await asyncio.to_thread(overlay.materialize)
+            if os.path.isfile(os.path.join(overlay_root, key)):
+                root = overlay_root
+        in_project = os.path.isfile(os.path.join(root, key))
+        cwd, run_path = (root, key) if in_project else (None, file_path)
+
+        def run(only: Optional[List[str]] = None, reuse: Optional[List[Dict[str, Any]]] = None, footprint_root: Optional[str] = None):
+            if is_unit_test:
+                return arun_unit_tests(run_path, cwd=cwd, on_output=on_output, only=only, reuse=reuse, footprint_root=footprint_root)
+            return arun_python_file(run_path, cwd=cwd, on_output=on_output)
+
+        cache = get_result_cache()
+        if cache.enabled and in_project:
+            # Skip runs whose code is unchanged, and tests the change cannot reach
+            if is_unit_test:
+                result = await cache.arun_tests(root, key, lambda only, reuse: run(only, reuse, os.path.abspath(root)))
+            else:
+                result = await cache.arun(root, key, run)
+        else:
+            result = await run()
+        self._record_sandbox(file_path, is_unit_test, started, result)
+        return result
+
+    def _record_sandbox(self, file_path: str, is_unit_test: bool, started: float, result: Dict[str, Any]):
+        if self.run_log is not None:
+            self.run_log.record("sandbox", {"file_path": file_path, "is_unit_test": is_unit_test, "result": result}, time.perf_counter() - started)
+
     def _handle_write_file(self, args: Dict[str, Any], task_id: int) -> Tuple[str, bool]:
         try:
             result = self.file_ops.write_file(args["is_project_file"], args["content"], args["filename"])
@@ -57,9 +260,48 @@ class ToolHandler:
             logger.error(error_msg)
             return error_msg, False
 
+    def _handle_apply_patch(self, args: Dict[str, Any], task_id: int) -> Tuple[str, bool]:
+        try:
+            base_version = args.get("base_version")
+            result = self.file_ops.apply_patch(args["filename"], args["patch"], int(base_version) if base_version is not None else None)
+            if result["status"] == "conflict":
+                conflicts = "\n".join(f"- {conflict}" for conflict in result["conflicts"])
+                logger.info(f"Patch to {args['filename']} rejected for task {task_id}")
+                return f"Patch to '{args['filename']}' not applied; nothing was changed:\n{conflicts}\nRe-read the file (currently version {result['version']}) and send a patch against its current contents.", False
+            logger.info(f"Patch applied to {args['filename']}")
+            return f"Patch applied to '{args['filename']}' ({result['hunks']} hunk(s)); the file is now version {result['version']}", True
+        except KeyError as e:
+            error_msg = f"Error: Missing key {str(e)} in function arguments for task {task_id}"
+            logger.error(error_msg)
+            return error_msg, False
+        except Exception as e:
+            error_msg = f"Error patching file for task {task_id}: {str(e)}"
+            logger.error(error_msg)
+            return error_msg, False
+
+    def _handle_rollback_file(self, args: Dict[str, Any], task_id: int) -> Tuple[str, bool]:
+        try:
+            result = self.file_ops.rollback_file(args["filename"], int(args["version"]))
+            if result.startswith("Error"):
+                logger.info(f"Rollback of {args['filename']} failed for task {task_id}: {result}")
+                return result, False
+            logger.info(f"Rolled {args['filename']} back to version {args['version']}")
+            return f"Restored '{args['filename']}' to version {args['version']}; the file is now version {self.file_ops.file_version(args['filename'])}", True
+        except KeyError as e:
+            error_msg = f"Error: Missing key {str(e)} in function arguments for task {task_id}"
+            logger.error(error_msg)
+            return error_msg, False
+        except Exception as e:
+            error_msg = f"Error rolling back file for task {task_id}: {str(e)}"
+            logger.error(error_msg)
+            return error_msg, False
+
     def _handle_read_file(self, args: Dict[str, Any], task_id: int) -> Tuple[str, bool]:
         try:
             content = self.file_ops.read_file(args["is_project_file"], args["filename"])
+            version = self.file_ops.file_version(args["filename"]) if args["is_project_file"] else 0
+            if version:
+                return f"Content of file '{args['filename']}' (version {version}): {content}", True
             return f"Content of file '{args['filename']}': {content}", True
         except KeyError as e:
             error_msg = f"Error: Missing key {str(e)} in function arguments for task {task_id}"
@@ -70,18 +312,79 @@ class ToolHandler:
             logger.error(error_msg)
             return error_msg, False
 
-    def _handle_read_codebase(self, task_id: int) -> Tuple[str, bool]:
+    def _handle_list_symbols(self, args: Dict[str, Any], task_id: int) -> Tuple[str, bool]:
         try:
-            codebase = self.file_ops.read_codebase()
-            codebase_data = json.loads(codebase)
-            if codebase_data.get("status") == "empty":
-                return codebase_data["message"], True
-            return f"Codebase structure: {json.dumps(codebase_data, indent=2)}", True
+            listing = self.file_ops.list_symbols(args.get("filename"))
+            if not listing:
+                return f"No such file: {args['filename']}" if args.get("filename") else "The codebase has no source files yet.", True
+            lines = []
+            for path, symbols in sorted(listing.items()):
+                lines.append(f"{path}:" if symbols else f"{path}: (no definitions found)")
+                lines.extend(f"  {symbol['kind']} {symbol['name']} (lines {symbol['line']}-{symbol['end_line']})" for symbol in symbols)
+            return "\n".join(lines), True
+        except Exception as e:
+            error_msg = f"Error listing symbols for task {task_id}: {str(e)}"
+            logger.error(error_msg)
+            return error_msg, False
+
+    def _handle_read_symbol(self, args: Dict[str, Any], task_id: int) -> Tuple[str, bool]:
+        try:
+            result = self.file_ops.read_symbol(args["filename"], args["symbol"])
+            if result["status"] == "not_found":
+                hint = f" Did you mean: {', '.join(result['candidates'])}?" if result["candidates"] else " Use list_symbols to see what the file defines."
+                return f"Symbol '{args['symbol']}' not found in '{args['filename']}'.{hint}", False
+            symbol = result["symbol"]
+            return f"{symbol['kind']} {symbol['name']} in '{args['filename']}' (lines {symbol['line']}-{symbol['end_line']}):\n{result['source']}", True
+        except KeyError as e:
+            error_msg = f"Error: Missing key {str(e)} in function arguments for task {task_id}"
+            logger.error(error_msg)
+            return error_msg, False
+        except Exception as e:
+            error_msg = f"Error reading symbol for task {task_id}: {str(e)}"
+            logger.error(error_msg)
+            return error_msg, False
+
+    def _handle_read_codebase(self, args: Dict[str, Any], task_id: int) -> Tuple[str, bool]:
+        try:
+            since = args.get("since_snapshot")
+            snapshot = self.file_ops.read_codebase(int(since) if since is not None else None)
+            if since is None and not snapshot["files"]:
+                return "The codebase is currently empty. You may need to use the write_file function to create the file.", True
+            if since is not None and not snapshot["files"] and not snapshot["deleted"]:
+                return f"No files changed since snapshot {since} (current snapshot {snapshot['snapshot']}).", True
+            # Serialized once, compactly; the model reads JSON fine without indentation
+            return f"Codebase snapshot: {json.dumps(self._fit_codebase(snapshot, MAX_CODEBASE_TOKENS))}", True
         except Exception as e:
             error_msg = f"Error reading codebase for task {task_id}: {str(e)}"
             logger.error(error_msg)
             return error_msg, False
 
+    @staticmethod
+    def _fit_codebase(snapshot: Dict[str, Any], max_tokens: int) -> Dict[str, Any]:
+        # List every file, but inline contents smallest first until the budget is spent
+        files = [file for file in snapshot["files"] if file.get("content") is not None]
+        remaining = max_tokens - sum(count_tokens(file["path"]) + 16 for file in snapshot["files"])
+        for file in sorted(files, key=lambda f: count_tokens(f["content"])):
+            cost = count_tokens(file["content"])
+            if cost <= remaining:
+                remaining -= cost
+            else:
+                del file["content"]
+                file["note"] = f"Content omitted ({cost} tokens); use read_file to see it"
+        return snapshot
+
+    def _handle_read_context(self, args: Dict[str, Any], task_id: int) -> Tuple[str, bool]:
+        try:
+            reference = str(args["reference"]).strip()
+            payload = self.context_manager.get_payload(reference) if self.context_manager is not None else None
+            if payload is None:
+                return f"Context item '{reference}' is no longer available; it has left the context window. Read the file again instead.", False
+            return f"Content of context item '{reference}': {payload}", True
+        except KeyError as e:
+            error_msg = f"Error: Missing key {str(e)} in function arguments for task {task_id}"
+            logger.error(error_msg)
+            return error_msg, False
+
     def _handle_mark_task_complete(self, args: Dict[str, Any], task_id: int) -> Tuple[str, bool]:
         try:
             completed_task_id = args["task_id"]
@@ -97,16 +400,23 @@ class ToolHandler:
             return error_msg, False
 
     def _handle_run_python_file(self, args: Dict[str, Any], task_id: int) -> Tuple[str, bool]:
+        return asyncio.run(self._ahandle_run_python_file(args, task_id))
+
+    async def _ahandle_run_python_file(self, args: Dict[str, Any], task_id: int) -> Tuple[str, bool]:
         try:
             file_path = args["file_path"]
             is_unit_test = args["is_unit_test"]
 
             # Run the Python file
-            result = run_python_file(file_path, is_unit_test)
+            result = await self.arun_python_file(file_path, is_unit_test)
             
             # Analyze the result
             success = result["return_code"] == 0
             output = f"Execution result:\nReturn Code: {result['return_code']}\nOutput: {result['output']}\nErrors: {result['errors']}"
+            if "tests" in result:
+                output += f"\nTest results: {json.dumps(compact_results(result))}"
+            if result.get("cached"):
+                output += "\n(Reused from an earlier run: none of the executed code has changed since.)"
             
             return output, success
         except KeyError as e:
@@ -0,0 +1,197 @@
+"""
+Runs part of a unittest module and writes a JSON result per test; started by tools/test_runner.py.
+
+usage: unittest_shard.py [--footprint=ROOT] RESULTS_JSON TEST_FILE [CLASS_OR_TEST ...]
+
+Names are "Class" or "Class.test_method" within the module (no names runs the whole module).
+TEST_FILE is resolved against the working directory the way `python -m unittest` does.
+With --footprint (Python 3.12+, where sys.monitoring makes it cheap; ignored before), the
+results also map each test id to the files under ROOT whose functions it called. Calls made by a class's setUpClass, tearDownClass and class cleanups go under the
+class id ("module.Class"); those made while importing the module, by module fixtures or
+anywhere else outside a test go under "".
+Standard library only.
+"""
+import importlib
+import io
+import json
+import os
+import sys
+import time
+import traceback
+import unittest
+
+MAX_TRACEBACK_CHARS = 2000
+
+def _truncate(text: str) -> str:
+    # The end of a traceback holds the assertion; keep that
+    if len(text) <= MAX_TRACEBACK_CHARS:
+        return text
+    return f"[... {len(text) - MAX_TRACEBACK_CHARS} chars cut ...]\n" + text[-MAX_TRACEBACK_CHARS:]
+
+CO_OPTIMIZED = 0x1  # Set on function code; module and class bodies lack it
+CLASS_FIXTURES = ("setUpClass", "tearDownClass", "doClassCleanups")
+
+class Footprint:
+    """
+    Collects the files under `root` whose Python functions are called, keyed by the running
+    test, or by the fixture on the stack between tests.
+    Module and class bodies are left out: the result cache tracks those separately.
+
+    Uses sys.monitoring PY_START events. Each function is reported once and then disabled,
+    and events are re-enabled when a test starts or ends. A call-heavy test therefore pays
+    for one callback per function, not one per call.
+    """
+    TOOL_ID = 1  # sys.monitoring.COVERAGE_ID; the run is skipped if a coverage tool holds it
+
+    def __init__(self, root: str):
+        self.root = os.path.join(os.path.abspath(root), "")
+        self.by_test = {}
+        self.current = None  # Id of the running test
+
+    @classmethod
+    def available(cls) -> bool:
+        monitoring = getattr(sys, "monitoring", None)
+        return monitoring is not None and monitoring.get_tool(cls.TOOL_ID) is None
+
+    def _on_start(self, code, offset):
+        if code.co_flags & CO_OPTIMIZED:
+            filename = code.co_filename
+            if filename.startswith(self.root) and filename != __file__:
+                key = self.current if self.current is not None else self._fixture_key(sys._getframe(1))
+                self.by_test.setdefault(key, set()).add(filename)
+        return sys.monitoring.DISABLE
+
+    @staticmethod
+    def _fixture_key(frame) -> str:
+        # The class whose fixture is on the stack; "" for module fixtures and the import
+        while frame is not None:
+            code = frame.f_code
+            if code.co_name in CLASS_FIXTURES and code.co_argcount:
+                cls = frame.f_locals.get(code.co_varnames[0])
+                if isinstance(cls, type):
+                    return f"{cls.__module__}.{cls.__qualname__}"
+            frame = frame.f_back
+        return ""
+
+    def start(self):
+        sys.monitoring.use_tool_id(self.TOOL_ID, "ensemble-footprint")
+        sys.monitoring.register_callback(self.TOOL_ID, sys.monitoring.events.PY_START, self._on_start)
+        sys.monitoring.set_events(self.TOOL_ID, sys.monitoring.events.PY_START)
+
+    def stop(self):
+        sys.monitoring.set_events(self.TOOL_ID, 0)
+        sys.monitoring.register_callback(self.TOOL_ID, sys.monitoring.events.PY_START, None)
+        sys.monitoring.free_tool_id(self.TOOL_ID)
+
+    def begin_test(self, test_id: str):
+        self.current = test_id
+        self.by_test.setdefault(test_id, set())
+        sys.monitoring.restart_events()
+
+    def end_test(self):
+        self.current = None
+        sys.monitoring.restart_events()
+
+    def report(self) -> dict:
+        return {key: sorted(files) for key, files in self.by_test.items()}
+
+class RecordingResult(unittest.TextTestResult):
+    def __init__(self, *args, footprint=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.records = []
+        self._started = {}
+        self.footprint = footprint
+
+    def startTest(self, test):
+        self._started[test.id()] = time.perf_counter()
+        super().startTest(test)
+        if self.footprint is not None:
+            self.footprint.begin_test(test.id())
+
+    def stopTest(self, test):
+        if self.footprint is not None:
+            self.footprint.end_test()
+        super().stopTest(test)
+
+    def _record(self, test, status, err=None, reason=None):
+        started = self._started.get(test.id())
+        record = {"id": test.id(), "status": status, "duration": round(time.perf_counter() - started, 6) if started else 0.0}
+        if err is not None:
+            record["traceback"] = _truncate(self._exc_info_to_string(err, test))
+        if reason:
+            record["reason"] = reason
+        self.records.append(record)
+
+    def addSuccess(self, test):
+        super().addSuccess(test)
+        self._record(test, "passed")
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self._record(test, "failed", err)
+
+    def addError(self, test, err):
+        super().addError(test, err)
+        self._record(test, "error", err)
+
+    def addSkip(self, test, reason):
+        super().addSkip(test, reason)
+        self._record(test, "skipped", reason=reason)
+
+    def addExpectedFailure(self, test, err):
+        super().addExpectedFailure(test, err)
+        self._record(test, "expected_failure")
+
+    def addUnexpectedSuccess(self, test):
+        super().addUnexpectedSuccess(test)
+        self._record(test, "unexpected_success")
+
+    def addSubTest(self, test, subtest, err):
+        super().addSubTest(test, subtest, err)
+        if err is not None:
+            self._record(subtest, "failed" if issubclass(err[0], test.failureException) else "error", err)
+
+def _module_name(test_file: str) -> str:
+    return os.path.splitext(os.path.normpath(os.path.relpath(test_file)))[0].replace(os.sep, ".")
+
+def main():
+    args = sys.argv[1:]
+    footprint = None
+    if args and args[0].startswith("--footprint="):
+        root = args.pop(0)[len("--footprint="):]
+        # Without sys.monitoring there are no footprints, and the result cache reruns whole modules
+        footprint = Footprint(root) if Footprint.available() else None
+    results_path, test_file, names = args[0], args[1], args[2:]
+    # Like `python -m unittest`: modules next to the working directory are importable
+    sys.path[0] = os.getcwd()
+    module_name = _module_name(test_file)
+    loader = unittest.TestLoader()
+    started = time.perf_counter()
+    stream = io.StringIO()
+    result = RecordingResult(stream, descriptions=True, verbosity=0, footprint=footprint)
+    if footprint is not None:
+        footprint.start()
+    try:
+        module = importlib.import_module(module_name)
+        if names:
+            # Only TestCase classes; the planner lists every class in the file
+            names = [name for name in names if isinstance(getattr(module, name.split(".")[0], None), type)
+                     and issubclass(getattr(module, name.split(".")[0]), unittest.TestCase)]
+            suite = loader.loadTestsFromNames(names, module)
+        else:
+            suite = loader.loadTestsFromModule(module)
+        suite.run(result)
+    except Exception:
+        result.records.append({"id": module_name, "status": "error", "duration": 0.0, "traceback": _truncate(traceback.format_exc())})
+    finally:
+        if footprint is not None:
+            footprint.stop()
+    with open(results_path, "w") as f:
+        report = {"tests": result.records, "duration": time.perf_counter() - started}
+        if footprint is not None:
+            report["footprints"] = footprint.report()
+        json.dump(report, f)
+    sys.exit(0 if all(record["status"] in ("passed", "skipped", "expected_failure") for record in result.records) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import Sequence
+from difflib import unified_diff
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BLOB_CACHE_SIZE = 64  # Decompressed blobs kept in memory
+
+class VersionStore:
+    """
+    Content-addressed history of project files.
+
+    Every recorded write is stored once as a zlib-compressed blob named by its SHA-256
+    (identical contents share a blob) and appended to a single JSONL version log. Only the
+    per-file lists of hashes are held in memory, so the previous version of a file is an O(1)
+    lookup and contents are read back (through a small LRU cache) only when asked for.
+    """
+    def __init__(self, root: str, cache_size: int = BLOB_CACHE_SIZE):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.log_path = os.path.join(root, "versions.jsonl")
+        self.cache_size = cache_size
+        self.versions: Dict[str, List[str]] = {}  # path -> blob hash of each version, oldest first
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    self.versions.setdefault(record["path"], []).append(record["hash"])
+                except (ValueError, KeyError):
+                    logger.warning(f"Skipping unreadable line in {self.log_path}")
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def record(self, path: str, content: str, **metadata) -> int:
+        """Store `content` as the newest version of `path` and return its version number (from 1)."""
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            history = self.versions.setdefault(path, [])
+            if history and history[-1] == digest:
+                return len(history)
+            blob_path = self._blob_path(digest)
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                tmp_path = f"{blob_path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(zlib.compress(data))
+                os.replace(tmp_path, blob_path)
+            history.append(digest)
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps({"path": path, "version": len(history), "hash": digest, "size": len(data), "time": time.time(), **metadata}) + "\n")
+            self._remember(digest, content)
+            return len(history)
+
+    def _remember(self, digest: str, content: str):
+        self._cache[digest] = content
+        self._cache.move_to_end(digest)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _read_blob(self, digest: str) -> str:
+        with self._lock:
+            if digest in self._cache:
+                self._cache.move_to_end(digest)
+                return self._cache[digest]
+        with open(self._blob_path(digest), "rb") as f:
+            content = zlib.decompress(f.read()).decode("utf-8")
+        with self._lock:
+            self._remember(digest, content)
+        return content
+
+    def count(self, path: str) -> int:
+        return len(self.versions.get(path, ()))
+
+    def get(self, path: str, version: int = -1) -> Optional[str]:
+        """Contents of `path` at `version` (1-based; negative counts from the newest)."""
+        history = self.versions.get(path)
+        if not history:
+            return None
+        index = version - 1 if version > 0 else version
+        if not -len(history) <= index < len(history):
+            return None
+        return self._read_blob(history[index])
+
+    def previous(self, path: str) -> Optional[str]:
+        return self.get(path, -2)
+
+    def history(self, path: str) -> "FileHistory":
+        return FileHistory(self, path)
+
+    def diff(self, path: str, old_version: int, new_version: int = -1, context: int = 3) -> str:
+        history = self.versions.get(path, [])
+        old_hash = history[old_version - 1 if old_version > 0 else old_version]
+        new_hash = history[new_version - 1 if new_version > 0 else new_version]
+        if old_hash == new_hash:
+            return ""
+        return "".join(unified_diff(
+            self._read_blob(old_hash).splitlines(keepends=True),
+            self._read_blob(new_hash).splitlines(keepends=True),
+            fromfile=f"{path}@{old_version}",
+            tofile=f"{path}@{new_version}",
+            n=context
+        ))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            versions = sum(len(history) for history in self.versions.values())
+            blobs = len({digest for history in self.versions.values() for digest in history})
+        return {"files": len(self.versions), "versions": versions, "blobs": blobs}
+
+class FileHistory(Sequence):
+    """Lazy, read-only list of a file's versions, oldest first; contents load on access."""
+    def __init__(self, store: VersionStore, path: str):
+        self.store = store
+        self.path = path
+
+    def __len__(self) -> int:
+        return self.store.count(self.path)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        return self.store.get(self.path, index + 1 if index >= 0 else index)
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_version_store(root: str) -> VersionStore:
+    """One store per directory, shared by every FileOperations in the process."""
+    key = os.path.abspath(root)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = VersionStore(root)
+        return _stores[key]
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, Any, Callable, List, Optional
+from .output_capture import OUTPUT_HEAD_BYTES, OUTPUT_TAIL_BYTES
+from .sandbox_limits import rlimits
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_worker.py")
+DEFAULT_POOL_SIZE = 4
+DEFAULT_MAX_RUNS = 50  # Runs before a worker is replaced
+DEFAULT_MAX_RSS_GROWTH = 64 * 1024 * 1024  # Bytes a worker may grow past its first reported size
+REPLY_GRACE = 5  # Seconds past the run timeout before a silent worker is given up on
+
+class WorkerError(Exception):
+    """The worker process died or stopped answering; the run can be retried without the pool."""
+
+class _Worker:
+    def __init__(self, python: str):
+        self.process = subprocess.Popen(
+            [python, "-u", WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            start_new_session=True
+        )
+        self.runs = 0
+        self.base_rss = None
+        self.rss = 0
+
+    def run(self, job: Dict[str, Any], on_output: Optional[Callable[[str, str], None]] = None) -> Dict[str, Any]:
+        replies = queue.Queue()
+
+        def read():
+            # Live-line messages until the result
+            while True:
+                line = self.process.stdout.readline()
+                replies.put(line)
+                if not line.startswith('{"stream"'):
+                    return
+
+        reader = threading.Thread(target=read, daemon=True)
+        try:
+            self.process.stdin.write(json.dumps(job) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerError(f"sandbox worker is gone: {str(e)}")
+        reader.start()
+        deadline = time.monotonic() + job["timeout"] + REPLY_GRACE
+        while True:
+            try:
+                line = replies.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise WorkerError("sandbox worker stopped answering")
+            if not line:
+                raise WorkerError("sandbox worker exited")
+            if not line.startswith('{"stream"'):
+                break
+            if on_output is not None:
+                message = json.loads(line)
+                on_output(message["stream"], message["line"])
+        result = json.loads(line)
+        self.runs += 1
+        self.rss = result.pop("rss", 0)
+        if self.base_rss is None:
+            self.base_rss = self.rss
+        return result
+
+    def close(self):
+        try:
+            self.process.kill()
+            self.process.wait(timeout=5)
+        except Exception:
+            pass
+
+class WorkerPool:
+    """
+    Warm Python interpreters that run sandbox jobs in forked children.
+
+    Each worker has already started up and imported unittest and the common standard library,
+    so a run costs a fork instead of an interpreter start. Runs are isolated: the child exits
+    after one script or test module. Workers are replaced after `max_runs` runs or once they
+    have grown `max_rss_growth` bytes; replacements start in the background while idle.
+    Thread-safe and independent of any event loop.
+    """
+    def __init__(self, size: int = DEFAULT_POOL_SIZE, max_runs: int = DEFAULT_MAX_RUNS,
+                 max_rss_growth: int = DEFAULT_MAX_RSS_GROWTH, python: str = "python"):
+        self.size = size
+        self.max_runs = max_runs
+        self.max_rss_growth = max_rss_growth
+        self.python = python
+        self._idle = queue.LifoQueue()
+        self._started = 0
+        self._lock = threading.Lock()
+        self.counters = {"runs": 0, "recycled": 0, "failures": 0}
+
+    def _acquire(self) -> _Worker:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._started < self.size:
+                self._started += 1
+                return _Worker(self.python)
+        return self._idle.get()
+
+    def _release(self, worker: _Worker, healthy: bool):
+        worn = worker.runs >= self.max_runs or (worker.base_rss is not None and worker.rss - worker.base_rss > self.max_rss_growth)
+        if healthy and not worn:
+            self._idle.put(worker)
+            return
+        worker.close()
+        with self._lock:
+            self.counters["recycled" if healthy else "failures"] += 1
+        # Start the replacement now so it is warm by the next run
+        self._idle.put(_Worker(self.python))
+
+    def run(self, file_path: str, is_unit_test: bool = False, cwd: Optional[str] = None, timeout: float = 30,
+            args: Optional[List[str]] = None, on_output: Optional[Callable[[str, str], None]] = None,
+            limits: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Run one job on an idle worker. Output comes back as the head and tail of each stream;
+        `on_output(stream, line)` is called from this thread with the newest line while it runs.
+        `limits` (see sandbox_limits.get_limits) are set with setrlimit in the forked child.
+        """
+        worker = self._acquire()
+        healthy = False
+        try:
+            result = worker.run({
+                "file_path": file_path, "is_unit_test": is_unit_test, "cwd": os.path.abspath(cwd or os.getcwd()),
+                "timeout": timeout, "args": args or [], "capture": [OUTPUT_HEAD_BYTES, OUTPUT_TAIL_BYTES],
+                "live": on_output is not None, "rlimits": rlimits(limits) if limits else []
+            }, on_output)
+            healthy = True
+        finally:
+            self._release(worker, healthy)
+        with self._lock:
+            self.counters["runs"] += 1
+        return result
+
+    async def arun(self, file_path: str, is_unit_test: bool = False, cwd: Optional[str] = None, timeout: float = 30,
+                   args: Optional[List[str]] = None, on_output: Optional[Callable[[str, str], None]] = None,
+                   limits: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.run, file_path, is_unit_test, cwd, timeout, args, on_output, limits)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters, workers=self._started)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+def get_worker_pool() -> Optional[WorkerPool]:
+    """
+    The process-wide pool, or None where it cannot be used: SANDBOX_POOL=off, or a platform
+    without fork. SANDBOX_POOL_SIZE sets the number of workers.
+    """
+    global _default_pool
+    if os.getenv("SANDBOX_POOL", "on").lower() in ("off", "0", "false") or not hasattr(os, "fork") or sys.platform.startswith("win"):
+        return None
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = WorkerPool(size=int(os.getenv("SANDBOX_POOL_SIZE", DEFAULT_POOL_SIZE)))
+        return _default_pool
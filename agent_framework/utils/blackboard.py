@@ -0,0 +1,109 @@
+import itertools
+import logging
+import threading
+from collections import deque
+from typing import List, Dict, Any, Optional, Callable, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1000
+MAX_FIELD_CHARS = 8000  # Longer string fields are cut when posted, keeping memory bounded
+
+Record = Tuple[int, str, Dict[str, Any]]  # (sequence number, author, entry)
+
+class Blackboard:
+    """
+    Context store shared by every agent of a Coordinator.
+
+    Posts are appended to a bounded deque (O(1), oldest dropped first) under a lock, so agents
+    running in parallel threads or tasks can write and read concurrently. Subscribers are
+    called synchronously on the posting thread with (author, entry) and should only do cheap
+    work, such as adding the entry to their own ContextManager. Entries are copied on post
+    and must be treated as read-only by readers.
+    """
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._subscribers: Dict[int, Tuple[Callable[[str, Dict[str, Any]], None], Optional[Set[str]], Optional[str]]] = {}
+        self._next_token = itertools.count(1)
+
+    def post(self, author: str, entry: Dict[str, Any]) -> int:
+        entry = {
+            key: value[:MAX_FIELD_CHARS] + f"\n[... {len(value) - MAX_FIELD_CHARS} chars cut ...]" if isinstance(value, str) and len(value) > MAX_FIELD_CHARS else value
+            for key, value in entry.items()
+        }
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._entries.append((seq, author, entry))
+            subscribers = list(self._subscribers.values())
+        for callback, authors, exclude_author in subscribers:
+            if author == exclude_author or (authors is not None and author not in authors):
+                continue
+            try:
+                callback(author, entry)
+            except Exception as e:
+                logger.warning(f"Blackboard subscriber failed on a post from {author}: {str(e)}")
+        return seq
+
+    def subscribe(self, callback: Callable[[str, Dict[str, Any]], None], authors: Optional[Set[str]] = None, exclude_author: Optional[str] = None) -> int:
+        """Call `callback(author, entry)` for every later post (from `authors` only, if given)."""
+        token = next(self._next_token)
+        with self._lock:
+            self._subscribers[token] = (callback, set(authors) if authors is not None else None, exclude_author)
+        return token
+
+    def unsubscribe(self, token: int):
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    def read(self, since: int = 0, authors: Optional[Set[str]] = None, exclude_author: Optional[str] = None, limit: Optional[int] = None) -> List[Record]:
+        """Posts with a sequence number above `since`, oldest first (the last `limit` of them, if given)."""
+        with self._lock:
+            if not self._entries:
+                return []
+            start = max(0, since - self._entries[0][0] + 1)
+            records = list(itertools.islice(self._entries, start, None))
+        records = [
+            record for record in records
+            if record[1] != exclude_author and (authors is None or record[1] in authors)
+        ]
+        return records[-limit:] if limit else records
+
+    def view(self, agent: str) -> "BlackboardView":
+        return BlackboardView(self, agent)
+
+    @property
+    def last_seq(self) -> int:
+        with self._lock:
+            return self._seq
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "posts": self._seq,
+                "entries": len(self._entries),
+                "dropped": self._seq - len(self._entries),
+                "subscribers": len(self._subscribers)
+            }
+
+class BlackboardView:
+    """One agent's window on a Blackboard: posts under its name and reads what others posted since its last look."""
+    def __init__(self, blackboard: Blackboard, agent: str):
+        self.blackboard = blackboard
+        self.agent = agent
+        self.cursor = 0
+
+    def post(self, entry: Dict[str, Any]) -> int:
+        return self.blackboard.post(self.agent, entry)
+
+    def new_entries(self, authors: Optional[Set[str]] = None) -> List[Record]:
+        records = self.blackboard.read(since=self.cursor)
+        if records:
+            self.cursor = records[-1][0]
+        return [record for record in records if record[1] != self.agent and (authors is None or record[1] in authors)]
+
+    def subscribe(self, callback: Callable[[str, Dict[str, Any]], None], authors: Optional[Set[str]] = None) -> int:
+        return self.blackboard.subscribe(callback, authors, exclude_author=self.agent)
@@ -1,9 +1,24 @@
+import json
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Union
 from difflib import unified_diff
+from tools.test_runner import compact_results
 
 class CodeReviewer:
-    def review_changes(self, task_description: str, new_content: Dict[str, Any], file_history: List[str], sandbox_result: str = None) -> Dict[str, Any]:
+    def __init__(self, version_store=None):
+        self.version_store = version_store
+
+    def review_file(self, task_description: str, filename: str, sandbox_result: Union[str, Dict[str, Any]] = None) -> Dict[str, Any]:
+        # Review the newest recorded version of a project file against the one before it
+        if self.version_store is None:
+            return {"approved": False, "comments": "No version history available for review."}
+        history = self.version_store.history(filename)
+        if not history:
+            return {"approved": False, "comments": f"No recorded versions of {filename}."}
+        # Only the previous version is loaded; review_changes compares against file_history[-1]
+        return self.review_changes(task_description, {"content": history[-1]}, history[-2:-1], sandbox_result)
+
+    def review_changes(self, task_description: str, new_content: Dict[str, Any], file_history: List[str], sandbox_result: Union[str, Dict[str, Any]] = None) -> Dict[str, Any]:
         try:
             if not file_history:
                 return {"approved": True, "comments": "New file created."}
@@ -25,6 +40,12 @@ class CodeReviewer:
             if not diff:
                 return {"approved": True, "comments": "No changes detected."}
 
+            # Failing tests outweigh everything else
+            if sandbox_result:
+                failures = self._test_failures(sandbox_result)
+                if failures:
+                    return {"approved": False, "comments": f"Changes do not pass all tests. Please review and fix. Failing: {', '.join(failures)}"}
+
             # Implement more sophisticated review logic here
             # For now, we'll just check if the changes align with the task description
             changes_align_with_task = all(line.lower() in task_description.lower() for line in diff if line.startswith('+'))
@@ -33,14 +54,20 @@ class CodeReviewer:
                 return {"approved": True, "comments": "Changes align with the task description."}
             else:
                 return {"approved": False, "comments": "Changes do not seem to align with the task description. Please review and adjust."}
-
-            # Consider sandbox results in the review
-            if sandbox_result:
-                sandbox_success = "All tests passed" in sandbox_result
-                if sandbox_success:
-                    return {"approved": True, "comments": f"Changes align with the task description and pass all tests. Sandbox result: {sandbox_result}"}
-                else:
-                    return {"approved": False, "comments": f"Changes do not pass all tests. Please review and fix. Sandbox result: {sandbox_result}"}
         except Exception as e:
             return {"approved": False, "comments": f"Error during code review: {str(e)}"}
 
+
+    @staticmethod
+    def _test_failures(sandbox_result: Union[str, Dict[str, Any]]) -> List[str]:
+        # Ids of failing tests, from a structured sandbox result or its "Test results:" line
+        if isinstance(sandbox_result, dict):
+            if "tests" not in sandbox_result:
+                return [] if sandbox_result.get("return_code") == 0 else ["(run failed)"]
+            results = compact_results(sandbox_result, max_failures=len(sandbox_result["tests"]))
+        else:
+            line = next((line for line in sandbox_result.splitlines() if line.startswith("Test results: ")), None)
+            if line is None:
+                return [] if "All tests passed" in sandbox_result else ["(no test results)"]
+            results = json.loads(line[len("Test results: "):])
+        return [test["id"] for test in results["failures"]]
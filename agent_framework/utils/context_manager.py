@@ -1,18 +1,240 @@
-import json
-from collections import deque
-from typing import List, Dict, Any
+import hashlib
+import logging
+import math
+import re
+import threading
+from collections import deque, Counter, defaultdict
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
+from llm.tokenizer import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTEXT_TOKENS = 2000
+DEFAULT_TOP_K = 10
+PINNED_PER_FILE = 3  # Most recent tool results on the task's own file, always included
+DEFAULT_INLINE_TOKENS = 300  # Larger entry fields are stored out of line
+DEFAULT_SUMMARY_TOKENS = 500
+PREVIEW_TOKENS = 60
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    # "task_manager.py" -> ["task", "manager", "py"]; identifiers and file names match piecewise
+    return _TOKEN.findall(text.lower())
 
 class ContextManager:
-    def __init__(self, max_entries: int = 50):
-        self.context = deque(maxlen=max_entries)
+    """
+    Sliding window of context entries with an incremental BM25 index and a rolling summary.
+
+    The index is updated as entries are added and evicted, so get_relevant_context ranks the
+    window against a task in time proportional to the query's postings, not the whole history.
+
+    Entry fields larger than `inline_tokens` (typically whole files returned by tools) are
+    kept out of line in `payloads` and replaced by a short preview and a reference that the
+    read_context tool resolves through get_payload; they are still indexed in full. Entries leaving the window are folded into a rolling summary: one
+    extractive line each, rewritten by `summarizer` (an async LLM call) when acompact() runs
+    and the summary has grown past `summary_tokens`. Without a summarizer, or when it fails,
+    the oldest lines are dropped instead, so the summary never exceeds its budget.
+    """
+    def __init__(self, max_entries: int = 50, k1: float = 1.5, b: float = 0.75,
+                 inline_tokens: int = DEFAULT_INLINE_TOKENS, summary_tokens: int = DEFAULT_SUMMARY_TOKENS,
+                 summarizer: Optional[Callable[[str, int], Awaitable[str]]] = None):
+        self.max_entries = max_entries
+        self.context = deque()
+        self.k1 = k1
+        self.b = b
+        self.inline_tokens = inline_tokens
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+        self.payloads: Dict[str, str] = {}  # reference -> full text of an oversized field
+        self.compacted_summary = ""
+        self.summary_lines = deque()  # (line, tokens) per evicted entry not yet rewritten
+        self._compacted_tokens = 0
+        self._summary_line_tokens = 0
+        self._compacting = False
+        self._lock = threading.RLock()  # Shared entries can arrive from other agents' threads
+        self._next_id = 0
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)  # term -> {entry id: term frequency}
+        self._terms: Dict[int, Counter] = {}
+        self._lengths: Dict[int, int] = {}
+        self._rendered: Dict[int, Tuple[str, int]] = {}  # entry id -> (prompt text, tokens)
+        self._total_length = 0
 
     def add_entry(self, entry: Dict[str, Any]):
-        self.context.append(entry)
+        with self._lock:
+            if len(self.context) >= self.max_entries:
+                self._evict()
+            entry_id = self._next_id
+            self._next_id += 1
+            full_text = self._render(entry)
+            entry = self._externalize(entry)
+            self.context.append((entry_id, entry))
+            self._index(entry_id, full_text)
+            rendered = self._render(entry)
+            self._rendered[entry_id] = (rendered, count_tokens(rendered))
+
+    def _externalize(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        compact = dict(entry)
+        for field, value in entry.items():
+            if isinstance(value, str) and count_tokens(value) > self.inline_tokens:
+                reference = "ctx:" + hashlib.sha256(value.encode("utf-8")).hexdigest()[:12]
+                self.payloads[reference] = value
+                preview = truncate_to_tokens(value, PREVIEW_TOKENS)
+                compact[field] = f"{preview}\n[{count_tokens(value)} tokens in full, stored out of line; read_context with reference {reference} returns them]"
+                compact.setdefault("_refs", []).append(reference)
+        return compact
+
+    def get_payload(self, reference: str) -> Optional[str]:
+        with self._lock:
+            return self.payloads.get(reference)
+
+    def _index(self, entry_id: int, text: str):
+        terms = Counter(tokenize(text))
+        for term, count in terms.items():
+            self._postings[term][entry_id] = count
+        self._terms[entry_id] = terms
+        self._lengths[entry_id] = sum(terms.values())
+        self._total_length += self._lengths[entry_id]
+
+    def _evict(self):
+        entry_id, entry = self.context.popleft()
+        terms = self._terms.pop(entry_id)
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(entry_id, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(entry_id)
+        del self._rendered[entry_id]
+
+        # Only this entry can hold its references: identical payloads in newer entries re-register
+        live = {reference for _, other in self.context for reference in other.get("_refs", ())}
+        for reference in entry.get("_refs", ()):
+            if reference not in live:
+                self.payloads.pop(reference, None)
+
+        line = self._summary_line(entry)
+        tokens = count_tokens(line)
+        self.summary_lines.append((line, tokens))
+        self._summary_line_tokens += tokens
+        self._enforce_summary_budget()
+
+    @staticmethod
+    def _summary_line(entry: Dict[str, Any]) -> str:
+        fields = {key: value for key, value in entry.items() if key not in ("timestamp", "_refs")}
+        if "result" in fields:
+            label = " ".join(str(fields[key]) for key in ("action", "tool") if key in fields)
+            where = f" on {fields['file_path']}" if fields.get("file_path") else ""
+            task = f" (task {fields['task']})" if "task" in fields else ""
+            first_line = str(fields["result"]).strip().split("\n")[0][:120]
+            return f"- {label}{where}{task}: {first_line}"
+        return f"- {str(fields)[:160]}"
+
+    @property
+    def summary(self) -> str:
+        return "\n".join(part for part in [self.compacted_summary] + [line for line, _ in self.summary_lines] if part)
+
+    def summary_size(self) -> int:
+        # Tokens in `summary`, kept as running totals (one extra per line break)
+        return self._compacted_tokens + self._summary_line_tokens + len(self.summary_lines)
+
+    def _enforce_summary_budget(self):
+        # With a summarizer the summary may grow to twice its budget before acompact() runs;
+        # while it runs, lines are left alone so the ones it is rewriting can be removed after
+        if self._compacting:
+            return
+        limit = self.summary_tokens * (2 if self.summarizer else 1)
+        while self.summary_lines and self.summary_size() > limit:
+            self._summary_line_tokens -= self.summary_lines.popleft()[1]
+        if self.summary_size() > limit:
+            self._set_compacted_summary(truncate_to_tokens(self.compacted_summary, limit, keep="tail"))
+
+    def _set_compacted_summary(self, text: str):
+        self.compacted_summary = text
+        self._compacted_tokens = count_tokens(text)
+
+    async def acompact(self):
+        """Rewrite the rolling summary with the summarizer once it has outgrown its budget."""
+        with self._lock:
+            if self.summarizer is None or self._compacting or self.summary_size() <= self.summary_tokens:
+                return
+            self._compacting = True
+            folded = len(self.summary_lines)
+            summary = self.summary
+        try:
+            rewritten = await self.summarizer(summary, self.summary_tokens)
+        except Exception as e:
+            logger.warning(f"Context summarization failed, keeping the extractive summary: {str(e)}")
+            return
+        finally:
+            self._compacting = False
+        if rewritten:
+            # Lines evicted while the summarizer was running stay for the next round
+            with self._lock:
+                self._set_compacted_summary(truncate_to_tokens(rewritten.strip(), self.summary_tokens))
+                for _ in range(folded):
+                    self._summary_line_tokens -= self.summary_lines.popleft()[1]
+
+    @staticmethod
+    def _render(entry: Dict[str, Any]) -> str:
+        # No timestamp: it would give every prompt carrying context a new LLM cache key
+        return str({key: value for key, value in entry.items() if key not in ("timestamp", "_refs")})
+
+    def _summary_block(self) -> str:
+        summary = self.summary
+        return f"Summary of earlier context:\n{summary}" if summary else ""
 
     def get_context(self) -> str:
-        return "\n".join(str(entry) for entry in self.context)
+        with self._lock:
+            parts = [self._summary_block()] + [self._rendered[entry_id][0] for entry_id, _ in self.context]
+        return "\n".join(part for part in parts if part)
+
+    def score(self, query: str) -> Dict[int, float]:
+        """BM25 score of every entry sharing at least one term with `query`, by entry id."""
+        if not self.context:
+            return {}
+        count = len(self.context)
+        average_length = self._total_length / count or 1
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for entry_id, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[entry_id] / average_length)
+                scores[entry_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return scores
+
+    def get_relevant_context(self, task_description: str, file_path: Optional[str] = None,
+                             max_tokens: int = DEFAULT_CONTEXT_TOKENS, top_k: int = DEFAULT_TOP_K) -> str:
+        """
+        The rolling summary plus the entries most relevant to a task, within `max_tokens`.
+
+        The latest tool results on `file_path` come first, then up to `top_k` entries ranked by
+        BM25 against the task description (and file name). The selection is rendered oldest
+        first so the history still reads in order.
+        """
+        with self._lock:
+            return self._select_relevant(task_description, file_path, max_tokens, top_k)
+
+    def _select_relevant(self, task_description: str, file_path: Optional[str], max_tokens: int, top_k: int) -> str:
+        selected = []
+        if file_path:
+            pinned = [entry_id for entry_id, entry in reversed(self.context) if entry.get("file_path") == file_path]
+            selected.extend(pinned[:PINNED_PER_FILE])
+
+        query = f"{task_description} {file_path or ''}"
+        ranked = sorted(self.score(query).items(), key=lambda item: (-item[1], -item[0]))
+        selected.extend(entry_id for entry_id, _ in ranked[:top_k] if entry_id not in selected)
 
-    def get_relevant_context(self, task_description: str) -> str:
-        # Implement logic to return relevant context based on the task description
-        # For now, we'll return the entire context
-        return self.get_context()
\ No newline at end of file
+        summary = self._summary_block()
+        remaining = max_tokens - (self.summary_size() + 6 if summary else 0)
+        chosen = []
+        for entry_id in selected:
+            cost = self._rendered[entry_id][1]
+            if cost <= remaining:
+                chosen.append(entry_id)
+                remaining -= cost
+        parts = [summary] + [self._rendered[entry_id][0] for entry_id in sorted(chosen)]
+        return "\n".join(part for part in parts if part)
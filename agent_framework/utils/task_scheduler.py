@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import List, Dict, Any, Callable, Awaitable, Set
+from tools.file_ops import project_relative_path
+
+logger = logging.getLogger(__name__)
+
+class TaskGraph:
+    """
+    Dependency DAG built from the planner's task list.
+
+    Edges come from two sources:
+    - explicit `depends_on` ids on a task (only earlier tasks are accepted, which keeps the graph acyclic)
+    - inferred edges between tasks that share a `file_path`, in planner order
+
+    Tasks with neither a file path nor explicit dependencies (e.g. "test the complete system")
+    wait for every earlier task, which matches what the planner means by ordering them last.
+    """
+    def __init__(self, tasks: List[Dict[str, Any]]):
+        self.order = [task['id'] for task in tasks]
+        self.tasks = {task['id']: task for task in tasks}
+        self.dependencies: Dict[Any, Set[Any]] = {task_id: set() for task_id in self.order}
+        self.dependents: Dict[Any, Set[Any]] = defaultdict(set)
+        self._build_edges(tasks)
+
+    def _add_edge(self, parent, child):
+        if parent != child:
+            self.dependencies[child].add(parent)
+            self.dependents[parent].add(child)
+
+    def _build_edges(self, tasks: List[Dict[str, Any]]):
+        seen = []
+        last_task_for_file = {}
+        for task in tasks:
+            task_id = task['id']
+            explicit = task.get('depends_on') or []
+            for dep in explicit:
+                if dep in seen:
+                    self._add_edge(dep, task_id)
+                else:
+                    logger.warning(f"Ignoring dependency of task {task_id} on unknown or later task {dep}")
+
+            file_path = project_relative_path(task['file_path']) if task.get('file_path') else ""
+            if file_path:
+                if file_path in last_task_for_file:
+                    self._add_edge(last_task_for_file[file_path], task_id)
+                last_task_for_file[file_path] = task_id
+            elif not explicit:
+                for previous in seen:
+                    self._add_edge(previous, task_id)
+            seen.append(task_id)
+
+    def critical_path(self, durations: Dict[Any, float]) -> List[Any]:
+        # Longest duration-weighted chain; self.order is already a topological order
+        finish = {}
+        best_parent = {}
+        for task_id in self.order:
+            parents = self.dependencies[task_id]
+            parent = max(parents, key=lambda p: finish[p]) if parents else None
+            finish[task_id] = (finish[parent] if parent is not None else 0.0) + durations.get(task_id, 0.0)
+            best_parent[task_id] = parent
+        if not finish:
+            return []
+        node = max(finish, key=finish.get)
+        path = []
+        while node is not None:
+            path.append(node)
+            node = best_parent[node]
+        return list(reversed(path))
+
+class TaskScheduler:
+    def __init__(self, tasks: List[Dict[str, Any]], max_workers: int = 4):
+        self.graph = TaskGraph(tasks)
+        self.max_workers = max(1, max_workers)
+        self.durations: Dict[Any, float] = {}
+
+    def run(self, worker: Callable[[Dict[str, Any]], Any]) -> Dict[str, Any]:
+        # Blocking workers each get a thread from the default executor
+        async def run_in_thread(task: Dict[str, Any]):
+            return await asyncio.to_thread(worker, task)
+        return asyncio.run(self.arun(run_in_thread))
+
+    async def arun(self, worker: Callable[[Dict[str, Any]], Awaitable[Any]]) -> Dict[str, Any]:
+        remaining = {task_id: len(deps) for task_id, deps in self.graph.dependencies.items()}
+        ready = [task_id for task_id in self.graph.order if remaining[task_id] == 0]
+        running = {}
+        start = time.perf_counter()
+
+        while ready or running:
+            while ready and len(running) < self.max_workers:
+                task_id = ready.pop(0)
+                running[asyncio.create_task(self._run_task(worker, task_id))] = task_id
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                task_id = running.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Task {task_id} raised in scheduler: {str(e)}", exc_info=True)
+                for child in sorted(self.graph.dependents[task_id], key=self.graph.order.index):
+                    remaining[child] -= 1
+                    if remaining[child] == 0:
+                        ready.append(child)
+
+        return self._build_report(time.perf_counter() - start)
+
+    async def _run_task(self, worker: Callable[[Dict[str, Any]], Awaitable[Any]], task_id: Any):
+        task = self.graph.tasks[task_id]
+        started = time.perf_counter()
+        try:
+            # Tasks sharing a file_path are already ordered by the graph; writes to any other
+            # file are serialized by the per-file locks in FileOperations.write_file
+            return await worker(task)
+        finally:
+            self.durations[task_id] = time.perf_counter() - started
+
+    def _build_report(self, wall_clock: float) -> Dict[str, Any]:
+        serial_time = sum(self.durations.values())
+        critical_path = self.graph.critical_path(self.durations)
+        return {
+            "tasks": len(self.graph.order),
+            "max_workers": self.max_workers,
+            "wall_clock": wall_clock,
+            "serial_time": serial_time,
+            "speedup": serial_time / wall_clock if wall_clock > 0 else 1.0,
+            "critical_path": critical_path,
+            "critical_path_time": sum(self.durations.get(task_id, 0.0) for task_id in critical_path)
+        }